@@ -35,8 +35,11 @@ for meme in memes:
         
         meme["max_font_size"] = max_font_size
 
-# Simpan kembali
-with open(MEMES_PATH, 'w', encoding='utf-8') as f:
+# Simpan kembali (tulis ke file sementara lalu replace, supaya server yang
+# sedang watch memes.json tidak pernah membaca file setengah jadi)
+tmp_path = MEMES_PATH + ".tmp"
+with open(tmp_path, 'w', encoding='utf-8') as f:
     json.dump(memes, f, indent=2, ensure_ascii=False)
+os.replace(tmp_path, MEMES_PATH)
 
 print(f"Added max_font_size to {len(memes)} templates")
@@ -6,6 +6,9 @@ import time
 from collections import defaultdict
 
 import run_custom_models
+from pipeline_trace import histograms_from_csv, print_summary as print_trace_summary
+from profiling import add_profile_argument, profile_scope
+from sweep_journal import SWEEP_JOURNAL_PATH, SweepJournal, iter_units
 
 
 def get_all_template_ids(memes_path="memes.json"):
@@ -76,6 +79,24 @@ def is_server_error_caption(caption):
     return "server error" in txt or "server eror" in txt
 
 
+# error_type yang tidak akan sembuh dengan retry (perlu perbaikan konfigurasi / rekam cassette dulu)
+NON_RETRYABLE_ERROR_TYPES = {"model_not_found", "bad_request", "cassette_miss"}
+
+
+def is_error_row(row):
+    """Baris gagal: kolom error_type terisi, atau caption Server Error (CSV lama)."""
+    return bool(str(row.get("error_type") or "").strip()) or is_server_error_caption(row.get("caption", ""))
+
+
+def is_placeholder_caption(caption):
+    """Caption hasil repair/placeholder (bukan caption asli dari model)."""
+    txt = " ".join(str(caption or "").strip().lower().split())
+    if txt == "caption gagal":
+        return True
+    segments = [seg.strip() for seg in txt.split("||")]
+    return bool(txt) and all(seg == "caption" for seg in segments)
+
+
 def normalize_temperature(value):
     if value is None or str(value).strip() == "":
         return ""
@@ -122,23 +143,66 @@ def build_run_plan(template_ids, model_keys, temperatures, methods, topics, lang
     return plan
 
 
-def run_plan(plan):
+def _run_templates(cfg, template_ids):
+    return run_custom_models.run_custom_templates(
+        selections={cfg["model_key"]: template_ids},
+        topic_key=cfg["topic"],
+        language=cfg["language"],
+        method=cfg["method"],
+        model_name=cfg["model_name"],
+        temperature=cfg["temperature"],
+        dry_run=False,
+    )
+
+
+def run_unit(cfg, template_id):
+    """
+    Jalankan satu unit (template x konfigurasi). Return (result, error):
+    error = pesan gagal, None kalau sukses. Dipakai journal dan worker sweep_queue.py.
+    """
+    results = _run_templates(cfg, [template_id])
+    label = run_custom_models.MODEL_SPECS[cfg["model_key"]]["label"]
+    result = results.get(label, {}).get(template_id)
+    if not isinstance(result, dict):
+        return result, "tidak ada hasil"
+    if result.get("error"):
+        return result, result["error"]
+    if result.get("error_type"):
+        return result, result["error_type"]
+    if not result.get("captions"):
+        return result, "template tidak ditemukan"
+    return result, None
+
+
+def run_plan(plan, journal=None):
+    """
+    Jalankan rencana. Dengan journal: per template (unit), status dicatat, unit yang
+    sudah done/failed dilewati (resume), dan progres + ETA dicetak tiap unit.
+    """
     total_calls = len(plan)
     print(f"[PLAN] Total konfigurasi: {total_calls}")
+    if journal is not None:
+        print(f"[JOURNAL] {journal.path}: {journal.progress_line()}")
     for idx, cfg in enumerate(plan, start=1):
         print(
             f"\n[PLAN RUN {idx}/{total_calls}] model_key={cfg['model_key']} | method={cfg['method']} | "
             f"topic={cfg['topic']} | language={cfg['language']} | model={cfg['model_name']} | temp={cfg['temperature']}"
         )
-        run_custom_models.run_custom_templates(
-            selections={cfg["model_key"]: cfg["template_ids"]},
-            topic_key=cfg["topic"],
-            language=cfg["language"],
-            method=cfg["method"],
-            model_name=cfg["model_name"],
-            temperature=cfg["temperature"],
-            dry_run=False,
-        )
+        if journal is None:
+            _run_templates(cfg, cfg["template_ids"])
+            continue
+
+        for _, template_id in iter_units([cfg]):
+            if journal.get(cfg, template_id) in ("done", "failed"):
+                continue
+            journal.mark(cfg, template_id, "running")
+            start = time.perf_counter()
+            _, error = run_unit(cfg, template_id)
+            journal.mark(
+                cfg, template_id, "failed" if error else "done",
+                seconds=time.perf_counter() - start, error=error,
+            )
+            print(f"[JOURNAL] {journal.progress_line()}")
 
 
 def get_latest_rows_by_config(csv_path):
@@ -156,26 +220,97 @@ def get_latest_rows_by_config(csv_path):
 
     latest = {}
     for row in rows:
-        key = (
-            str(row.get("template_id", "")).strip(),
-            str(row.get("method", "")).strip().lower(),
-            str(row.get("language", "")).strip().lower(),
-            str(row.get("model", "")).strip(),
-            normalize_temperature(row.get("temperature", "")),
-            str(row.get("topic", "")).strip(),
-        )
-        latest[key] = row
+        latest[_config_key(row)] = row
 
     return latest
 
 
+def _config_key(row):
+    return (
+        str(row.get("template_id", "")).strip(),
+        str(row.get("method", "")).strip().lower(),
+        str(row.get("language", "")).strip().lower(),
+        str(row.get("model", "")).strip(),
+        normalize_temperature(row.get("temperature", "")),
+        str(row.get("topic", "")).strip(),
+    )
+
+
+def get_max_run_id(csv_path):
+    try:
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            return max((int(r.get("run_id") or 0) for r in csv.DictReader(f)), default=0)
+    except (OSError, ValueError):
+        return 0
+
+
+def build_retry_report(csv_path, since_run_id=0):
+    """
+    Statistik retry per model dari baris CSV dengan run_id > since_run_id.
+    retry_rate = (jumlah attempt - jumlah konfigurasi) / jumlah konfigurasi.
+    """
+    attempts = defaultdict(int)
+    last_row = {}
+    per_model = defaultdict(lambda: {"server_error": 0, "placeholder": 0})
+
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    rows.sort(key=lambda r: int(r.get("run_id") or 0))
+
+    for row in rows:
+        if int(row.get("run_id") or 0) <= since_run_id:
+            continue
+        key = _config_key(row)
+        attempts[key] += 1
+        last_row[key] = row
+        model_stats = per_model[key[3]]
+        if is_error_row(row):
+            model_stats["server_error"] += 1
+        elif is_placeholder_caption(row.get("caption", "")):
+            model_stats["placeholder"] += 1
+
+    report = {}
+    for key, count in attempts.items():
+        model = key[3]
+        entry = report.setdefault(model, {"configs": 0, "attempts": 0, "still_failing": 0})
+        entry["configs"] += 1
+        entry["attempts"] += count
+        if is_error_row(last_row[key]):
+            entry["still_failing"] += 1
+
+    for model, entry in report.items():
+        entry.update(per_model[model])
+        entry["retries"] = entry["attempts"] - entry["configs"]
+        entry["retry_rate"] = round(entry["retries"] / max(1, entry["configs"]), 3)
+    return report
+
+
+def print_retry_report(report):
+    if not report:
+        print("[RETRY REPORT] Tidak ada baris untuk dilaporkan.")
+        return
+    print(
+        f"\n[RETRY REPORT] {'model':<24} {'configs':>7} {'attempts':>8} {'retry_rate':>10} "
+        f"{'server_err':>10} {'placeholder':>11} {'failing':>7}"
+    )
+    for model, e in sorted(report.items()):
+        print(
+            f"[RETRY REPORT] {model:<24} {e['configs']:>7} {e['attempts']:>8} {e['retry_rate']:>10} "
+            f"{e['server_error']:>10} {e['placeholder']:>11} {e['still_failing']:>7}"
+        )
+
+
 def build_retry_groups(csv_path):
     latest = get_latest_rows_by_config(csv_path)
     grouped = defaultdict(list)
 
     for key, row in latest.items():
         template_id, method, language, model_name, temp_norm, topic = key
-        if not is_server_error_caption(row.get("caption", "")):
+        if not is_error_row(row):
+            continue
+        error_type = str(row.get("error_type") or "").strip()
+        if error_type in NON_RETRYABLE_ERROR_TYPES:
+            print(f"[WARN] Skip retry {model_name} template={template_id}: error_type={error_type} (cek konfigurasi)")
             continue
 
         model_key = model_key_from_tag(model_name)
@@ -252,13 +387,34 @@ def parse_args():
     parser.add_argument("--max-retry-rounds", type=int, default=5, help="maksimal loop retry")
     parser.add_argument("--cooldown-seconds", type=float, default=0.0, help="jeda antar retry round")
     parser.add_argument("--skip-initial-run", action="store_true", help="langsung retry dari data CSV terbaru")
+    parser.add_argument(
+        "--journal",
+        default=SWEEP_JOURNAL_PATH,
+        help="file journal status per unit run awal (kosongkan untuk menonaktifkan)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="lanjutkan run awal dari journal (unit done/failed dilewati, rencana diambil dari journal)",
+    )
+    parser.add_argument(
+        "--report-only",
+        action="store_true",
+        help="cuma cetak retry rate per model dari CSV (tanpa run), pakai --report-since-run-id untuk membatasi",
+    )
+    parser.add_argument("--report-since-run-id", type=int, default=0, help="hanya baris dengan run_id > nilai ini")
+    add_profile_argument(parser)
 
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
+    with profile_scope("auto_run_until_clear", args.profile):
+        return run_sweep(args)
+
 
+def run_sweep(args):
     template_ids = parse_template_ids(args.templates)
     model_keys = parse_csv_list(args.models)
     temperatures = parse_temperature_list(args.temperatures)
@@ -274,6 +430,13 @@ def main():
     if invalid_methods:
         raise ValueError(f"Method tidak valid: {invalid_methods}")
 
+    if args.report_only:
+        print_retry_report(build_retry_report(args.csv_path, since_run_id=args.report_since_run_id))
+        return 0
+
+    # Retry rate dihitung dari baris yang ditulis sesi ini saja (kecuali run awal dilewati)
+    since_run_id = args.report_since_run_id if args.skip_initial_run else get_max_run_id(args.csv_path)
+
     if not args.skip_initial_run:
         full_plan = build_run_plan(
             template_ids=template_ids,
@@ -283,13 +446,29 @@ def main():
             topics=topics,
             languages=languages,
         )
-        run_plan(full_plan)
+        journal = SweepJournal(args.journal) if args.journal else None
+        if args.resume:
+            if journal is None or journal.plan is None:
+                print(f"[JOURNAL] Tidak ada journal untuk di-resume: {args.journal or '(nonaktif)'}")
+                return 1
+            if journal.plan != full_plan:
+                print("[JOURNAL] Argumen rencana berbeda dari journal, yang dipakai rencana di journal.")
+            # Baris dari sweep yang di-resume ikut dihitung di retry report
+            since_run_id = args.report_since_run_id
+            full_plan = journal.plan
+            journal.use_plan(full_plan)
+        elif journal is not None:
+            journal.start(full_plan)
+        run_plan(full_plan, journal=journal)
 
     ok = run_retries_until_clear(
         csv_path=args.csv_path,
         max_retry_rounds=args.max_retry_rounds,
         cooldown_seconds=args.cooldown_seconds,
     )
+    print_retry_report(build_retry_report(args.csv_path, since_run_id=since_run_id))
+    # Dari CSV (bukan histogram proses ini) supaya baris dari worker lain / run yang di-resume ikut
+    print_trace_summary(histograms_from_csv(args.csv_path, since_run_id), title="sweep ini")
 
     if ok:
         print("[DONE] Semua konfigurasi sudah clear dari Server Error (berdasarkan status terbaru).")
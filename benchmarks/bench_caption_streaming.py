@@ -0,0 +1,95 @@
+"""
+Benchmark caption streaming + berhenti dini vs respons penuh.
+
+Prompt yang sama dikirim dua kali per deskripsi: sekali tanpa stream (eval_count =
+token yang dibayar penuh) dan sekali lewat caption_streaming.stream_caption.
+Selisih token dan latency per call dilaporkan per mode, plus apakah caption
+final (setelah postprocess_caption) tetap sama.
+
+Contoh:
+    python benchmarks/bench_caption_streaming.py --model qwen3.5:latest --calls 10 --box-count 2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ollama  # noqa: E402
+
+from bench_prompt_prefix import load_descriptions  # noqa: E402
+from caption_streaming import stream_caption  # noqa: E402
+from caption_text import postprocess_caption  # noqa: E402
+from prompt_assembly import build_final_caption_messages  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming caption dengan berhenti dini.")
+    parser.add_argument("--host", default=os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434"))
+    parser.add_argument("--model", default="qwen3.5:latest")
+    parser.add_argument("--topic", default="thesis")
+    parser.add_argument("--language", default="id")
+    parser.add_argument("--box-count", type=int, default=2)
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42, help="seed sama untuk dua mode supaya output sebanding")
+    parser.add_argument("--descriptions", help="file .txt, satu deskripsi template per baris")
+    parser.add_argument("--output", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    descriptions = load_descriptions(args.descriptions, args.language)[: args.calls]
+    client = ollama.Client(host=args.host)
+    options = {"temperature": 0.7, "top_p": 0.9, "repeat_penalty": 1.1, "seed": args.seed}
+
+    # Warm-up: load model
+    client.chat(model=args.model, messages=[{"role": "user", "content": "hi"}], options={"num_predict": 1})
+
+    rows = []
+    for description in descriptions:
+        messages = build_final_caption_messages(
+            description, args.topic, args.box_count, topic_key=args.topic, language=args.language
+        )
+
+        start = time.perf_counter()
+        resp = client.chat(model=args.model, messages=messages, options=options)
+        full_ms = (time.perf_counter() - start) * 1000
+        full_caption = postprocess_caption(resp["message"]["content"], args.box_count)
+
+        content, info = stream_caption(client, args.model, messages, options, box_count=args.box_count)
+        stream_caption_final = postprocess_caption(content, args.box_count)
+
+        rows.append({
+            "full_tokens": resp.get("eval_count") or 0,
+            "full_ms": full_ms,
+            "stream_tokens": info["tokens"],
+            "stream_ms": info["total_ms"],
+            "stopped_early": info["stopped_early"],
+            "same_caption": full_caption == stream_caption_final,
+        })
+
+    def mean(key):
+        return round(statistics.mean(r[key] for r in rows), 1)
+
+    summary = {
+        "calls": len(rows),
+        "full_tokens_mean": mean("full_tokens"),
+        "stream_tokens_mean": mean("stream_tokens"),
+        "tokens_saved_mean": round(mean("full_tokens") - mean("stream_tokens"), 1),
+        "full_ms_mean": mean("full_ms"),
+        "stream_ms_mean": mean("stream_ms"),
+        "early_stop_rate": round(sum(r["stopped_early"] for r in rows) / max(1, len(rows)), 3),
+        "same_caption_rate": round(sum(r["same_caption"] for r in rows) / max(1, len(rows)), 3),
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "summary": summary, "rows": rows}, f, indent=2)
+        print(f"[BENCH] saved -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,174 @@
+"""
+Parity + throughput backend CLIP (clip_backend.py) terhadap jalur torch fp32.
+
+Untuk tiap template di memes.json (gambar cleanmeme) x sekumpulan caption, score
+tiap backend dibandingkan dengan backend torch (referensi):
+    - drift |score - score_torch|: max, p95, mean
+    - top-1 agreement: caption terbaik per template sama (yang dipakai seleksi N-best)
+    - throughput: latency per call scores(gambar, caption) p50/p95, call/detik, waktu load
+Exit 1 kalau drift maksimum salah satu backend > --tolerance, atau kalau backend
+yang diminta tidak tersedia / fallback ke torch (kecuali --allow-missing).
+
+Contoh:
+    python benchmarks/bench_clip_backend.py --backends torch_int8,onnx,onnx_int8
+    python benchmarks/bench_clip_backend.py --templates 10 --tolerance 0.03 --output clip_parity.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from clip_backend import CLIP_BACKENDS, load_clip_backend  # noqa: E402
+
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+CAPTIONS = [
+    "ketika dosen bilang revisi sedikit",
+    "deadline besok pagi || baru buka file",
+    "bimbingan jam tujuh || bangun jam tujuh",
+    "nilai keluar C padahal sudah begadang tiap malam sampai subuh demi skripsi",
+    "when the lecturer says minor revision",
+    "me explaining my thesis to my family",
+    "group assignment || I did everything",
+    "a frog thinking very hard",
+]
+
+
+def load_images(limit):
+    with open(os.path.join(BASE_DIR, "memes.json"), encoding="utf-8") as f:
+        memes = json.load(f)
+    images = []
+    for meme in memes:
+        path = os.path.join(BASE_DIR, str(meme.get("url_cleanmeme") or "").lstrip("/"))
+        if os.path.exists(path):
+            images.append((str(meme["id"]), Image.open(path).convert("RGB")))
+        if limit and len(images) >= limit:
+            break
+    return images
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def run_backend(name, images, captions, warmup):
+    start = time.perf_counter()
+    clip = load_clip_backend(CLIP_MODEL_NAME, name)
+    load_s = time.perf_counter() - start
+    if clip is None or clip.name != name:
+        return None
+    for _, image in images[:warmup]:
+        clip.scores(image, captions)
+
+    scores, latencies = {}, []
+    wall_start = time.perf_counter()
+    for template_id, image in images:
+        t0 = time.perf_counter()
+        scores[template_id] = clip.scores(image, captions)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    wall_s = time.perf_counter() - wall_start
+    return {
+        "scores": scores,
+        "load_s": round(load_s, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "calls_per_s": round(len(latencies) / wall_s, 2),
+    }
+
+
+def compare(reference, candidate):
+    drifts, agree = [], 0
+    for template_id, ref_scores in reference["scores"].items():
+        cand_scores = candidate["scores"][template_id]
+        drifts.extend(abs(a - b) for a, b in zip(ref_scores, cand_scores))
+        agree += ref_scores.index(max(ref_scores)) == cand_scores.index(max(cand_scores))
+    return {
+        "drift_max": round(max(drifts), 4),
+        "drift_p95": round(percentile(drifts, 95), 4),
+        "drift_mean": round(statistics.mean(drifts), 5),
+        "top1_agreement": round(agree / len(reference["scores"]), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity + throughput backend CLIP vs torch fp32.")
+    parser.add_argument("--backends", default="torch_int8,onnx,onnx_int8", help="backend kandidat dipisah koma")
+    parser.add_argument("--templates", type=int, default=0, help="jumlah template (0 = semua)")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="batas drift score absolut")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="backend yang tidak tersedia cuma dilewati (bukan gagal)")
+    parser.add_argument("--output", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    images = load_images(args.templates)
+    print(f"[BENCH] {len(images)} template x {len(CAPTIONS)} caption")
+
+    reference = run_backend("torch", images, CAPTIONS, args.warmup)
+    if reference is None:
+        print("[BENCH FAIL] backend torch (referensi) gagal dimuat")
+        return 1
+    print(
+        f"[BENCH] {'torch':<11} load={reference['load_s']}s p50={reference['p50_ms']}ms "
+        f"p95={reference['p95_ms']}ms {reference['calls_per_s']} call/s (referensi)"
+    )
+
+    results = {"torch": {k: v for k, v in reference.items() if k != "scores"}}
+    failures = []
+    for name in [b.strip() for b in args.backends.split(",") if b.strip() and b.strip() != "torch"]:
+        if name not in CLIP_BACKENDS:
+            failures.append(f"backend tidak dikenal: {name}")
+            continue
+        result = run_backend(name, images, CAPTIONS, args.warmup)
+        if result is None:
+            # Misal onnxruntime tidak terpasang -> load_clip_backend fallback ke torch
+            if not args.allow_missing:
+                failures.append(f"{name}: tidak tersedia / fallback ke torch (pakai --allow-missing untuk melewati)")
+                continue
+            print(f"[BENCH] {name:<11} dilewati (tidak tersedia di environment ini)")
+            results[name] = {"skipped": True}
+            continue
+        parity = compare(reference, result)
+        speedup = round(result["calls_per_s"] / reference["calls_per_s"], 2)
+        results[name] = dict({k: v for k, v in result.items() if k != "scores"}, speedup=speedup, **parity)
+        print(
+            f"[BENCH] {name:<11} load={result['load_s']}s p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+            f"{result['calls_per_s']} call/s (x{speedup}) drift max={parity['drift_max']} "
+            f"p95={parity['drift_p95']} top1={parity['top1_agreement']:.0%}"
+        )
+        if parity["drift_max"] > args.tolerance:
+            failures.append(f"{name}: drift max {parity['drift_max']} > {args.tolerance}")
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "templates": len(images),
+            "captions": len(CAPTIONS),
+            "tolerance": args.tolerance,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] saved -> {args.output}")
+
+    if failures:
+        for failure in failures:
+            print(f"[BENCH FAIL] {failure}")
+        return 1
+    skipped = [name for name, r in results.items() if r.get("skipped")]
+    print(f"[BENCH] OK, drift semua backend <= {args.tolerance}" + (f" (dilewati: {', '.join(skipped)})" if skipped else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+"""
+Scaling benchmark scoring CLIP dengan ClipScoringPool (clip_backend.py).
+
+Untuk tiap jumlah worker (--workers, default 1,2,4,8) job yang sama (gambar
+cleanmeme x caption) di-score lewat pool; thread per worker = cores // workers
+(atau --threads-per-worker). Dilaporkan job/detik, speedup + efisiensi terhadap
+1 worker, dan selisih score terhadap run 1 worker (harus ~0).
+--oversubscribe: tiap worker pakai thread sebanyak core (perilaku default torch
+kalau beberapa worker pipeline jalan di satu host) untuk melihat efek thrashing.
+
+Contoh:
+    python benchmarks/bench_clip_scaling.py --jobs 64
+    python benchmarks/bench_clip_scaling.py --workers 1,4 --oversubscribe --output clip_scaling.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from clip_backend import CLIP_BACKEND, CLIP_POOL_THREADS, ClipScoringPool, auto_pool_size  # noqa: E402
+
+CAPTIONS = [
+    "ketika dosen bilang revisi sedikit",
+    "deadline besok pagi || baru buka file",
+    "when the lecturer says minor revision",
+    "group assignment || I did everything",
+]
+
+
+def build_jobs(n_jobs):
+    with open(os.path.join(BASE_DIR, "memes.json"), encoding="utf-8") as f:
+        memes = json.load(f)
+    paths = [
+        os.path.join(BASE_DIR, str(m.get("url_cleanmeme") or "").lstrip("/"))
+        for m in memes
+    ]
+    paths = [p for p in paths if os.path.isfile(p)]
+    if not paths:
+        raise SystemExit("[BENCH] tidak ada gambar cleanmeme")
+    return [(paths[i % len(paths)], CAPTIONS) for i in range(n_jobs)]
+
+
+def run(workers, threads, jobs, backend):
+    with ClipScoringPool(backend=backend, workers=workers, threads_per_worker=threads) as pool:
+        # Pemanasan: semua proses memuat model sebelum waktu diukur
+        pool.map_scores(jobs[: workers * 2])
+        start = time.perf_counter()
+        scores = pool.map_scores(jobs)
+        wall_s = time.perf_counter() - start
+    if any(s is None for s in scores):
+        raise SystemExit("[BENCH] worker gagal memuat CLIP (lihat warning [CLIP])")
+    return scores, wall_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling ClipScoringPool 1..N worker.")
+    parser.add_argument("--workers", default="1,2,4,8", help="jumlah worker dipisah koma")
+    parser.add_argument("--jobs", type=int, default=64, help="jumlah job (gambar x caption) per run")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="0 = cores // workers")
+    parser.add_argument("--oversubscribe", action="store_true", help="tiap worker pakai thread = jumlah core")
+    parser.add_argument("--backend", default=CLIP_BACKEND)
+    parser.add_argument("--output", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    jobs = build_jobs(args.jobs)
+    worker_counts = [int(x) for x in args.workers.split(",") if x.strip()]
+    print(
+        f"[BENCH] {len(jobs)} job x {len(CAPTIONS)} caption, cores={cores}, backend={args.backend}, "
+        f"auto pool={auto_pool_size(CLIP_POOL_THREADS, cores)} worker x {CLIP_POOL_THREADS} thread"
+    )
+
+    results, baseline = {}, None
+    for workers in worker_counts:
+        threads = cores if args.oversubscribe else (args.threads_per_worker or max(1, cores // workers))
+        scores, wall_s = run(workers, threads, jobs, args.backend)
+        rate = len(jobs) / wall_s
+        if baseline is None:
+            baseline = (rate, scores)
+        drift = max(abs(a - b) for ref, cur in zip(baseline[1], scores) for a, b in zip(ref, cur))
+        speedup = rate / baseline[0]
+        results[str(workers)] = {
+            "threads_per_worker": threads,
+            "jobs_per_s": round(rate, 2),
+            "speedup": round(speedup, 2),
+            "efficiency": round(speedup / workers * worker_counts[0], 2),
+            "score_drift_max": round(drift, 4),
+        }
+        r = results[str(workers)]
+        print(
+            f"[BENCH] {workers:>2} worker x {threads:>2} thread: {r['jobs_per_s']} job/s "
+            f"speedup=x{r['speedup']} efisiensi={r['efficiency']:.0%} drift={r['score_drift_max']}"
+        )
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": cores,
+            "backend": args.backend,
+            "jobs": len(jobs),
+            "oversubscribe": args.oversubscribe,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] saved -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+"""
+Scrape + overhead check untuk endpoint /metrics (routes/metrics.py).
+
+1. Kirim --requests POST /caption-image lewat Flask test client, dengan metrik
+   aktif dan nonaktif (urutan selang-seling), lalu bandingkan latency per request.
+2. Scrape /metrics dan validasi format teks Prometheus: tiap baris sampel valid,
+   bucket histogram kumulatif naik, _count == bucket +Inf, family wajib ada,
+   counter request sama dengan jumlah request yang dikirim.
+3. --workers N: N proses dengan METRICS_MULTIPROC_DIR bersama masing-masing kirim
+   request lalu idle (tetap hidup, METRICS_FLUSH_SECONDS default); scrape dari
+   proses induk harus menjumlahkan semuanya dalam beberapa interval flush.
+
+Exit code 1 kalau validasi gagal.
+
+Contoh:
+    python benchmarks/bench_metrics.py --requests 50
+    python benchmarks/bench_metrics.py --requests 20 --workers 3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+REQUIRED = (
+    "meme_api_requests_total",
+    "meme_api_request_duration_seconds",
+    "meme_api_render_stage_seconds",
+    "meme_api_generated_bytes_total",
+    "meme_api_cache_requests_total",
+    "meme_api_cache_hit_ratio",
+    "meme_api_requests_in_flight",
+)
+
+
+def default_template_id():
+    with open(os.path.join(BASE_DIR, "memes.json"), encoding="utf-8") as f:
+        return str(json.load(f)[0]["id"])
+
+
+def payload(template_id, i):
+    return {"template_id": template_id, "boxes": [{"text": f"bench metrics {i}"}, {"text": "scrape /metrics"}]}
+
+
+def send_requests(client, template_id, n, offset=0):
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        resp = client.post("/caption-image", json=payload(template_id, offset + i))
+        latencies.append((time.perf_counter() - start) * 1000)
+        if resp.status_code != 200:
+            raise SystemExit(f"[BENCH] /caption-image HTTP {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        _cleanup(resp.get_json())
+    return latencies
+
+
+def _cleanup(data):
+    # Jangan menumpuk PNG hasil benchmark di generated_memes/
+    url = ((data or {}).get("data") or {}).get("url")
+    if url:
+        try:
+            os.remove(os.path.join(BASE_DIR, url.lstrip("/")))
+        except OSError:
+            pass
+
+
+def parse_exposition(text):
+    """Return (samples {(name, labels): value}, errors)."""
+    samples, errors, types = {}, [], {}
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ", 3)
+            types[name] = kind
+            continue
+        if line.startswith("#"):
+            continue
+        m = SAMPLE_RE.match(line)
+        if not m:
+            errors.append(f"baris tidak valid: {line!r}")
+            continue
+        samples[(m.group(1), m.group(2) or "")] = float(m.group(3))
+
+    for name, kind in types.items():
+        if kind != "histogram":
+            continue
+        series = {}
+        for (sample, labels), value in samples.items():
+            if sample == f"{name}_bucket":
+                base = re.sub(r',?le="[^"]*"', "", labels).replace("{,", "{")
+                le = re.search(r'le="([^"]*)"', labels).group(1)
+                series.setdefault(base, []).append((float("inf") if le == "+Inf" else float(le), value))
+        for base, buckets in series.items():
+            buckets.sort()
+            values = [v for _, v in buckets]
+            if values != sorted(values):
+                errors.append(f"{name}{base}: bucket tidak kumulatif")
+            count = samples.get((f"{name}_count", base if base != "{}" else ""))
+            if count != values[-1]:
+                errors.append(f"{name}{base}: _count {count} != +Inf {values[-1]}")
+    for name in REQUIRED:
+        if name not in types:
+            errors.append(f"family hilang: {name}")
+    return samples, errors
+
+
+def caption_request_count(samples):
+    return sum(
+        v for (name, labels), v in samples.items()
+        if name == "meme_api_requests_total" and 'route="/caption-image"' in labels and 'status="200"' in labels
+    )
+
+
+def _worker(template_id, n, offset, done, stop):
+    from routes.meme import app
+
+    send_requests(app.test_client(), template_id, n, offset)
+    # Tetap hidup tanpa request lagi: snapshot harus tetap sampai lewat thread flusher
+    done.set()
+    stop.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape + overhead check endpoint /metrics.")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--template-id", default=None)
+    parser.add_argument("--workers", type=int, default=0, help="cek mode multi-proses dengan N proses")
+    args = parser.parse_args()
+    template_id = args.template_id or default_template_id()
+
+    if args.workers:
+        os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="meme_metrics_")
+
+    from routes import metrics
+    from routes.meme import app
+
+    client = app.test_client()
+    send_requests(client, template_id, 3)  # warm-up: font, gambar template, import
+
+    on, off = [], []
+    for i in range(args.requests):
+        metrics.METRICS_ENABLED = bool(i % 2)
+        (on if metrics.METRICS_ENABLED else off).extend(send_requests(client, template_id, 1, i))
+    metrics.METRICS_ENABLED = True
+    print(
+        f"[BENCH] /caption-image p50 metrics on={statistics.median(on):.2f}ms "
+        f"off={statistics.median(off):.2f}ms (n={len(on)}/{len(off)})"
+    )
+
+    expected = 3 + len(on)
+    procs, stop = [], None
+    if args.workers:
+        ctx = multiprocessing.get_context("spawn")
+        stop = ctx.Event()
+        dones = [ctx.Event() for _ in range(args.workers)]
+        procs = [
+            ctx.Process(target=_worker, args=(template_id, args.requests, 1000 * (w + 1), dones[w], stop))
+            for w in range(args.workers)
+        ]
+        for p in procs:
+            p.start()
+        for done in dones:
+            done.wait()
+        expected += args.workers * args.requests
+
+    # Worker idle: tunggu maksimal beberapa interval flush sampai semua request terlihat
+    deadline = time.monotonic() + (3 * metrics.METRICS_FLUSH_SECONDS + 2 if args.workers else 0)
+    idle_start = time.monotonic()
+    while True:
+        start = time.perf_counter()
+        resp = client.get("/metrics")
+        scrape_ms = (time.perf_counter() - start) * 1000
+        text = resp.get_data(as_text=True)
+        samples, errors = parse_exposition(text)
+        got = caption_request_count(samples)
+        if got == expected or time.monotonic() >= deadline:
+            break
+        time.sleep(0.1)
+    if args.workers:
+        stop.set()
+        for p in procs:
+            p.join()
+        print(f"[BENCH] snapshot worker idle terlihat setelah {time.monotonic() - idle_start:.2f}s "
+              f"(METRICS_FLUSH_SECONDS={metrics.METRICS_FLUSH_SECONDS})")
+    if got != expected:
+        errors.append(f"requests_total /caption-image = {got}, harusnya {expected}")
+
+    print(f"[BENCH] scrape {len(text)} bytes, {len(samples)} sampel, {scrape_ms:.2f}ms")
+    for key in (("meme_api_cache_hit_ratio", '{cache="font"}'), ("meme_api_cache_hit_ratio", '{cache="image"}')):
+        print(f"[BENCH] {key[0]}{key[1]} = {samples.get(key)}")
+    if errors:
+        for e in errors:
+            print(f"[BENCH FAIL] {e}")
+        return 1
+    print("[BENCH] OK")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
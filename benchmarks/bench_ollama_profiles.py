@@ -0,0 +1,169 @@
+"""
+Benchmark profil runtime Ollama (keep_alive / num_ctx / num_predict) per model.
+
+Per profil: model di-unload dulu (keep_alive=0), lalu satu call VLM (cold, ukur
+load_duration) + satu call caption, diikuti --runs pasang call VLM/caption warm.
+Yang dilaporkan per (profil, tahap): load_ms, prompt-eval tok/s, generate tok/s,
+total_ms. Endpoint bisa Ollama lokal/remote atau server rekaman/mock (--host).
+
+Profil:
+    none     -> tanpa options tambahan (perilaku lama)
+    profile  -> ollama_profiles.get_profile(model, stage)
+    --profile-file x.json -> profil tambahan {"nama": {"keep_alive", "num_ctx", "vlm": {...}, "caption": {...}}}
+
+Contoh:
+    python benchmarks/bench_ollama_profiles.py --model gemma3:27b --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ollama  # noqa: E402
+
+from ollama_profiles import STAGES, get_profile, profile_kwargs  # noqa: E402
+from prompt_assembly import build_final_caption_messages  # noqa: E402
+from prompts import DESCRIBE_IMAGE_PROMPT  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_image():
+    with open(os.path.join(BASE_DIR, "memes.json"), encoding="utf-8") as f:
+        meme = json.load(f)[0]
+    return os.path.join(BASE_DIR, meme["url_cleanmeme"].lstrip("/"))
+
+
+def stage_kwargs(profile_name, custom, model, stage):
+    if profile_name == "none":
+        return {}
+    if profile_name == "profile":
+        return profile_kwargs(get_profile(model, stage))
+    profile = custom[profile_name]
+    effective = {k: v for k, v in profile.items() if k not in STAGES}
+    effective.update(profile.get(stage, {}))
+    return profile_kwargs(effective)
+
+
+def metrics(resp):
+    def rate(count_key, dur_key):
+        count = resp.get(count_key) or 0
+        dur = resp.get(dur_key) or 0
+        return round(count / (dur / 1e9), 1) if dur else None
+
+    return {
+        "load_ms": round((resp.get("load_duration") or 0) / 1e6, 1),
+        "prompt_tokens": resp.get("prompt_eval_count") or 0,
+        "prompt_tok_s": rate("prompt_eval_count", "prompt_eval_duration"),
+        "gen_tokens": resp.get("eval_count") or 0,
+        "gen_tok_s": rate("eval_count", "eval_duration"),
+        "total_ms": round((resp.get("total_duration") or 0) / 1e6, 1),
+    }
+
+
+def run_profile(client, profile_name, custom, args, image_bytes):
+    # Unload supaya load_duration call pertama = cold load dengan profil ini
+    try:
+        client.generate(model=args.model, prompt="", keep_alive=0)
+    except Exception as e:
+        print(f"[BENCH Warning] unload gagal: {e}")
+
+    vlm_messages = [{
+        "role": "user",
+        "content": DESCRIBE_IMAGE_PROMPT.get(args.language, DESCRIBE_IMAGE_PROMPT["id"]),
+        "images": [image_bytes],
+    }]
+    rows = {"vlm": [], "caption": []}
+    for idx in range(args.runs + 1):
+        resp = client.chat(
+            model=args.model, messages=vlm_messages, **stage_kwargs(profile_name, custom, args.model, "vlm")
+        )
+        rows["vlm"].append(dict(metrics(resp), cold=idx == 0))
+        description = resp["message"]["content"]
+
+        caption_kwargs = stage_kwargs(profile_name, custom, args.model, "caption")
+        caption_kwargs.setdefault("options", {})["temperature"] = 0.7
+        resp = client.chat(
+            model=args.model,
+            messages=build_final_caption_messages(description, args.topic, 2, topic_key=args.topic, language=args.language),
+            **caption_kwargs,
+        )
+        rows["caption"].append(dict(metrics(resp), cold=False))
+    return rows
+
+
+def summarize(rows):
+    warm = [r for r in rows if not r["cold"]] or rows
+    cold = [r for r in rows if r["cold"]]
+
+    def mean(key, data):
+        values = [r[key] for r in data if r[key] is not None]
+        return round(statistics.mean(values), 1) if values else None
+
+    return {
+        "cold_load_ms": cold[0]["load_ms"] if cold else None,
+        "warm_load_ms": mean("load_ms", warm),
+        "prompt_tokens": mean("prompt_tokens", warm),
+        "prompt_tok_s": mean("prompt_tok_s", warm),
+        "gen_tokens": mean("gen_tokens", warm),
+        "gen_tok_s": mean("gen_tok_s", warm),
+        "total_ms": mean("total_ms", warm),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark profil keep_alive/num_ctx/num_predict Ollama.")
+    parser.add_argument("--host", default=os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434"))
+    parser.add_argument("--model", default="gemma3:27b")
+    parser.add_argument("--image", help="gambar untuk tahap VLM (default: template pertama di memes.json)")
+    parser.add_argument("--topic", default="thesis")
+    parser.add_argument("--language", default="id")
+    parser.add_argument("--runs", type=int, default=3, help="jumlah pasang call warm per profil")
+    parser.add_argument("--profiles", default="none,profile", help="profil dipisah koma")
+    parser.add_argument("--profile-file", help="JSON profil tambahan")
+    parser.add_argument("--output", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    custom = {}
+    if args.profile_file:
+        with open(args.profile_file, encoding="utf-8") as f:
+            custom = json.load(f)
+
+    with open(args.image or default_image(), "rb") as f:
+        image_bytes = f.read()
+
+    client = ollama.Client(host=args.host)
+    results = {}
+    for profile_name in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        if profile_name not in ("none", "profile") and profile_name not in custom:
+            print(f"[BENCH] profil tidak dikenal: {profile_name}")
+            return 1
+        print(f"[BENCH] profile={profile_name} model={args.model} runs={args.runs}")
+        rows = run_profile(client, profile_name, custom, args, image_bytes)
+        results[profile_name] = {stage: summarize(stage_rows) for stage, stage_rows in rows.items()}
+
+    header = (
+        f"{'profile':<10} {'stage':<8} {'cold_load':>9} {'warm_load':>9} {'p_tok':>6} "
+        f"{'p_tok/s':>8} {'g_tok':>6} {'g_tok/s':>8} {'total_ms':>9}"
+    )
+    print("\n" + header)
+    for profile_name, stages in results.items():
+        for stage, s in stages.items():
+            print(
+                f"{profile_name:<10} {stage:<8} {str(s['cold_load_ms']):>9} {str(s['warm_load_ms']):>9} "
+                f"{str(s['prompt_tokens']):>6} {str(s['prompt_tok_s']):>8} {str(s['gen_tokens']):>6} "
+                f"{str(s['gen_tok_s']):>8} {str(s['total_ms']):>9}"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "host": args.host, "results": results}, f, indent=2)
+        print(f"[BENCH] saved -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+"""
+Benchmark prompt-eval per call: PROMPT_ASSEMBLY legacy vs stable.
+
+Mode "stable" menaruh bagian statis di depan, jadi call berikutnya (template
+beda, topik/bahasa sama) cuma perlu evaluasi token user message yang pendek.
+Deskripsi template diambil dari contoh few-shot di prompts.py (atau --descriptions
+file .txt satu deskripsi per baris), supaya tidak perlu panggil VLM.
+
+Contoh:
+    python benchmarks/bench_prompt_prefix.py --model qwen3.5:latest --calls 12
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ollama  # noqa: E402
+
+from prompt_assembly import PROMPT_ASSEMBLY_MODES, build_final_caption_messages  # noqa: E402
+from prompts import FEWSHOT_CAPTIONS  # noqa: E402
+
+
+def load_descriptions(path, language):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    descriptions = []
+    for topic_data in FEWSHOT_CAPTIONS.values():
+        for fmt in ("single", "multi"):
+            for item in topic_data.get(language, {}).get(fmt, []):
+                descriptions.append(item["description"])
+    return descriptions
+
+
+def run_mode(client, mode, model, descriptions, args):
+    rows = []
+    # Call pertama = warm-up (load model + isi cache prefix), tidak dihitung
+    for idx, description in enumerate([descriptions[-1]] + descriptions[: args.calls]):
+        messages = build_final_caption_messages(
+            description, args.topic, args.box_count, topic_key=args.topic, language=args.language, mode=mode
+        )
+        resp = client.chat(
+            model=model,
+            messages=messages,
+            options={"temperature": 0.7, "num_predict": args.num_predict},
+        )
+        if idx == 0:
+            continue
+        rows.append({
+            "prompt_eval_count": resp.get("prompt_eval_count") or 0,
+            "prompt_eval_ms": (resp.get("prompt_eval_duration") or 0) / 1e6,
+            "total_ms": (resp.get("total_duration") or 0) / 1e6,
+        })
+    return rows
+
+
+def summarize(rows):
+    def col(key):
+        return [r[key] for r in rows]
+
+    return {
+        "calls": len(rows),
+        "prompt_eval_count_mean": round(statistics.mean(col("prompt_eval_count")), 1),
+        "prompt_eval_ms_mean": round(statistics.mean(col("prompt_eval_ms")), 2),
+        "prompt_eval_ms_p50": round(statistics.median(col("prompt_eval_ms")), 2),
+        "total_ms_mean": round(statistics.mean(col("total_ms")), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt-eval legacy vs prefix-stable few-shot prompt.")
+    parser.add_argument("--host", default=os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434"))
+    parser.add_argument("--model", default="qwen3.5:latest")
+    parser.add_argument("--topic", default="thesis")
+    parser.add_argument("--language", default="id")
+    parser.add_argument("--box-count", type=int, default=2)
+    parser.add_argument("--calls", type=int, default=10, help="jumlah call terukur per mode")
+    parser.add_argument("--num-predict", type=int, default=32, help="batasi token output (fokus ke prompt-eval)")
+    parser.add_argument("--descriptions", help="file .txt, satu deskripsi template per baris")
+    parser.add_argument("--output", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    descriptions = load_descriptions(args.descriptions, args.language)
+    if len(descriptions) < 2:
+        print("[BENCH] butuh minimal 2 deskripsi")
+        return 1
+    while len(descriptions) < args.calls + 1:
+        descriptions = descriptions + descriptions
+
+    client = ollama.Client(host=args.host)
+    results = {}
+    for mode in PROMPT_ASSEMBLY_MODES:
+        print(f"[BENCH] mode={mode} model={args.model} calls={args.calls}")
+        results[mode] = summarize(run_mode(client, mode, args.model, descriptions, args))
+
+    print(f"\n{'mode':<8} {'calls':>5} {'prompt_tok':>10} {'eval_ms_mean':>12} {'eval_ms_p50':>11} {'total_ms':>9}")
+    for mode, s in results.items():
+        print(
+            f"{mode:<8} {s['calls']:>5} {s['prompt_eval_count_mean']:>10} {s['prompt_eval_ms_mean']:>12} "
+            f"{s['prompt_eval_ms_p50']:>11} {s['total_ms_mean']:>9}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "host": args.host, "results": results}, f, indent=2)
+        print(f"[BENCH] saved -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
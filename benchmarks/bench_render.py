@@ -0,0 +1,198 @@
+"""
+Benchmark render caption untuk semua template di memes.json.
+
+Matrix per template: panjang caption (--words), jumlah box (--box-counts) dan
+stroke width (--stroke-widths). Tiap kombinasi di-render lewat dua jalur:
+    client  -> POST /caption-image via Flask test client (termasuk tulis PNG ke disk)
+    direct  -> routes.caption.render_meme + encode PNG ke memori
+Dilaporkan per jalur: p50/p95/p99 latency, memes/detik (wall) dan per core (CPU
+time proses), peak RSS. Hasil bisa disimpan sebagai JSON (--output) dan
+dibandingkan dengan baseline (--baseline); exit 1 kalau p50/p95 naik melebihi
+--threshold.
+
+Contoh:
+    python benchmarks/bench_render.py --templates 10 --output render_base.json
+    python benchmarks/bench_render.py --templates 10 --baseline render_base.json --threshold 0.15
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from io import BytesIO
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from routes import catalog  # noqa: E402
+from routes.caption import render_meme  # noqa: E402
+from routes.meme import app  # noqa: E402
+
+WORDS = (
+    "ketika dosen bilang revisi sedikit padahal skripsi harus diulang dari bab satu "
+    "lagi sambil deadline tinggal besok pagi dan kopi sudah habis semua"
+).split()
+
+
+def caption_text(n_words, offset):
+    return " ".join(WORDS[(offset + i) % len(WORDS)] for i in range(n_words))
+
+
+def make_payload(meme, n_words, box_count, stroke_width):
+    width = int(meme.get("width", 600))
+    height = int(meme.get("height", 400))
+    positions = meme.get("box_positions") or []
+    if len(positions) != box_count:
+        # Box dibagi rata vertikal; x = titik tengah (lihat alignment di caption_image)
+        positions = [
+            {"x": width // 2, "y": k * height // box_count, "width": int(width * 0.9), "height": height // box_count}
+            for k in range(box_count)
+        ]
+    return {
+        "template_id": str(meme["id"]),
+        "boxes": [
+            dict(pos, text=caption_text(n_words, k * 7), stroke_width=stroke_width)
+            for k, pos in enumerate(positions)
+        ],
+    }
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def run_direct(cases):
+    latencies = []
+    for meme, payload in cases:
+        start = time.perf_counter()
+        img, _ = render_meme(meme, payload)
+        img.save(BytesIO(), format="PNG")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run_client(cases):
+    client = app.test_client()
+    latencies = []
+    for _, payload in cases:
+        start = time.perf_counter()
+        resp = client.post("/caption-image", json=payload)
+        latencies.append((time.perf_counter() - start) * 1000)
+        data = resp.get_json() or {}
+        if not data.get("success"):
+            raise SystemExit(f"[BENCH] /caption-image gagal untuk {payload['template_id']}: {data.get('error')}")
+        # PNG hasil benchmark tidak disimpan
+        try:
+            os.remove(os.path.join(BASE_DIR, data["data"]["url"].lstrip("/")))
+        except OSError:
+            pass
+    return latencies
+
+
+def summarize(latencies, wall_s, cpu_s):
+    return {
+        "n": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "memes_per_s": round(len(latencies) / wall_s, 2),
+        "memes_per_s_per_core": round(len(latencies) / cpu_s, 2) if cpu_s else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold, keys=("p50_ms", "p95_ms")):
+    failures = []
+    for mode, summary in results.items():
+        base = baseline.get("results", {}).get(mode, {}).get("all")
+        if not base:
+            continue
+        for key in keys:
+            if base.get(key) and summary["all"][key] > base[key] * (1 + threshold):
+                failures.append(
+                    f"{mode} {key}: {summary['all'][key]} > baseline {base[key]} (+{threshold:.0%})"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark render /caption-image untuk semua template.")
+    parser.add_argument("--templates", type=int, default=0, help="jumlah template (0 = semua)")
+    parser.add_argument("--words", default="1,5,10,20", help="panjang caption (kata) dipisah koma")
+    parser.add_argument("--box-counts", default="1,2", help="jumlah box dipisah koma")
+    parser.add_argument("--stroke-widths", default="0,2,4", help="stroke width dipisah koma")
+    parser.add_argument("--modes", default="direct,client", help="direct,client")
+    parser.add_argument("--warmup", type=int, default=3, help="render pemanasan per jalur (tidak dihitung)")
+    parser.add_argument("--output", help="simpan hasil ke file JSON")
+    parser.add_argument("--baseline", help="JSON hasil sebelumnya untuk cek regresi")
+    parser.add_argument("--threshold", type=float, default=0.15, help="batas kenaikan p50/p95 relatif baseline")
+    args = parser.parse_args()
+
+    memes = catalog.get_memes()
+    if args.templates:
+        memes = memes[:args.templates]
+    words = [int(x) for x in args.words.split(",") if x.strip()]
+    box_counts = [int(x) for x in args.box_counts.split(",") if x.strip()]
+    strokes = [int(x) for x in args.stroke_widths.split(",") if x.strip()]
+    matrix = list(itertools.product(words, box_counts, strokes))
+    cases = [(meme, make_payload(meme, w, b, s)) for meme in memes for w, b, s in matrix]
+    print(f"[BENCH] {len(memes)} template x {len(matrix)} kombinasi = {len(cases)} render per jalur")
+
+    runners = {"direct": run_direct, "client": run_client}
+    results = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        runners[mode](cases[:args.warmup])
+        gc.collect()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        latencies = runners[mode](cases)
+        wall_s, cpu_s = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        summary = {"all": summarize(latencies, wall_s, cpu_s), "by_words": {}}
+        for w in words:
+            subset = [lat for lat, (_, p) in zip(latencies, cases) if len(p["boxes"][0]["text"].split()) == w]
+            summary["by_words"][str(w)] = {
+                "p50_ms": round(statistics.median(subset), 2),
+                "p95_ms": round(percentile(subset, 95), 2),
+            }
+        results[mode] = summary
+        s = summary["all"]
+        print(
+            f"[BENCH] {mode:<7} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms "
+            f"{s['memes_per_s']} meme/s ({s['memes_per_s_per_core']}/core) peak_rss={s['peak_rss_mb']}MB"
+        )
+        for w, ws in summary["by_words"].items():
+            print(f"[BENCH]   {w:>2} kata: p50={ws['p50_ms']}ms p95={ws['p95_ms']}ms")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "templates": len(memes),
+        "matrix": {"words": words, "box_counts": box_counts, "stroke_widths": strokes},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] saved -> {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(results, json.load(f), args.threshold)
+        if failures:
+            for failure in failures:
+                print(f"[BENCH REGRESSION] {failure}")
+            return 1
+        print(f"[BENCH] Tidak ada regresi > {args.threshold:.0%} dibanding {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+"""
+Benchmark bytes yang dikirim + latency VLM per template: gambar asli vs hasil
+vlm_preprocess.prepare_vlm_image (downscale per model + JPEG/WebP).
+
+Per template dua call VLM (asli lalu preprocess, urutan dibalik tiap template supaya
+efek cache/warm-up seimbang). Dilaporkan: bytes, resolusi, prompt_eval_count (token
+gambar + prompt), latency wall-clock dan total_duration dari Ollama.
+
+Contoh:
+    python benchmarks/bench_vlm_preprocess.py --model qwen3-vl:latest --templates 10
+    python benchmarks/bench_vlm_preprocess.py --offline   # cuma ukur bytes, tanpa call VLM
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ollama  # noqa: E402
+
+from ollama_profiles import chat_kwargs  # noqa: E402
+from prompts import DESCRIBE_IMAGE_PROMPT  # noqa: E402
+from vlm_preprocess import prepare_vlm_image  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_templates(limit):
+    with open(os.path.join(BASE_DIR, "memes.json"), encoding="utf-8") as f:
+        memes = json.load(f)
+    templates = []
+    for m in memes:
+        path = os.path.join(BASE_DIR, str(m.get("url_cleanmeme", "")).lstrip("/"))
+        if os.path.exists(path):
+            templates.append((str(m["id"]), path))
+    return templates[:limit] if limit else templates
+
+
+def call_vlm(client, model, image_bytes, language):
+    messages = [{
+        "role": "user",
+        "content": DESCRIBE_IMAGE_PROMPT.get(language, DESCRIBE_IMAGE_PROMPT["id"]),
+        "images": [image_bytes],
+    }]
+    start = time.perf_counter()
+    resp = client.chat(model=model, messages=messages, **chat_kwargs(model, "vlm"))
+    return {
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+        "total_ms": round((resp.get("total_duration") or 0) / 1e6, 1),
+        "prompt_tokens": resp.get("prompt_eval_count") or 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocess gambar sebelum dikirim ke VLM.")
+    parser.add_argument("--host", default=os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434"))
+    parser.add_argument("--model", default="qwen3-vl:latest")
+    parser.add_argument("--language", default="id")
+    parser.add_argument("--templates", type=int, default=10, help="jumlah template (0 = semua)")
+    parser.add_argument("--offline", action="store_true", help="tanpa call VLM, cuma bytes & waktu preprocess")
+    parser.add_argument("--output", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    client = None if args.offline else ollama.Client(host=args.host)
+    rows = []
+    for idx, (template_id, path) in enumerate(load_templates(args.templates)):
+        with open(path, "rb") as f:
+            raw = f.read()
+        prepared, info = prepare_vlm_image(raw, args.model)
+        row = {
+            "template_id": template_id,
+            "raw_bytes": len(raw),
+            "sent_bytes": len(prepared),
+            "prep_ms": info["prep_ms"],
+            "cache_hit": info["cache_hit"],
+        }
+        if client is not None:
+            order = [("raw", raw), ("prep", prepared)]
+            if idx % 2:
+                order.reverse()
+            for name, image_bytes in order:
+                for key, value in call_vlm(client, args.model, image_bytes, args.language).items():
+                    row[f"{name}_{key}"] = value
+        rows.append(row)
+        print(f"[BENCH] {template_id}: {json.dumps(row)}")
+
+    if not rows:
+        print("[BENCH] tidak ada gambar template di cleanmeme/")
+        return 1
+
+    def mean(key):
+        values = [r[key] for r in rows if key in r]
+        return round(statistics.mean(values), 1) if values else None
+
+    summary = {
+        "templates": len(rows),
+        "raw_kb_mean": round(mean("raw_bytes") / 1024, 1),
+        "sent_kb_mean": round(mean("sent_bytes") / 1024, 1),
+        "bytes_ratio": round(sum(r["sent_bytes"] for r in rows) / max(1, sum(r["raw_bytes"] for r in rows)), 3),
+        "prep_ms_mean": mean("prep_ms"),
+    }
+    if client is not None:
+        for name in ("raw", "prep"):
+            for key in ("wall_ms", "total_ms", "prompt_tokens"):
+                summary[f"{name}_{key}_mean"] = mean(f"{name}_{key}")
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "summary": summary, "rows": rows}, f, indent=2)
+        print(f"[BENCH] saved -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
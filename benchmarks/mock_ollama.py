@@ -0,0 +1,461 @@
+"""
+Server pengganti Ollama (HTTP, stdlib saja) untuk load test end-to-end offline.
+
+Endpoint: POST /api/chat (stream & non-stream, format JSON schema), POST /api/generate,
+GET /api/ps, GET /api/tags, GET /mock/stats (hitungan request/error per model).
+
+- Request ber-gambar -> deskripsi template; tanpa gambar -> caption (jumlah box,
+  N-best dan bahasa dibaca dari prompt; format= schema -> JSON {"captions"/"candidates"}).
+- Latency = load model (kalau belum termuat / keep_alive habis) + token prompt /
+  prompt_tok_s + token output / gen_tok_s + jitter dari distribusi latency.
+- Error: error_rate (HTTP 500), rate_limit_rate (429), drop_rate (koneksi diputus).
+- Deterministik: isi respons, jitter dan error ditarik dari RNG ber-seed hash
+  (seed, model, isi request, ke-berapa kali request yang sama) -> urutan
+  concurrency tidak mengubah hasil.
+
+Profil per model (--config JSON, key = prefix tag model seperti ollama_profiles.py):
+    {"default": {"latency": "lognormal:40,0.5", "prompt_tok_s": 2000, "gen_tok_s": 40,
+                 "load_ms": 3000, "error_rate": 0.02},
+     "gemma3": {"gen_tok_s": 25, "load_ms": 8000}}
+latency: "fixed:MS" | "uniform:MIN_MS,MAX_MS" | "lognormal:MEDIAN_MS,SIGMA"
+
+Contoh:
+    python benchmarks/mock_ollama.py --port 11435 --speed 0.1 --error-rate 0.02
+    OLLAMA_HOST=http://127.0.0.1:11435 python auto_run_until_clear.py --templates 1-10 --models qwen3_5
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PROFILE = {
+    "latency": "lognormal:30,0.4",
+    "prompt_tok_s": 1500.0,
+    "gen_tok_s": 40.0,
+    "load_ms": 2000.0,
+    "image_tokens": 256,
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "drop_rate": 0.0,
+}
+
+DESCRIPTIONS = {
+    "id": [
+        "Seorang pria berdiri di depan dua pilihan jalan, wajahnya bingung dan berkeringat.",
+        "Katak hijau duduk di depan jendela, menatap keluar sambil berpikir keras.",
+        "Anjing kecil duduk di ruangan yang terbakar, tersenyum tenang sambil memegang cangkir.",
+        "Dua orang berjabat tangan dengan erat, lengan mereka berotot dan saling menggenggam.",
+        "Seorang wanita menunjuk marah ke arah kucing putih yang duduk di depan piring makan.",
+    ],
+    "en": [
+        "A man stands in front of two road choices, looking confused and sweating.",
+        "A green frog sits by a window, staring outside while thinking hard.",
+        "A small dog sits in a burning room, smiling calmly while holding a mug.",
+        "Two people shake hands firmly, their muscular arms locked together.",
+        "A woman points angrily at a white cat sitting in front of a dinner plate.",
+    ],
+}
+
+SEGMENTS = {
+    "id": [
+        "bimbingan besok pagi", "baru buka file", "deadline jam dua", "mulai jam satu",
+        "revisi katanya sedikit", "bab satu diulang", "minta jawaban temen", "temen juga nebak",
+        "dosen bilang gampang", "nilai keluar C", "kuliah pagi jam tujuh", "bangun jam tujuh",
+    ],
+    "en": [
+        "supervision tomorrow morning", "just opened the file", "deadline at two", "started at one",
+        "minor revision they said", "rewrite chapter one", "asked friend for answers", "friend also guessed",
+        "lecturer said easy", "got a C anyway", "class at seven", "woke up at seven",
+    ],
+}
+
+_BOX_RE = re.compile(r"(\d+)\s*(?:box|boxes)\b", re.IGNORECASE)
+_N_BEST_RE = re.compile(r"(?:tulis|write)\s+(\d+)\s+(?:kandidat|caption candidates)", re.IGNORECASE)
+
+
+def parse_latency(spec):
+    kind, _, params = str(spec).partition(":")
+    values = [float(x) for x in params.split(",") if x.strip()]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"distribusi latency tidak dikenal: {spec}")
+
+
+def parse_keep_alive(value, default_s=300.0):
+    """Detik model tetap termuat setelah request. -1 = selamanya, 0 = langsung unload."""
+    if value is None:
+        return default_s
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    for suffix in ("ms", "h", "m", "s"):
+        if text.endswith(suffix):
+            return float(text[: -len(suffix)]) * units[suffix]
+    return float(text)
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class MockState:
+    def __init__(self, profiles, seed, speed, models):
+        self.profiles = profiles
+        self.seed = seed
+        self.speed = speed
+        self.known_models = set(models)
+        self.loaded = {}  # model -> expires_at (monotonic, inf = selamanya)
+        self.seen = {}  # hash request -> jumlah kemunculan
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def profile(self, model):
+        tag = model.lower()
+        matches = [name for name in self.profiles if name != "default" and tag.startswith(name)]
+        profile = dict(self.profiles["default"])
+        for name in sorted(matches, key=len):
+            profile.update(self.profiles[name])
+        return profile
+
+    def rng_for(self, model, payload):
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        with self.lock:
+            nth = self.seen.get(digest, 0)
+            self.seen[digest] = nth + 1
+        return random.Random(f"{self.seed}|{model}|{digest}|{nth}")
+
+    def count(self, model, key):
+        with self.lock:
+            stats = self.stats.setdefault(model, {})
+            stats[key] = stats.get(key, 0) + 1
+
+    def load(self, model, keep_alive, profile):
+        """Return load_ms (0 kalau model sudah termuat) dan perbarui masa keep_alive."""
+        keep_s = parse_keep_alive(keep_alive)
+        now = time.monotonic()
+        with self.lock:
+            self.known_models.add(model)
+            expires = self.loaded.get(model)
+            cold = expires is None or expires < now
+            if keep_s == 0:
+                self.loaded.pop(model, None)
+            else:
+                self.loaded[model] = math.inf if keep_s < 0 else now + keep_s
+        return profile["load_ms"] if cold and keep_s != 0 else 0.0
+
+    def sleep(self, ms):
+        if self.speed > 0 and ms > 0:
+            time.sleep(ms / 1000 * self.speed)
+
+
+def _message_text(messages):
+    return "\n".join(str(m.get("content") or "") for m in messages or [])
+
+
+def _language(text):
+    return "en" if re.search(r"\bYou are\b|\bTASK\b|\bDescribe\b", text) else "id"
+
+
+def _box_count(text, fmt):
+    if isinstance(fmt, dict):
+        props = fmt.get("properties", {})
+        if "captions" in props:
+            return int(props["captions"].get("minItems", 1))
+        items = props.get("candidates", {}).get("items", {})
+        return int(items.get("minItems", 1)) if items.get("type") == "array" else 1
+    m = _BOX_RE.search(text)
+    if m:
+        return max(1, int(m.group(1)))
+    return 1 if re.search(r"tanpa \|\||no \|\|", text) else 2
+
+
+def _n_best(text, fmt):
+    if isinstance(fmt, dict):
+        return int(fmt.get("properties", {}).get("candidates", {}).get("minItems", 1))
+    m = _N_BEST_RE.search(text)
+    return int(m.group(1)) if m else 1
+
+
+def build_content(messages, fmt, rng):
+    text = _message_text(messages)
+    language = _language(text)
+    if any(m.get("images") for m in messages or []):
+        return rng.choice(DESCRIPTIONS[language])
+
+    box_count, n_best = _box_count(text, fmt), _n_best(text, fmt)
+    candidates = [[rng.choice(SEGMENTS[language]) for _ in range(box_count)] for _ in range(n_best)]
+    if isinstance(fmt, dict):
+        if n_best > 1:
+            data = {"candidates": [c[0] if box_count == 1 else c for c in candidates]}
+        else:
+            data = {"captions": candidates[0]}
+        return json.dumps(data, ensure_ascii=False)
+    if fmt == "json":
+        return json.dumps({"captions": candidates[0]}, ensure_ascii=False)
+    lines = [" || ".join(c) for c in candidates]
+    if n_best > 1:
+        return "\n".join(f"{i}. {line}" for i, line in enumerate(lines, start=1))
+    return lines[0]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+    quiet = True
+
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        state = self.state
+        if self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/ps":
+            now = time.monotonic()
+            with state.lock:
+                loaded = {m: exp for m, exp in state.loaded.items() if exp >= now}
+            models = []
+            for model, expires in sorted(loaded.items()):
+                left = 10 ** 9 if math.isinf(expires) else expires - now
+                models.append({
+                    "name": model, "model": model, "size": 0, "size_vram": 0, "digest": "mock",
+                    "expires_at": datetime.fromtimestamp(time.time() + left, timezone.utc).isoformat(),
+                    "details": {"family": model.split(":")[0], "format": "gguf"},
+                })
+            self._send_json(200, {"models": models})
+        elif self.path == "/api/tags":
+            with state.lock:
+                names = sorted(state.known_models)
+            self._send_json(200, {"models": [
+                {"name": m, "model": m, "modified_at": now_iso(), "size": 0, "digest": "mock",
+                 "details": {"family": m.split(":")[0], "format": "gguf"}}
+                for m in names
+            ]})
+        elif self.path == "/mock/stats":
+            with state.lock:
+                self._send_json(200, {"stats": state.stats, "loaded": sorted(state.loaded)})
+        else:
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json(404, {"error": f"not found: {self.path}"})
+            return
+        payload = self._read_json()
+        if payload is None:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+        model = str(payload.get("model") or "")
+        if not model:
+            self._send_json(400, {"error": "model is required"})
+            return
+
+        state = self.state
+        profile = state.profile(model)
+        is_chat = self.path == "/api/chat"
+        messages = payload.get("messages") or []
+        if not is_chat:
+            messages = [{"role": "user", "content": payload.get("prompt") or "", "images": payload.get("images")}]
+        rng = state.rng_for(model, {k: v for k, v in payload.items() if k not in ("stream", "keep_alive")})
+        state.count(model, self.path)
+
+        # generate tanpa prompt = load / unload model saja (mis. keep_alive=0)
+        if not is_chat and not payload.get("prompt"):
+            load_ms = state.load(model, payload.get("keep_alive"), profile)
+            state.sleep(load_ms)
+            self._send_json(200, {"model": model, "created_at": now_iso(), "response": "", "done": True,
+                                  "done_reason": "unload" if payload.get("keep_alive") == 0 else "load"})
+            return
+
+        roll = rng.random()
+        if roll < profile["drop_rate"]:
+            state.count(model, "dropped")
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        roll -= profile["drop_rate"]
+        if roll < profile["rate_limit_rate"]:
+            state.count(model, "rate_limited")
+            self._send_json(429, {"error": "mock: too many requests"})
+            return
+        roll -= profile["rate_limit_rate"]
+        if roll < profile["error_rate"]:
+            state.count(model, "server_error")
+            self._send_json(500, {"error": "mock: model runner has unexpectedly stopped"})
+            return
+
+        content = build_content(messages, payload.get("format"), rng)
+        prompt_tokens = estimate_tokens(_message_text(messages)) + profile["image_tokens"] * sum(
+            len(m.get("images") or []) for m in messages
+        )
+        options = payload.get("options") or {}
+        eval_tokens = estimate_tokens(content)
+        if options.get("num_predict"):
+            eval_tokens = min(eval_tokens, int(options["num_predict"]))
+
+        load_ms = state.load(model, payload.get("keep_alive"), profile)
+        prompt_ms = prompt_tokens / profile["prompt_tok_s"] * 1000
+        eval_ms = eval_tokens / profile["gen_tok_s"] * 1000
+        jitter_ms = parse_latency(profile["latency"])(rng)
+        stats = {
+            "total_duration": int((load_ms + prompt_ms + eval_ms + jitter_ms) * 1e6),
+            "load_duration": int(load_ms * 1e6),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_ms * 1e6),
+            "eval_count": eval_tokens,
+            "eval_duration": int(eval_ms * 1e6),
+        }
+
+        if payload.get("stream", True):
+            self._stream(model, is_chat, content, load_ms + prompt_ms + jitter_ms, eval_ms, stats)
+            return
+        state.sleep(load_ms + prompt_ms + jitter_ms + eval_ms)
+        body = {"model": model, "created_at": now_iso(), "done": True, "done_reason": "stop", **stats}
+        if is_chat:
+            body["message"] = {"role": "assistant", "content": content}
+        else:
+            body["response"] = content
+        self._send_json(200, body)
+
+    def _stream(self, model, is_chat, content, first_token_ms, eval_ms, stats):
+        state = self.state
+        pieces = re.findall(r"\S+\s*|\s+", content) or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(obj):
+            line = (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            state.sleep(first_token_ms)
+            per_piece_ms = eval_ms / len(pieces)
+            for piece in pieces:
+                chunk = {"model": model, "created_at": now_iso(), "done": False}
+                if is_chat:
+                    chunk["message"] = {"role": "assistant", "content": piece}
+                else:
+                    chunk["response"] = piece
+                write(chunk)
+                state.sleep(per_piece_ms)
+            final = {"model": model, "created_at": now_iso(), "done": True, "done_reason": "stop", **stats}
+            if is_chat:
+                final["message"] = {"role": "assistant", "content": ""}
+            else:
+                final["response"] = ""
+            write(final)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client berhenti membaca (caption_streaming berhenti dini)
+            state.count(model, "stream_closed_early")
+            self.close_connection = True
+
+
+def load_profiles(args):
+    profiles = {"default": dict(DEFAULT_PROFILE)}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            for name, values in json.load(f).items():
+                profiles.setdefault(name.lower(), {}).update(values)
+    overrides = {
+        "latency": args.latency, "prompt_tok_s": args.prompt_tok_s, "gen_tok_s": args.gen_tok_s,
+        "load_ms": args.load_ms, "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate,
+        "drop_rate": args.drop_rate,
+    }
+    profiles["default"].update({k: v for k, v in overrides.items() if v is not None})
+    for profile in profiles.values():
+        if "latency" in profile:
+            parse_latency(profile["latency"])  # validasi lebih awal
+    return profiles
+
+
+def make_server(host="127.0.0.1", port=11435, profiles=None, seed=0, speed=1.0, models=(), quiet=True):
+    """Buat server (belum jalan); dipakai CLI di bawah atau benchmark lain di thread sendiri."""
+    state = MockState(profiles or {"default": dict(DEFAULT_PROFILE)}, seed, speed, models)
+    handler = type("MockOllamaHandler", (Handler,), {"state": state, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server mock Ollama untuk load test offline.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="pengali semua jeda (0 = tanpa sleep, durasi di respons tetap dihitung)")
+    parser.add_argument("--config", help="JSON profil per model")
+    parser.add_argument("--latency", help="distribusi jitter default, mis. lognormal:30,0.4")
+    parser.add_argument("--prompt-tok-s", type=float)
+    parser.add_argument("--gen-tok-s", type=float)
+    parser.add_argument("--load-ms", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--rate-limit-rate", type=float)
+    parser.add_argument("--drop-rate", type=float)
+    parser.add_argument("--models", default="gemma3:27b,llama4:latest,qwen3.5:latest,qwen3-vl:latest",
+                        help="model yang muncul di /api/tags")
+    parser.add_argument("--verbose", action="store_true", help="log tiap request")
+    args = parser.parse_args()
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    server = make_server(args.host, args.port, load_profiles(args), args.seed, args.speed, models, not args.verbose)
+    print(f"[MOCK OLLAMA] http://{args.host}:{args.port} (seed={args.seed}, speed={args.speed})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[MOCK OLLAMA] stats: {json.dumps(server.state.stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
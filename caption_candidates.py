@@ -0,0 +1,110 @@
+import json
+import os
+import re
+
+from caption_text import normalize_for_compare
+from prompts import N_BEST_CAPTION_PROMPT
+
+# ====== N-BEST CAPTION ======
+# CAPTION_N_BEST=K (K > 1) -> LLM diminta K kandidat sekaligus dalam satu request,
+# lalu kandidat dipilih lokal (dedup + history + CLIP batch). Default 1 = perilaku lama.
+CAPTION_N_BEST = max(1, int(os.getenv("CAPTION_N_BEST", "1")))
+# "clip" = kandidat dengan CLIP score tertinggi terhadap gambar template, "first" = urutan LLM
+CAPTION_N_BEST_SELECT = os.getenv("CAPTION_N_BEST_SELECT", "clip").strip().lower()
+
+_NUMBERING_RE = re.compile(r"^\s*(?:\(?\d{1,2}[.):\]]|[-*•])\s*")
+
+
+def add_n_best_instruction(messages, k, box_count, language="id"):
+    """
+    Tambahkan instruksi 'tulis K kandidat bernomor' ke user message terakhir.
+    Kalau prompt diakhiri 'Caption:', instruksi disisipkan sebelum baris itu.
+    """
+    if k <= 1:
+        return messages
+    templates = N_BEST_CAPTION_PROMPT.get(language, N_BEST_CAPTION_PROMPT["id"])
+    instruction = templates["single_box" if box_count == 1 else "multi_box"].format(k=k)
+    return append_instruction(messages, instruction)
+
+
+def append_instruction(messages, instruction):
+    """Salin messages lalu sisipkan instruksi ke user message terakhir (sebelum 'Caption:' kalau ada)."""
+    messages = [dict(m) for m in messages]
+    last = messages[-1]
+    content = last["content"].rstrip()
+    if content.endswith("Caption:"):
+        content = content[: -len("Caption:")].rstrip() + "\n\n" + instruction + "\n\nCaption:"
+    else:
+        content = content + "\n\n" + instruction
+    last["content"] = content
+    return messages
+
+
+def parse_caption_candidates(text):
+    """
+    Pecah output LLM jadi list kandidat mentah.
+    Terima JSON list (["a", "b"] atau {"captions": [...]}) atau daftar bernomor per baris.
+    """
+    txt = str(text or "").strip()
+    if not txt:
+        return []
+
+    if txt[0] in "[{":
+        try:
+            data = json.loads(txt)
+            if isinstance(data, dict):
+                data = data.get("captions") or data.get("candidates") or []
+            if isinstance(data, list):
+                return [" || ".join(c) if isinstance(c, list) else str(c) for c in data if c]
+        except ValueError:
+            pass
+
+    candidates = []
+    for line in txt.splitlines():
+        line = _NUMBERING_RE.sub("", line).strip()
+        if not line or line.lower().rstrip(":") in ("caption", "captions", "kandidat", "candidates"):
+            continue
+        candidates.append(line)
+    return candidates
+
+
+def select_caption(candidates, history=None, is_too_similar=None, score_fn=None, placeholders=()):
+    """
+    Pilih satu caption dari kandidat yang sudah dinormalisasi.
+
+    1. Buang placeholder dan duplikat (bandingkan versi lowercase alfanumerik)
+    2. Utamakan kandidat yang tidak terlalu mirip history (is_too_similar(c, history))
+    3. Kalau score_fn tersedia (mis: CLIP batch), ambil skor tertinggi; kalau tidak, urutan LLM
+
+    Return (caption, info) atau (None, info) kalau tidak ada kandidat valid.
+    """
+    placeholder_keys = {normalize_for_compare(p) for p in placeholders}
+    unique = []
+    seen = set()
+    for c in candidates:
+        key = normalize_for_compare(c)
+        if not key or key in seen or key in placeholder_keys:
+            continue
+        seen.add(key)
+        unique.append(c)
+
+    fresh = unique
+    if history and is_too_similar is not None:
+        fresh = [c for c in unique if not is_too_similar(c, history)]
+    pool = fresh or unique
+
+    info = {"parsed": len(candidates), "unique": len(unique), "fresh": len(fresh), "scores": None}
+    if not pool:
+        return None, info
+
+    chosen = pool[0]
+    if score_fn is not None and CAPTION_N_BEST_SELECT == "clip" and len(pool) > 1:
+        scores = score_fn(pool)
+        if scores:
+            info["scores"] = scores
+            best_idx = max(
+                range(len(pool)),
+                key=lambda i: scores[i] if scores[i] is not None else float("-inf"),
+            )
+            chosen = pool[best_idx]
+    return chosen, info
@@ -0,0 +1,166 @@
+import os
+import random
+import threading
+import time
+
+import httpx
+import ollama
+
+from ollama_cassette import CassetteMissError
+
+# ====== RETRY + CIRCUIT BREAKER TAHAP CAPTION ======
+# Error client.chat di tahap caption dicoba ulang di tempat (backoff eksponensial + full
+# jitter), dan circuit breaker per host membuat call langsung gagal selama server mati
+# (tanpa nunggu timeout berkali-kali). Kegagalan akhir = CaptionGenerationError bertipe,
+# supaya pipeline bisa melewati render + CLIP dan mencatat error_type di CSV.
+#
+# CAPTION_RETRY_ATTEMPTS         total percobaan per call (default 3)
+# CAPTION_RETRY_BASE_SECONDS     backoff dasar (default 0.5), jeda = uniform(0, base * 2^n)
+# CAPTION_RETRY_MAX_SECONDS      batas jeda (default 8)
+# CAPTION_BREAKER_THRESHOLD      gagal beruntun sebelum breaker terbuka (default 5)
+# CAPTION_BREAKER_RESET_SECONDS  lama breaker terbuka sebelum dicoba lagi / half-open (default 30)
+CAPTION_RETRY_ATTEMPTS = max(1, int(os.getenv("CAPTION_RETRY_ATTEMPTS", "3")))
+CAPTION_RETRY_BASE_SECONDS = float(os.getenv("CAPTION_RETRY_BASE_SECONDS", "0.5"))
+CAPTION_RETRY_MAX_SECONDS = float(os.getenv("CAPTION_RETRY_MAX_SECONDS", "8"))
+CAPTION_BREAKER_THRESHOLD = max(1, int(os.getenv("CAPTION_BREAKER_THRESHOLD", "5")))
+CAPTION_BREAKER_RESET_SECONDS = float(os.getenv("CAPTION_BREAKER_RESET_SECONDS", "30"))
+
+# error_type yang layak dicoba ulang (masalah sementara di sisi server/jaringan)
+RETRYABLE_ERRORS = {"connection", "timeout", "server_error", "rate_limited"}
+
+
+class CaptionGenerationError(Exception):
+    """Generate caption gagal setelah retry (atau breaker terbuka). error_type masuk kolom CSV."""
+
+    def __init__(self, error_type, message, host=None, attempts=0):
+        super().__init__(message)
+        self.error_type = error_type
+        self.host = host
+        self.attempts = attempts
+
+    def __str__(self):
+        return f"[{self.error_type}] {super().__str__()} (host={self.host}, attempts={self.attempts})"
+
+
+def classify_error(exc):
+    """Petakan exception client Ollama ke error_type."""
+    if isinstance(exc, CaptionGenerationError):
+        return exc.error_type
+    if isinstance(exc, CassetteMissError):
+        return "cassette_miss"
+    if isinstance(exc, ollama.ResponseError):
+        code = exc.status_code
+        if code == 404:
+            return "model_not_found"
+        if code == 429:
+            return "rate_limited"
+        if code < 0 or code >= 500:
+            return "server_error"
+        return "bad_request"
+    if isinstance(exc, (httpx.TimeoutException, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, (ConnectionError, httpx.TransportError, OSError)):
+        return "connection"
+    return "unknown"
+
+
+class CircuitBreaker:
+    """closed -> (threshold gagal beruntun) -> open -> (reset_seconds) -> half_open -> closed/open."""
+
+    def __init__(self, threshold=CAPTION_BREAKER_THRESHOLD, reset_seconds=CAPTION_BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.half_open_inflight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Boleh kirim request? Di half-open cuma satu request percobaan yang lolos."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.half_open_inflight:
+                self.half_open_inflight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.half_open_inflight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.half_open_inflight or self.failures >= self.threshold:
+                if self.opened_at is None or self.half_open_inflight:
+                    print(f"[BREAKER] open ({self.failures} gagal beruntun), fail-fast {self.reset_seconds:.0f}s")
+                self.opened_at = time.monotonic()
+            self.half_open_inflight = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(host):
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            _breakers[host] = breaker
+        return breaker
+
+
+def breaker_key(client, default_host):
+    """Key breaker: host tunggal, atau gabungan host kalau client = OllamaPool."""
+    hosts = getattr(client, "hosts", None)
+    if hosts:
+        return "pool:" + ",".join(getattr(h, "host", str(h)) for h in hosts)
+    return default_host
+
+
+def call_with_retry(fn, host, attempts=CAPTION_RETRY_ATTEMPTS, label="caption"):
+    """
+    Jalankan fn() dengan retry + circuit breaker per host.
+    Return hasil fn, atau raise CaptionGenerationError bertipe.
+    """
+    breaker = get_breaker(host)
+    last_exc = None
+    for attempt in range(1, attempts + 1):
+        if not breaker.allow():
+            raise CaptionGenerationError(
+                "circuit_open", f"{label}: breaker terbuka, host dianggap down", host=host, attempts=attempt - 1
+            )
+        try:
+            result = fn()
+        except Exception as e:
+            last_exc = e
+            error_type = classify_error(e)
+            if error_type not in RETRYABLE_ERRORS:
+                # Error dari request-nya sendiri (model tidak ada, 400): host sehat, jangan retry
+                breaker.record_success()
+                raise CaptionGenerationError(error_type, f"{label}: {e}", host=host, attempts=attempt) from e
+            breaker.record_failure()
+            if attempt < attempts:
+                delay = random.uniform(0, min(CAPTION_RETRY_MAX_SECONDS, CAPTION_RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+                print(f"[RETRY] {label} gagal ({error_type}: {e}), coba lagi {attempt + 1}/{attempts} dalam {delay:.2f}s")
+                time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+    raise CaptionGenerationError(
+        classify_error(last_exc), f"{label}: {last_exc}", host=host, attempts=attempts
+    ) from last_exc
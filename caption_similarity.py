@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl  # lock file history antar proses; tidak ada di Windows
+except ImportError:
+    fcntl = None
+
+from caption_text import normalize_for_compare
+
+# ====== HISTORY CAPTION PER TOPIK (MinHash + LSH) ======
+# Cek near-duplicate caption terhadap history topik tanpa scan semua caption:
+# token set tiap caption disimpan sekali (sudah dinormalisasi), signature MinHash-nya
+# dimasukkan ke bucket LSH, dan Jaccard exact cuma dihitung ke kandidat satu bucket.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAPTION_HISTORY_PATH = os.getenv("CAPTION_HISTORY_PATH", os.path.join(BASE_DIR, "caption_history.jsonl"))
+CAPTION_HISTORY_CAPACITY = int(os.getenv("CAPTION_HISTORY_CAPACITY", "200"))
+# "fifo" = buang caption tertua, "lru" = caption yang barusan kena match dianggap baru
+CAPTION_HISTORY_EVICTION = os.getenv("CAPTION_HISTORY_EVICTION", "fifo").strip().lower()
+CAPTION_SIMILARITY_THRESHOLD = float(os.getenv("CAPTION_SIMILARITY_THRESHOLD", "0.5"))
+# File JSONL di-compact (sisa `capacity` caption terbaru per topik) begitu jumlah
+# barisnya > faktor ini x capacity x jumlah topik
+CAPTION_HISTORY_COMPACT_FACTOR = max(1.0, float(os.getenv("CAPTION_HISTORY_COMPACT_FACTOR", "2")))
+
+# 32 band x 2 row: peluang pasangan dengan Jaccard 0.5 masuk bucket yang sama ~0.9999,
+# jadi recall praktis sama dengan scan penuh (false positive dibuang verifikasi exact).
+NUM_BANDS = 32
+ROWS_PER_BAND = 2
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def _make_permutations(seed=1, count=NUM_PERM):
+    # LCG deterministik supaya signature sama di semua proses
+    perms = []
+    state = seed
+    for _ in range(count):
+        state = (state * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+        a = (state >> 11) % (_MERSENNE_PRIME - 1) + 1
+        state = (state * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+        b = (state >> 11) % _MERSENNE_PRIME
+        perms.append((a, b))
+    return perms
+
+
+_PERMUTATIONS = _make_permutations()
+
+
+def minhash_signature(tokens):
+    hashed = [zlib.crc32(t.encode("utf-8")) for t in tokens]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def _band_keys(signature):
+    return [
+        (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        for band in range(NUM_BANDS)
+    ]
+
+
+class CaptionSimilarityIndex:
+    """Index near-duplicate untuk satu topik, kapasitas terbatas."""
+
+    def __init__(self, capacity=CAPTION_HISTORY_CAPACITY, eviction=CAPTION_HISTORY_EVICTION,
+                 threshold=CAPTION_SIMILARITY_THRESHOLD):
+        if eviction not in ("fifo", "lru"):
+            raise ValueError(f"eviction tidak dikenal: {eviction} (pilihan: fifo, lru)")
+        self.capacity = max(1, int(capacity))
+        self.eviction = eviction
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry_id -> (norm, tokens, band_keys)
+        self._by_norm = {}  # norm -> entry_id
+        self._buckets = {}  # band_key -> set(entry_id)
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, caption):
+        norm = normalize_for_compare(caption)
+        if not norm:
+            return
+        existing = self._by_norm.get(norm)
+        if existing is not None:
+            self._entries.move_to_end(existing)
+            return
+
+        tokens = frozenset(norm.split())
+        keys = _band_keys(minhash_signature(tokens))
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (norm, tokens, keys)
+        self._by_norm[norm] = entry_id
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(entry_id)
+
+        while len(self._entries) > self.capacity:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, entry_id):
+        norm, _, keys = self._entries.pop(entry_id)
+        self._by_norm.pop(norm, None)
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def find_similar(self, caption):
+        """Caption history (ternormalisasi) yang sama persis / Jaccard >= threshold, atau None."""
+        norm = normalize_for_compare(caption)
+        if not norm:
+            return None
+        exact = self._by_norm.get(norm)
+        if exact is not None:
+            self._touch(exact)
+            return norm
+
+        tokens = frozenset(norm.split())
+        candidates = set()
+        for key in _band_keys(minhash_signature(tokens)):
+            candidates |= self._buckets.get(key, set())
+
+        for entry_id in candidates:
+            prev_norm, prev_tokens, _ = self._entries[entry_id]
+            overlap = len(tokens & prev_tokens) / max(1, len(tokens | prev_tokens))
+            if overlap >= self.threshold:
+                self._touch(entry_id)
+                return prev_norm
+        return None
+
+    def is_too_similar(self, caption):
+        return self.find_similar(caption) is not None
+
+    def _touch(self, entry_id):
+        if self.eviction == "lru":
+            self._entries.move_to_end(entry_id)
+
+
+class CaptionHistory:
+    """
+    Kumpulan index per topik + persistensi append-only (JSONL) lintas proses.
+    Sebelum cek/tambah, baris baru dari proses lain di file yang sama ikut dibaca.
+    File di-compact berkala (atomic replace, di bawah lock <path>.lock yang juga
+    dipakai saat append) supaya tidak tumbuh tanpa batas.
+    """
+
+    def __init__(self, path=CAPTION_HISTORY_PATH, capacity=CAPTION_HISTORY_CAPACITY,
+                 eviction=CAPTION_HISTORY_EVICTION, threshold=CAPTION_SIMILARITY_THRESHOLD):
+        self.path = path
+        self.capacity = capacity
+        self.eviction = eviction
+        self.threshold = threshold
+        self._topics = {}
+        self._offset = 0
+        self._inode = None
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    def for_topic(self, topic):
+        with self._lock:
+            self._sync()
+            return self._index(topic)
+
+    def _index(self, topic):
+        index = self._topics.get(topic)
+        if index is None:
+            index = CaptionSimilarityIndex(self.capacity, self.eviction, self.threshold)
+            self._topics[topic] = index
+        return index
+
+    def is_too_similar(self, topic, caption):
+        with self._lock:
+            self._sync()
+            return self._index(topic).is_too_similar(caption)
+
+    def add(self, topic, caption):
+        with self._lock:
+            self._sync()
+            self._index(topic).add(caption)
+            if not self.path:
+                return
+            line = json.dumps({"topic": topic, "caption": caption, "ts": round(time.time(), 3)}, ensure_ascii=False)
+            try:
+                # Offset tidak dimajukan di sini: baris ini (dan baris proses lain yang
+                # mungkin masuk duluan) dibaca lagi oleh _sync berikutnya; add() idempotent.
+                # File dibuka di dalam lock supaya tidak menulis ke file lama yang sedang di-compact.
+                with self._file_lock():
+                    with open(self.path, "ab") as f:
+                        f.write((line + "\n").encode("utf-8"))
+                # Baris dihitung cuma di _sync (baris ini ikut terbaca di situ)
+                self._sync()
+                if self._lines > CAPTION_HISTORY_COMPACT_FACTOR * self.capacity * max(1, len(self._topics)):
+                    self._compact()
+            except OSError as e:
+                print(f"[CAPTION HISTORY Warning] gagal simpan: {e}")
+
+    def _file_lock(self):
+        return _FileLock(self.path + ".lock")
+
+    def compact(self):
+        """
+        Tulis ulang file: per topik cuma `capacity` caption unik terbaru (urutan asli
+        dipertahankan), lewat file temp + os.replace. Index di memori dibaca ulang.
+        """
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        if not self.path:
+            return
+        with self._file_lock():
+            try:
+                with open(self.path, "rb") as f:
+                    raw_lines = [raw for raw in f if raw.endswith(b"\n")]
+            except OSError:
+                return
+            kept = {}  # topic -> OrderedDict(norm -> index baris)
+            for i, raw in enumerate(raw_lines):
+                try:
+                    row = json.loads(raw.decode("utf-8"))
+                except ValueError:
+                    continue
+                norm = normalize_for_compare(row.get("caption", ""))
+                if not norm:
+                    continue
+                entries = kept.setdefault(row.get("topic", ""), OrderedDict())
+                entries.pop(norm, None)
+                entries[norm] = i
+                while len(entries) > self.capacity:
+                    entries.popitem(last=False)
+            keep = sorted(i for entries in kept.values() for i in entries.values())
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.writelines(raw_lines[i] for i in keep)
+            os.replace(tmp_path, self.path)
+        print(f"[CAPTION HISTORY] compact {len(raw_lines)} -> {len(keep)} baris ({self.path})")
+        self._topics.clear()
+        self._offset = 0
+        self._inode = None
+        self._sync()
+
+    def _sync(self):
+        """Baca baris baru sejak offset terakhir (ditulis proses ini atau proses lain)."""
+        if not self.path:
+            return
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # File baru / di-compact proses lain (inode berganti): baca ulang dari awal
+            self._topics.clear()
+            self._offset = 0
+            self._lines = 0
+            self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_ino != self._inode:
+                return  # diganti di antara stat dan open; _sync berikutnya baca ulang
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # baris belum selesai ditulis proses lain
+                self._offset += len(raw)
+                self._lines += 1
+                try:
+                    row = json.loads(raw.decode("utf-8"))
+                except ValueError:
+                    continue
+                self._index(row.get("topic", "")).add(row.get("caption", ""))
+
+
+class _FileLock:
+    """flock eksklusif di file lock terpisah (no-op kalau fcntl tidak ada)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._f = open(self.path, "a")
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+            self._f.close()
+            self._f = None
+        return False
+
+
+_history = None
+
+
+def get_caption_history():
+    """Satu CaptionHistory per proses (dipakai bersama semua modul model)."""
+    global _history
+    if _history is None:
+        _history = CaptionHistory()
+    return _history
@@ -0,0 +1,178 @@
+import os
+import re
+import threading
+import time
+
+from caption_text import MAX_WORDS
+
+# ====== STREAMING CAPTION + BERHENTI DINI ======
+# CAPTION_STREAMING=1 -> client.chat(stream=True), token dibaca bertahap dan koneksi
+# ditutup begitu caption sudah lengkap (box_count segmen / >MAX_WORDS kata untuk 1-box /
+# K baris kandidat untuk N-best). Token sisa (ocehan, penjelasan) tidak ikut digenerate.
+CAPTION_STREAMING = os.getenv("CAPTION_STREAMING", "0").strip().lower() in ("1", "true", "yes")
+
+_THINK_BLOCK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+# Baris isi terakhir sudah ditutup newline
+_COMPLETE_LINE_RE = re.compile(r"\S[^\n]*\n")
+
+
+def _visible_text(raw):
+    """Buang blok <think>...</think>; kalau <think> belum ditutup, abaikan sisanya."""
+    txt = _THINK_BLOCK_RE.sub("", raw)
+    open_idx = txt.find("<think>")
+    if open_idx != -1:
+        txt = txt[:open_idx]
+    return txt
+
+
+def _is_header_line(line):
+    # "Caption:", "Kandidat:", "```" dsb. bukan isi caption
+    line = line.strip()
+    return not line or line.startswith("```") or (line.endswith(":") and len(line.split()) <= 3)
+
+
+class CaptionStreamWatcher:
+    """Kumpulkan potongan token dan putuskan kapan caption sudah lengkap."""
+
+    def __init__(self, box_count, n_best=1):
+        self.box_count = max(1, int(box_count))
+        self.n_best = max(1, int(n_best))
+        self.raw = ""
+
+    @property
+    def text(self):
+        return _visible_text(self.raw)
+
+    def feed(self, piece):
+        """Tambah potongan token. Return True kalau generate boleh dihentikan."""
+        self.raw += piece or ""
+        return self.is_complete()
+
+    def is_complete(self):
+        txt = self.text
+        if not txt.strip():
+            return False
+
+        lines = txt.split("\n")
+        complete_lines = [l for l in lines[:-1] if not _is_header_line(l)]
+        if self.n_best > 1:
+            return len(complete_lines) >= self.n_best
+
+        if self.box_count == 1:
+            if complete_lines:
+                return True
+            body = " ".join(l for l in lines if not _is_header_line(l))
+            # Kata ke-(MAX_WORDS+1) sudah selesai ditulis -> caption pasti dipotong normalisasi
+            return len(body.split()) > MAX_WORDS and txt[-1].isspace()
+
+        flat = txt
+        if flat.count("||") >= self.box_count:
+            return True  # segmen ekstra dibuang postprocess; semua segmen yang dipakai sudah lengkap
+        if flat.count("||") < self.box_count - 1:
+            return False
+        tail = flat[flat.rfind("||") + 2:]
+        return _COMPLETE_LINE_RE.search(tail) is not None
+
+
+_stats_lock = threading.Lock()
+# model -> akumulasi statistik streaming (dipakai streaming_report)
+STREAM_STATS = {}
+
+
+def _model_stats(model):
+    return STREAM_STATS.setdefault(model, {
+        "calls": 0,
+        "early_stops": 0,
+        "tokens_received": 0,
+        "tokens_saved_est": 0,
+        "full_eval_total": 0,
+        "full_calls": 0,
+        "latency_ms_total": 0.0,
+        "ttft_ms_total": 0.0,
+    })
+
+
+def stream_caption(client, model, messages, options=None, box_count=2, n_best=1, **chat_kwargs):
+    """
+    client.chat(stream=True) dengan berhenti dini. Return (content, info).
+
+    info: tokens (chunk yang diterima, ~1 token per chunk), stopped_early,
+    tokens_saved_est (rata-rata eval_count call yang selesai penuh - tokens),
+    ttft_ms, total_ms.
+    """
+    watcher = CaptionStreamWatcher(box_count, n_best=n_best)
+    start = time.perf_counter()
+    ttft_ms = None
+    tokens = 0
+    stopped_early = False
+    eval_count = None
+
+    stream = client.chat(model=model, messages=messages, options=options, stream=True, **chat_kwargs)
+    try:
+        for chunk in stream:
+            message = chunk.get("message") or {}
+            piece = message.get("content") or ""
+            if piece or message.get("thinking"):
+                tokens += 1
+            if chunk.get("done"):
+                eval_count = chunk.get("eval_count")
+                watcher.feed(piece)
+                break
+            if piece and ttft_ms is None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+            if watcher.feed(piece):
+                stopped_early = True
+                break
+    finally:
+        # Menutup generator = menutup koneksi HTTP; Ollama menghentikan generate
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+    total_ms = (time.perf_counter() - start) * 1000
+    with _stats_lock:
+        stats = _model_stats(model)
+        stats["calls"] += 1
+        stats["tokens_received"] += tokens
+        stats["latency_ms_total"] += total_ms
+        stats["ttft_ms_total"] += ttft_ms or total_ms
+        if stopped_early:
+            stats["early_stops"] += 1
+        elif eval_count:
+            stats["full_eval_total"] += eval_count
+            stats["full_calls"] += 1
+        saved = None
+        if stopped_early and stats["full_calls"]:
+            saved = max(0, round(stats["full_eval_total"] / stats["full_calls"] - tokens))
+            stats["tokens_saved_est"] += saved
+
+    info = {
+        "tokens": tokens,
+        "stopped_early": stopped_early,
+        "tokens_saved_est": saved,
+        "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        "total_ms": round(total_ms, 1),
+    }
+    print(
+        f"[STREAM] model={model} tokens={tokens} stopped_early={stopped_early} "
+        f"saved~{saved if saved is not None else '?'} ttft={info['ttft_ms']}ms total={info['total_ms']}ms"
+    )
+    return watcher.text, info
+
+
+def streaming_report():
+    """Ringkasan per model: call, berhenti dini, token diterima/dihemat, latency rata-rata."""
+    with _stats_lock:
+        report = {}
+        for model, s in STREAM_STATS.items():
+            calls = max(1, s["calls"])
+            report[model] = {
+                "calls": s["calls"],
+                "early_stops": s["early_stops"],
+                "tokens_mean": round(s["tokens_received"] / calls, 1),
+                "full_eval_mean": round(s["full_eval_total"] / s["full_calls"], 1) if s["full_calls"] else None,
+                "tokens_saved_est": s["tokens_saved_est"],
+                "ttft_ms_mean": round(s["ttft_ms_total"] / calls, 1),
+                "latency_ms_mean": round(s["latency_ms_total"] / calls, 1),
+            }
+        return report
@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+
+from caption_candidates import append_instruction
+from caption_text import MAX_WORDS, postprocess_caption
+from prompts import STRUCTURED_CAPTION_PROMPT
+
+# ====== STRUCTURED OUTPUT CAPTION ======
+# CAPTION_OUTPUT_MODE=json -> format=<JSON schema> di client.chat: Ollama membatasi decoding
+# ke grammar schema, jadi jumlah box & batas kata sudah pasti dari awal (tidak ada lagi
+# pecah '||', duplikasi segmen terakhir, atau placeholder). Default "text" = perilaku lama.
+# Output yang tetap tidak valid -> run dicatat gagal (error_type=invalid_output), tanpa placeholder.
+CAPTION_OUTPUT_MODES = ("text", "json")
+CAPTION_OUTPUT_MODE = os.getenv("CAPTION_OUTPUT_MODE", "text").strip().lower()
+if CAPTION_OUTPUT_MODE not in CAPTION_OUTPUT_MODES:
+    raise ValueError(f"CAPTION_OUTPUT_MODE tidak dikenal: {CAPTION_OUTPUT_MODE} (pilihan: {CAPTION_OUTPUT_MODES})")
+
+# Sama dengan aturan prompt: 1-box maks 8 kata, multi-box 1-7 kata per box
+MAX_WORDS_PER_BOX = 7
+
+_CANDIDATE_SHAPE = {
+    "id": {"single": "satu string", "multi": "list berisi tepat {box_count} string (satu per box, urut)"},
+    "en": {"single": "one string", "multi": "a list of exactly {box_count} strings (one per box, in order)"},
+}
+
+
+def max_words_for(box_count):
+    return MAX_WORDS if box_count == 1 else MAX_WORDS_PER_BOX
+
+
+def _segment_schema(max_words):
+    # Kata = run tanpa spasi/'|', dipisah satu spasi -> batas kata ditegakkan oleh grammar
+    return {
+        "type": "string",
+        "minLength": 1,
+        "maxLength": max_words * 24,
+        "pattern": r"^[^ \t\n|]+( [^ \t\n|]+){0,%d}$" % (max_words - 1),
+    }
+
+
+def caption_json_schema(box_count, n_best=1):
+    """
+    JSON schema untuk format= Ollama.
+    - n_best == 1 -> {"captions": [box_count string]}
+    - n_best  > 1 -> {"candidates": [n_best x (string | [box_count string])]}
+    """
+    box_count = max(1, int(box_count))
+    segment = _segment_schema(max_words_for(box_count))
+    boxes = {"type": "array", "items": segment, "minItems": box_count, "maxItems": box_count}
+    if n_best > 1:
+        candidate = segment if box_count == 1 else boxes
+        return {
+            "type": "object",
+            "properties": {
+                "candidates": {"type": "array", "items": candidate, "minItems": n_best, "maxItems": n_best}
+            },
+            "required": ["candidates"],
+        }
+    return {"type": "object", "properties": {"captions": boxes}, "required": ["captions"]}
+
+
+def add_structured_instruction(messages, box_count, n_best=1, language="id"):
+    """Instruksi format JSON (menggantikan instruksi N-best bernomor di mode json)."""
+    templates = STRUCTURED_CAPTION_PROMPT.get(language, STRUCTURED_CAPTION_PROMPT["id"])
+    shapes = _CANDIDATE_SHAPE.get(language, _CANDIDATE_SHAPE["id"])
+    fmt = {"box_count": box_count, "max_words": max_words_for(box_count), "k": n_best}
+    if n_best > 1:
+        fmt["candidate_shape"] = shapes["single" if box_count == 1 else "multi"].format(box_count=box_count)
+        instruction = templates["n_best"].format(**fmt)
+    else:
+        instruction = templates["single" if box_count == 1 else "multi"].format(**fmt)
+    return append_instruction(messages, instruction)
+
+
+_stats_lock = threading.Lock()
+# model -> {"ok": n, "invalid": n}
+STRUCTURED_STATS = {}
+
+
+def _count(model, key):
+    with _stats_lock:
+        stats = STRUCTURED_STATS.setdefault(model, {"ok": 0, "invalid": 0})
+        stats[key] += 1
+
+
+def parse_structured_caption(content, box_count, model=None):
+    """
+    Parse {"captions": [...]} jadi caption 'cap1 || cap2 || ...'.
+    Return None kalau JSON tidak valid / jumlah box tidak pas (tidak ada repair diam-diam).
+    """
+    try:
+        data = json.loads(content)
+        captions = data["captions"]
+        if isinstance(captions, str):
+            captions = [captions]
+        segments = [" ".join(str(c).replace("||", " ").split()) for c in captions]
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"[STRUCTURED Warning] output bukan JSON caption valid ({e}): {str(content)[:120]!r}")
+        _count(model, "invalid")
+        return None
+
+    if len(segments) != box_count or not all(segments):
+        print(f"[STRUCTURED Warning] butuh {box_count} box, dapat {len(segments)}: {segments}")
+        _count(model, "invalid")
+        return None
+
+    _count(model, "ok")
+    return postprocess_caption(" || ".join(segments), box_count)
+
+
+def structured_report():
+    with _stats_lock:
+        return {
+            model: dict(s, invalid_rate=round(s["invalid"] / max(1, s["ok"] + s["invalid"]), 3))
+            for model, s in STRUCTURED_STATS.items()
+        }
@@ -0,0 +1,230 @@
+"""
+Normalisasi teks caption (jalur cepat, dipakai bersama semua modul model).
+
+- Pattern regex & set kata gantung dikompilasi sekali di level modul.
+- Tokenizer satu pass: satu finditer menghasilkan kandidat kalimat ([.!?])
+  dan kandidat klausa ([,;—-]) sekaligus, lalu kandidat terbaik dipilih
+  dalam satu scan (hasil identik dengan implementasi lama).
+- normalize_captions(): normalisasi satu kolom caption sekaligus, dengan
+  memoisasi (caption identik di file hasil cuma diproses sekali).
+
+CLI (normalisasi ulang kolom caption di CSV hasil):
+    python caption_text.py meme_generation_results.csv --output normalized.csv
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from functools import lru_cache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Keep aligned with prompt constraints and avoid over-trimming.
+MAX_WORDS = 8
+MIN_WORDS_PREFERRED = 3
+DANGLING_WORDS = frozenset({
+    "dan", "atau", "tapi", "yang", "karena", "jadi", "untuk", "dengan",
+    "di", "ke", "dari", "pada", "saat", "ketika", "if", "and", "or",
+    "but", "because", "so", "to", "with", "in", "on", "at", "of", "for"
+})
+
+# Label di depan caption, mis: "Caption: ...", "Top text: ..."
+_LABEL_RE = re.compile(
+    r"(?:[A-Za-zÀ-ÖØ-öø-ÿ][\wÀ-ÖØ-öø-ÿ-]{0,20}(?:\s+[A-Za-zÀ-ÖØ-öø-ÿ][\wÀ-ÖØ-öø-ÿ-]{0,20}){0,2})\s*:\s*"
+)
+# Token: teks biasa | pemisah kalimat | pemisah klausa
+_TOKEN_RE = re.compile(r"[^.!?,;—-]+|[.!?]+|[,;—-]+")
+_SENTENCE_SEPS = frozenset(".!?")
+_EDGE_CHARS = " ,;:-"
+_COMPARE_STRIP_RE = re.compile(r"[^a-z0-9\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+PLACEHOLDER_SINGLE = "caption gagal"
+PLACEHOLDER_SEGMENT = "caption"
+
+
+def _clean_ending(fragment):
+    fragment = fragment.strip(_EDGE_CHARS)
+    parts = fragment.split()
+    while parts and parts[-1].lower() in DANGLING_WORDS:
+        parts.pop()
+    return " ".join(parts).strip(_EDGE_CHARS)
+
+
+def split_candidates(txt):
+    """
+    Satu pass tokenizer -> (kandidat_kalimat, kandidat_klausa), fragmen mentah.
+    Kalimat dipisah [.!?] (koma ikut di dalam kalimat), klausa dipisah [,;—-]
+    (titik ikut di dalam klausa), sama seperti dua re.split terpisah.
+    """
+    sentences, clauses = [], []
+    sentence, clause = [], []
+    for match in _TOKEN_RE.finditer(txt):
+        token = match.group()
+        first = token[0]
+        if first in _SENTENCE_SEPS:
+            sentences.append("".join(sentence))
+            sentence = []
+            clause.append(token)
+        elif first in ",;—-":
+            clauses.append("".join(clause))
+            clause = []
+            sentence.append(token)
+        else:
+            sentence.append(token)
+            clause.append(token)
+    sentences.append("".join(sentence))
+    clauses.append("".join(clause))
+    return sentences, clauses
+
+
+def _pick_candidate(fragments):
+    """Kandidat terpanjang (<= MAX_WORDS), utamakan yang >= MIN_WORDS_PREFERRED. None kalau tidak ada."""
+    best_preferred, best_preferred_len = None, 0
+    best_valid, best_valid_len = None, 0
+    for fragment in fragments:
+        if not fragment.strip():
+            continue
+        candidate = _clean_ending(fragment)
+        n_words = len(candidate.split())
+        if not 1 <= n_words <= MAX_WORDS:
+            continue
+        if n_words >= MIN_WORDS_PREFERRED:
+            if n_words > best_preferred_len:
+                best_preferred, best_preferred_len = candidate, n_words
+        elif n_words > best_valid_len:
+            best_valid, best_valid_len = candidate, n_words
+    return best_preferred if best_preferred is not None else best_valid
+
+
+def normalize_single_box_caption(text):
+    """Rapikan output LLM jadi satu caption pendek (<= MAX_WORDS kata) tanpa label."""
+    txt = " ".join(str(text or "").split()).strip()
+    if not txt:
+        return ""
+
+    if ":" in txt:
+        # Pattern label selalu butuh ':'; tanpa ':' regex mahal ini tidak perlu jalan
+        txt = " ".join(_LABEL_RE.sub("", txt).split())
+        if not txt:
+            return ""
+
+    sentences, clauses = split_candidates(txt)
+    picked = _pick_candidate(sentences)
+    if picked is None:
+        picked = _pick_candidate(clauses)
+    if picked is not None:
+        return picked
+
+    words = txt.split()[:MAX_WORDS]
+    fallback = _clean_ending(" ".join(words))
+    return fallback if fallback else " ".join(words)
+
+
+def normalize_for_compare(text):
+    """Versi lowercase alfanumerik untuk perbandingan/dedup caption."""
+    txt = _COMPARE_STRIP_RE.sub(" ", str(text or "").lower())
+    return _SPACES_RE.sub(" ", txt).strip()
+
+
+def postprocess_caption(text, box_count):
+    """Bersihkan output LLM jadi caption final: normalisasi 1-box, atau pas-kan jumlah segmen N-box."""
+    txt = str(text or "").replace("\n", " ").strip()
+    txt = txt.replace('"', '').replace("'", "").strip()
+
+    if box_count == 1:
+        txt = normalize_single_box_caption(txt)
+        return txt if txt else PLACEHOLDER_SINGLE
+
+    # Multi-box: pecah berdasarkan '||' dan pastikan jumlah segmen
+    parts = [p.strip() for p in txt.split("||") if p.strip()]
+    if not parts:
+        return " || ".join([PLACEHOLDER_SEGMENT] * box_count)
+
+    # Jika kurang dari box_count, duplikasi segmen terakhir
+    while len(parts) < box_count:
+        parts.append(parts[-1])
+
+    return " || ".join(parts[:box_count])
+
+
+_postprocess_cached = lru_cache(maxsize=65536)(postprocess_caption)
+
+
+def normalize_captions(texts, box_counts=1):
+    """
+    Normalisasi satu kolom caption sekaligus.
+    box_counts: int (sama untuk semua) atau iterable sepanjang texts.
+    Pasangan (caption, box_count) yang sama cuma diproses sekali.
+    """
+    texts = list(texts)
+    if isinstance(box_counts, int):
+        box_counts = [box_counts] * len(texts)
+    else:
+        box_counts = list(box_counts)
+        if len(box_counts) != len(texts):
+            raise ValueError("panjang box_counts harus sama dengan texts")
+    return [_postprocess_cached(str(t or ""), int(b)) for t, b in zip(texts, box_counts)]
+
+
+def load_box_counts(memes_path=os.path.join(BASE_DIR, "memes.json")):
+    """template_id -> box_count dari memes.json."""
+    with open(memes_path, encoding="utf-8") as f:
+        return {str(m["id"]): int(m.get("box_count") or 2) for m in json.load(f)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalisasi ulang kolom caption di CSV hasil generate.")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(BASE_DIR, "meme_generation_results.csv"))
+    parser.add_argument("--column", default="caption")
+    parser.add_argument("--output", help="CSV tujuan (default: tulis ke file input)")
+    parser.add_argument("--target-column", help="simpan hasil ke kolom lain (default: timpa --column)")
+    parser.add_argument("--box-count", type=int, help="paksa box_count (default: dari memes.json per template_id)")
+    args = parser.parse_args()
+
+    with open(args.csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fieldnames = list(reader.fieldnames or [])
+        rows = list(reader)
+    if args.column not in fieldnames:
+        print(f"[CAPTION TEXT] kolom '{args.column}' tidak ada di {args.csv_path}")
+        return 1
+
+    if args.box_count:
+        box_counts = args.box_count
+    else:
+        by_template = load_box_counts()
+        box_counts = [by_template.get(str(r.get("template_id", "")), 2) for r in rows]
+
+    start = time.perf_counter()
+    normalized = normalize_captions((r.get(args.column, "") for r in rows), box_counts)
+    elapsed = time.perf_counter() - start
+
+    target = args.target_column or args.column
+    if target not in fieldnames:
+        fieldnames.append(target)
+    changed = 0
+    for row, caption in zip(rows, normalized):
+        if row.get(target) != caption:
+            changed += 1
+        row[target] = caption
+
+    output = args.output or args.csv_path
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, output)
+
+    print(
+        f"[CAPTION TEXT] {len(rows)} baris, {changed} berubah, "
+        f"unik={_postprocess_cached.cache_info().currsize}, {elapsed * 1000:.1f} ms -> {output}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
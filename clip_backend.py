@@ -0,0 +1,409 @@
+"""
+Backend CLIP score yang bisa diganti (dipakai calculate_clip_score* di modul model).
+
+CLIP_BACKEND:
+    torch       -> CLIPModel fp32 apa adanya (default, perilaku lama)
+    torch_int8  -> torch dynamic quantization (nn.Linear -> int8), CPU saja
+    onnx        -> tower vision + text diekspor ke ONNX, dijalankan onnxruntime
+    onnx_int8   -> seperti onnx, bobot MatMul/Gemm di-quantize dynamic int8
+
+Ekspor ONNX sekali, disimpan di CLIP_ONNX_DIR/<nama model>/ (vision.onnx, text.onnx,
+*.int8.onnx) lalu dipakai ulang. onnxruntime tidak terpasang / ekspor gagal ->
+fallback ke torch dengan warning, jadi sweep tidak berhenti.
+
+Semua backend mengembalikan embedding ternormalisasi (numpy float32), score =
+cosine similarity dibulatkan 4 digit seperti sebelumnya. Cek drift skor +
+throughput: python benchmarks/bench_clip_backend.py
+
+Threading: default torch memakai semua core per proses, jadi beberapa worker
+pipeline di satu host saling berebut core. CLIP_HOST_WORKERS=N membagi core rata
+(cores // N thread per proses), atau set CLIP_NUM_THREADS langsung.
+ClipScoringPool (beberapa proses scoring, worker x thread dihitung dari jumlah core)
+saat ini cuma dipakai benchmarks/bench_clip_scaling.py: sweep men-score satu caption
+per run secara sinkron di proses worker-nya sendiri, jadi tuning sweep lewat
+CLIP_HOST_WORKERS / CLIP_NUM_THREADS, bukan lewat pool.
+
+Env:
+    CLIP_BACKEND          torch | torch_int8 | onnx | onnx_int8 (default torch)
+    CLIP_ONNX_DIR         folder cache model ONNX (default clip_onnx)
+    CLIP_NUM_THREADS      thread intra-op per proses (default 0 = cores // CLIP_HOST_WORKERS)
+    CLIP_HOST_WORKERS     jumlah proses pipeline di host ini (default 1 = default torch)
+    CLIP_INTEROP_THREADS  thread inter-op (default 0 = default torch)
+    CLIP_INFERENCE_MODE   torch.inference_mode alih-alih no_grad (default 1)
+    CLIP_CHANNELS_LAST    pixel_values + model channels_last (default 0)
+    CLIP_BF16             0 | 1 | auto (autocast bf16 di CPU yang punya avx512_bf16/amx, default 0)
+    CLIP_POOL_THREADS     thread per worker ClipScoringPool (default 2)
+"""
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import CLIPModel, CLIPProcessor
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+CLIP_BACKEND = os.getenv("CLIP_BACKEND", "torch").strip().lower()
+CLIP_ONNX_DIR = os.getenv("CLIP_ONNX_DIR", "clip_onnx")
+CLIP_BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+ONNX_OPSET = 17
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+CLIP_NUM_THREADS = int(os.getenv("CLIP_NUM_THREADS", "0"))
+CLIP_HOST_WORKERS = max(1, int(os.getenv("CLIP_HOST_WORKERS", "1")))
+CLIP_INTEROP_THREADS = int(os.getenv("CLIP_INTEROP_THREADS", "0"))
+CLIP_INFERENCE_MODE = _env_flag("CLIP_INFERENCE_MODE", "1")
+CLIP_CHANNELS_LAST = _env_flag("CLIP_CHANNELS_LAST", "0")
+CLIP_BF16 = os.getenv("CLIP_BF16", "0").strip().lower()
+CLIP_POOL_THREADS = max(1, int(os.getenv("CLIP_POOL_THREADS", "2")))
+
+_threads_configured = None
+
+
+def resolve_num_threads(num_threads=None, host_workers=None):
+    """Thread intra-op per proses: eksplisit > cores // host_workers > 0 (default torch)."""
+    num_threads = CLIP_NUM_THREADS if num_threads is None else num_threads
+    host_workers = CLIP_HOST_WORKERS if host_workers is None else host_workers
+    if num_threads > 0:
+        return num_threads
+    if host_workers > 1:
+        return max(1, (os.cpu_count() or 1) // host_workers)
+    return 0
+
+
+def configure_threads(num_threads=None, interop_threads=None):
+    """
+    Set thread torch sekali per proses (sebelum forward pertama). Return jumlah thread
+    intra-op yang dipakai (0 = default), juga dipakai untuk session onnxruntime.
+    """
+    global _threads_configured
+    if _threads_configured is not None:
+        return _threads_configured
+    num_threads = resolve_num_threads(num_threads)
+    interop_threads = CLIP_INTEROP_THREADS if interop_threads is None else interop_threads
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Sudah ada kerja paralel inter-op di proses ini
+            print(f"[CLIP Warning] set_num_interop_threads diabaikan: {e}")
+    _threads_configured = num_threads
+    print(
+        f"[CLIP] threads intra-op={torch.get_num_threads()} inter-op={torch.get_num_interop_threads()} "
+        f"(cores={os.cpu_count()}, host_workers={CLIP_HOST_WORKERS})"
+    )
+    return num_threads
+
+
+def cpu_supports_bf16():
+    """bf16 cepat di CPU hanya dengan avx512_bf16 / AMX (selain itu diemulasi, lebih lambat)."""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return ("avx512_bf16" in flags or "amx_bf16" in flags) and torch.backends.mkldnn.is_available()
+
+
+def _resolve_bf16(setting):
+    if setting == "auto":
+        return cpu_supports_bf16()
+    return setting in ("1", "true", "yes", "on")
+
+
+def _normalize(embeds):
+    embeds = np.asarray(embeds, dtype=np.float32)
+    return embeds / np.linalg.norm(embeds, axis=-1, keepdims=True)
+
+
+class ClipBackend:
+    """Dasar: preprocessing CLIPProcessor + scoring cosine; subclass mengisi encode_*."""
+
+    name = "base"
+
+    def __init__(self, model_name, processor):
+        self.model_name = model_name
+        self.processor = processor
+
+    def encode_images(self, images):
+        raise NotImplementedError
+
+    def encode_texts(self, texts):
+        raise NotImplementedError
+
+    def scores(self, image, captions):
+        """Cosine similarity satu gambar terhadap tiap caption (list float, 4 digit)."""
+        image_embeds = self.encode_images([image])
+        text_embeds = self.encode_texts(list(captions))
+        similarity = text_embeds @ image_embeds[0]
+        return [round(float(s), 4) for s in similarity]
+
+
+class TorchClipBackend(ClipBackend):
+    def __init__(self, model_name, processor, quantize=False, inference_mode=CLIP_INFERENCE_MODE,
+                 channels_last=CLIP_CHANNELS_LAST, bf16=CLIP_BF16):
+        super().__init__(model_name, processor)
+        model = CLIPModel.from_pretrained(model_name)
+        self.device = "cuda" if torch.cuda.is_available() and not quantize else "cpu"
+        model = model.to(self.device).eval()
+        cpu_fp32 = self.device == "cpu" and not quantize
+        self.inference_mode = inference_mode
+        # channels_last / bf16 cuma berlaku untuk model fp32 di CPU
+        self.channels_last = channels_last and cpu_fp32
+        self.bf16 = cpu_fp32 and _resolve_bf16(str(bf16).lower())
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.name = "torch_int8" if quantize else "torch"
+
+    def describe(self):
+        flags = [f for f, on in (("inference_mode", self.inference_mode), ("channels_last", self.channels_last),
+                                 ("bf16", self.bf16)) if on]
+        return f"{self.name}[{','.join(flags)}]" if flags else self.name
+
+    @contextmanager
+    def _forward(self):
+        with torch.inference_mode() if self.inference_mode else torch.no_grad():
+            if self.bf16:
+                with torch.autocast("cpu", dtype=torch.bfloat16):
+                    yield
+            else:
+                yield
+
+    def encode_images(self, images):
+        inputs = self.processor(images=images, return_tensors="pt")
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        if self.channels_last:
+            inputs["pixel_values"] = inputs["pixel_values"].contiguous(memory_format=torch.channels_last)
+        with self._forward():
+            embeds = self.model.get_image_features(**inputs)
+        return _normalize(embeds.float().cpu().numpy())
+
+    def encode_texts(self, texts):
+        inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with self._forward():
+            embeds = self.model.get_text_features(**inputs)
+        return _normalize(embeds.float().cpu().numpy())
+
+
+class _VisionTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+
+class _TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+
+def _write_atomic(path, write):
+    """
+    write(tmp_path) lalu os.replace ke path: worker lain yang mengekspor / memuat
+    bersamaan tidak pernah melihat file ONNX setengah jadi.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def export_onnx(model_name, onnx_dir=CLIP_ONNX_DIR, int8=False):
+    """Ekspor tower vision + text ke ONNX (sekali, lalu dipakai ulang). Return (vision_path, text_path)."""
+    out_dir = os.path.join(onnx_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+    vision_path = os.path.join(out_dir, "vision.onnx")
+    text_path = os.path.join(out_dir, "text.onnx")
+
+    if not (os.path.exists(vision_path) and os.path.exists(text_path)):
+        os.makedirs(out_dir, exist_ok=True)
+        model = CLIPModel.from_pretrained(model_name).eval()
+        size = model.config.vision_config.image_size
+        print(f"[CLIP] Export ONNX {model_name} -> {out_dir}")
+        ids = torch.ones(2, 8, dtype=torch.long)
+        with torch.no_grad():
+            # text dulu: vision.onnx + text.onnx sama-sama ada = ekspor lengkap
+            _write_atomic(text_path, lambda tmp: torch.onnx.export(
+                _TextTower(model), (ids, torch.ones_like(ids)), tmp,
+                input_names=["input_ids", "attention_mask"], output_names=["text_embeds"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "seq"},
+                    "attention_mask": {0: "batch", 1: "seq"},
+                    "text_embeds": {0: "batch"},
+                },
+                opset_version=ONNX_OPSET,
+            ))
+            _write_atomic(vision_path, lambda tmp: torch.onnx.export(
+                _VisionTower(model), (torch.zeros(1, 3, size, size),), tmp,
+                input_names=["pixel_values"], output_names=["image_embeds"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                opset_version=ONNX_OPSET,
+            ))
+
+    if not int8:
+        return vision_path, text_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    paths = []
+    for path in (vision_path, text_path):
+        q_path = path.replace(".onnx", ".int8.onnx")
+        if not os.path.exists(q_path):
+            # Conv (patch embedding) tetap fp32; ConvInteger tidak didukung semua EP CPU
+            _write_atomic(q_path, lambda tmp, src=path: quantize_dynamic(
+                src, tmp, weight_type=QuantType.QInt8, op_types_to_quantize=["MatMul", "Gemm"]
+            ))
+            print(f"[CLIP] Quantize int8 -> {q_path}")
+        paths.append(q_path)
+    return tuple(paths)
+
+
+class OnnxClipBackend(ClipBackend):
+    def __init__(self, model_name, processor, int8=False, onnx_dir=CLIP_ONNX_DIR):
+        super().__init__(model_name, processor)
+        vision_path, text_path = export_onnx(model_name, onnx_dir, int8=int8)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Sama dengan thread torch proses ini (configure_threads sudah dipanggil di load_clip_backend)
+        options.intra_op_num_threads = configure_threads()
+        options.inter_op_num_threads = max(0, CLIP_INTEROP_THREADS)
+        providers = ["CPUExecutionProvider"]
+        self.vision = onnxruntime.InferenceSession(vision_path, options, providers=providers)
+        self.text = onnxruntime.InferenceSession(text_path, options, providers=providers)
+        self.name = "onnx_int8" if int8 else "onnx"
+
+    def encode_images(self, images):
+        inputs = self.processor(images=images, return_tensors="np")
+        (embeds,) = self.vision.run(None, {"pixel_values": inputs["pixel_values"].astype(np.float32)})
+        return _normalize(embeds)
+
+    def encode_texts(self, texts):
+        inputs = self.processor(text=texts, return_tensors="np", padding=True, truncation=True)
+        feeds = {k: inputs[k].astype(np.int64) for k in ("input_ids", "attention_mask")}
+        (embeds,) = self.text.run(None, feeds)
+        return _normalize(embeds)
+
+
+def load_clip_backend(model_name, backend=None):
+    """Backend CLIP sesuai CLIP_BACKEND (fallback ke torch kalau onnx gagal), None kalau gagal total."""
+    backend = (backend or CLIP_BACKEND).lower()
+    configure_threads()
+    if backend not in CLIP_BACKENDS:
+        print(f"[CLIP Warning] CLIP_BACKEND={backend} tidak dikenal, pakai torch ({', '.join(CLIP_BACKENDS)})")
+        backend = "torch"
+    try:
+        processor = CLIPProcessor.from_pretrained(model_name)
+    except Exception as e:
+        print(f"[CLIP Warning] Failed to load CLIP processor: {e}")
+        return None
+
+    if backend.startswith("onnx"):
+        if onnxruntime is None:
+            print("[CLIP Warning] onnxruntime tidak terpasang, fallback ke torch")
+        else:
+            try:
+                clip = OnnxClipBackend(model_name, processor, int8=backend == "onnx_int8")
+                print(f"[CLIP] Backend {clip.name} (onnxruntime {onnxruntime.__version__})")
+                return clip
+            except Exception as e:
+                print(f"[CLIP Warning] Backend {backend} gagal ({e}), fallback ke torch")
+        backend = "torch"
+
+    try:
+        clip = TorchClipBackend(model_name, processor, quantize=backend == "torch_int8")
+        print(f"[CLIP] Model loaded on device: {clip.device} (backend {clip.describe()})")
+        return clip
+    except Exception as e:
+        print(f"[CLIP Warning] Failed to load CLIP model: {e}")
+        return None
+
+
+# ---------- pool scoring multi-proses ----------
+def auto_pool_size(threads_per_worker=CLIP_POOL_THREADS, cores=None):
+    """Jumlah worker scoring supaya total thread ~= jumlah core."""
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // max(1, threads_per_worker))
+
+
+_pool_clip = None
+
+
+def _pool_init(model_name, backend, num_threads):
+    global _pool_clip
+    configure_threads(num_threads, 1)
+    _pool_clip = load_clip_backend(model_name, backend)
+
+
+def _pool_score(image, captions):
+    if _pool_clip is None:
+        return None
+    if isinstance(image, str):
+        with Image.open(image) as img:
+            image = img.convert("RGB")
+    return _pool_clip.scores(image, captions)
+
+
+class ClipScoringPool:
+    """
+    Beberapa proses scoring CLIP (spawn, model dimuat sekali per proses).
+    workers=0 -> auto_pool_size(); threads_per_worker=0 -> cores // workers.
+    Belum dipakai jalur sweep (lihat docstring modul), cuma benchmark scaling.
+
+        with ClipScoringPool() as pool:
+            scores = pool.map_scores([(path, captions), ...])
+    """
+
+    def __init__(self, model_name="openai/clip-vit-base-patch32", backend=None, workers=0, threads_per_worker=0):
+        cores = os.cpu_count() or 1
+        self.workers = workers or auto_pool_size(threads_per_worker or CLIP_POOL_THREADS, cores)
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_pool_init,
+            initargs=(model_name, backend or CLIP_BACKEND, self.threads_per_worker),
+        )
+        print(f"[CLIP POOL] {self.workers} worker x {self.threads_per_worker} thread (cores={cores})")
+
+    def submit(self, image, captions):
+        """image: path file (disarankan, murah di-pickle) atau PIL.Image. Return Future list score."""
+        return self._executor.submit(_pool_score, image, list(captions))
+
+    def map_scores(self, jobs):
+        futures = [self.submit(image, captions) for image, captions in jobs]
+        return [f.result() for f in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
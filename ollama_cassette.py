@@ -0,0 +1,284 @@
+"""
+Record / replay client.chat (VLM + LLM) ke cassette JSONL append-only.
+
+Sweep ulang untuk membandingkan scoring / render / normalisasi tidak perlu
+membayar semua call Ollama lagi: mode record menyimpan setiap respons chat,
+mode replay menyajikannya kembali tanpa menyentuh server.
+
+- Key = sha256 JSON kanonik dari model, messages (gambar diganti sha256 byte-nya),
+  format, think, tools, options (tanpa OLLAMA_CASSETTE_IGNORE_OPTIONS).
+  stream dan keep_alive tidak ikut key, jadi rekaman streaming bisa diputar non-stream.
+  Kecuali rekaman partial (stream yang dihentikan dini oleh pemanggil): itu cuma
+  diputar ke request stream; request non-stream menganggapnya miss.
+- Request identik yang dipanggil berkali-kali (mis. temperature > 0) direkam
+  berurutan; replay menyajikan rekaman ke-1, ke-2, ... lalu berputar ulang.
+- Baris cassette: {"k": key, "model": ..., "content": ..., "thinking": ..., "stats": {...}, "ts": ...}
+  (gambar / prompt tidak disimpan, cuma hash-nya lewat key).
+
+Env:
+    OLLAMA_CASSETTE_MODE            off (default) | record | replay | auto (replay kalau ada, selain itu record)
+    OLLAMA_CASSETTE_PATH            file cassette (default ollama_cassette.jsonl)
+    OLLAMA_CASSETTE_IGNORE_OPTIONS  option yang tidak ikut key (default num_ctx,num_thread,num_gpu)
+
+Ringkasan isi cassette:
+    python ollama_cassette.py --path ollama_cassette.jsonl
+"""
+import argparse
+import atexit
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import ollama
+
+OLLAMA_CASSETTE_MODE = os.getenv("OLLAMA_CASSETTE_MODE", "off").strip().lower()
+OLLAMA_CASSETTE_PATH = os.getenv("OLLAMA_CASSETTE_PATH", "ollama_cassette.jsonl")
+OLLAMA_CASSETTE_IGNORE_OPTIONS = {
+    k.strip() for k in os.getenv("OLLAMA_CASSETTE_IGNORE_OPTIONS", "num_ctx,num_thread,num_gpu").split(",") if k.strip()
+}
+MODES = ("off", "record", "replay", "auto")
+# Field statistik respons yang ikut disimpan (dipakai caption_streaming / laporan token)
+STAT_FIELDS = ("done_reason", "eval_count", "prompt_eval_count", "total_duration", "eval_duration")
+# Key request yang tidak mengubah isi respons
+_NON_KEY_FIELDS = {"stream", "keep_alive"}
+
+
+class CassetteMissError(LookupError):
+    """Mode replay, tapi request belum pernah direkam."""
+
+
+def _image_digest(image):
+    if isinstance(image, (bytes, bytearray)):
+        data = bytes(image)
+    elif hasattr(image, "value"):  # ollama.Image
+        return _image_digest(image.value)
+    else:
+        text = str(image)
+        if os.path.isfile(text):
+            with open(text, "rb") as f:
+                data = f.read()
+        else:
+            try:
+                data = base64.b64decode(text, validate=True)
+            except (binascii.Error, ValueError):
+                data = text.encode("utf-8")
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def _plain(obj):
+    """Message / Options (pydantic) -> dict biasa."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    return obj
+
+
+def request_key(model, kwargs, ignore_options=OLLAMA_CASSETTE_IGNORE_OPTIONS):
+    """Hash kanonik satu request chat."""
+    messages = []
+    for m in kwargs.get("messages") or []:
+        m = dict(_plain(m))
+        if m.get("images"):
+            m["images"] = [_image_digest(img) for img in m["images"]]
+        messages.append({k: v for k, v in m.items() if v not in (None, [], "")})
+    options = {k: v for k, v in (_plain(kwargs.get("options")) or {}).items() if k not in ignore_options and v is not None}
+    canonical = {"model": model, "messages": messages, "options": options}
+    for key, value in kwargs.items():
+        if key not in _NON_KEY_FIELDS and key not in ("messages", "options") and value is not None:
+            canonical[key] = _plain(value)
+    raw = json.dumps(canonical, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Store JSONL append-only: key -> daftar rekaman berurutan."""
+
+    def __init__(self, path=OLLAMA_CASSETTE_PATH):
+        self.path = path
+        self.entries = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        self.counts = {"hits": 0, "misses": 0, "recorded": 0}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # baris terakhir terpotong (proses mati saat menulis)
+                self.entries.setdefault(entry["k"], []).append(entry)
+
+    def __len__(self):
+        return sum(len(v) for v in self.entries.values())
+
+    def next_entry(self, key, cycle=True, complete=False):
+        """
+        Rekaman berikutnya untuk key (None kalau belum ada / sudah habis dan cycle=False).
+        complete=True: rekaman partial dilewati (urutan dihitung terpisah).
+        """
+        with self._lock:
+            recorded = self.entries.get(key) or []
+            if complete:
+                recorded = [e for e in recorded if not e.get("partial")]
+            slot = (key, complete)
+            n = self._served.get(slot, 0)
+            if not recorded or (not cycle and n >= len(recorded)):
+                self.counts["misses"] += 1
+                return None
+            self._served[slot] = n + 1
+            self.counts["hits"] += 1
+            return recorded[n % len(recorded)]
+
+    def record(self, key, model, content, thinking=None, stats=None, partial=False):
+        entry = {"k": key, "model": model, "content": content}
+        if thinking:
+            entry["thinking"] = thinking
+        if stats:
+            entry["stats"] = {k: v for k, v in stats.items() if v is not None}
+        if partial:
+            entry["partial"] = True
+        entry["ts"] = round(time.time(), 3)
+        with self._lock:
+            # Satu write per baris (O_APPEND) -> aman dipakai beberapa worker sekaligus
+            with open(self.path, "ab") as f:
+                f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.entries.setdefault(key, []).append(entry)
+            # Rekaman baru sudah "dipakai" oleh call yang merekamnya
+            for slot in ((key, False),) if partial else ((key, False), (key, True)):
+                self._served[slot] = self._served.get(slot, 0) + 1
+            self.counts["recorded"] += 1
+
+
+def _response(entry, model):
+    stats = entry.get("stats") or {}
+    return ollama.ChatResponse(
+        model=model,
+        created_at=None,
+        done=True,
+        message=ollama.Message(role="assistant", content=entry.get("content") or "", thinking=entry.get("thinking")),
+        **{k: stats.get(k) for k in STAT_FIELDS},
+    )
+
+
+def _replay_stream(entry, model):
+    # Dipecah per kata supaya watcher di caption_streaming.py tetap bisa berhenti dini
+    for piece in re.findall(r"\S+\s*|\s+", entry.get("content") or ""):
+        yield ollama.ChatResponse(
+            model=model, done=False, message=ollama.Message(role="assistant", content=piece)
+        )
+    final = _response(entry, model)
+    final.message.content = ""
+    yield final
+
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+class CassetteClient:
+    """Pembungkus ollama.Client / OllamaPool: chat direkam / diputar ulang, method lain diteruskan."""
+
+    def __init__(self, inner, cassette, mode):
+        if mode not in MODES:
+            raise ValueError(f"OLLAMA_CASSETTE_MODE tidak dikenal: {mode} (pilih {', '.join(MODES)})")
+        self.inner = inner
+        self.cassette = cassette
+        self.mode = mode
+
+    def __getattr__(self, name):
+        # hosts / stats / ps / generate dst. tetap milik client asli (breaker_key, print_stats)
+        return getattr(self.inner, name)
+
+    def chat(self, model="", **kwargs):
+        if self.mode == "off":
+            return self.inner.chat(model=model, **kwargs)
+        key = request_key(model, kwargs)
+        if self.mode in ("replay", "auto"):
+            stream = bool(kwargs.get("stream"))
+            # Non-stream butuh respons utuh: rekaman partial tidak boleh jadi jawabannya
+            entry = self.cassette.next_entry(key, cycle=self.mode == "replay", complete=not stream)
+            if entry is not None:
+                return _replay_stream(entry, model) if stream else _response(entry, model)
+            if self.mode == "replay":
+                raise CassetteMissError(f"request {model} ({key[:12]}) tidak ada di cassette {self.cassette.path}")
+
+        result = self.inner.chat(model=model, **kwargs)
+        if kwargs.get("stream"):
+            return self._record_stream(result, key, model)
+        message = _field(result, "message") or {}
+        self.cassette.record(
+            key, model, _field(message, "content") or "", _field(message, "thinking"),
+            {k: _field(result, k) for k in STAT_FIELDS},
+        )
+        return result
+
+    def _record_stream(self, stream, key, model):
+        # Disimpan apa yang benar-benar diterima pemanggil (termasuk kalau berhenti dini)
+        content, thinking, stats, done = [], [], {}, False
+        try:
+            for chunk in stream:
+                message = _field(chunk, "message") or {}
+                content.append(_field(message, "content") or "")
+                thinking.append(_field(message, "thinking") or "")
+                if _field(chunk, "done"):
+                    done = True
+                    stats = {k: _field(chunk, k) for k in STAT_FIELDS}
+                yield chunk
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            if "".join(content):
+                self.cassette.record(key, model, "".join(content), "".join(thinking), stats, partial=not done)
+
+    def print_summary(self):
+        c = self.cassette.counts
+        print(
+            f"[CASSETTE] mode={self.mode} hit={c['hits']} miss={c['misses']} "
+            f"recorded={c['recorded']} total={len(self.cassette)} ({self.cassette.path})"
+        )
+
+
+def wrap_client(client, mode=OLLAMA_CASSETTE_MODE, path=OLLAMA_CASSETTE_PATH):
+    """Client apa adanya kalau mode off, selain itu CassetteClient (ringkasan dicetak saat exit)."""
+    if mode == "off":
+        return client
+    wrapped = CassetteClient(client, Cassette(path), mode)
+    print(f"[CASSETTE] mode={mode}, {len(wrapped.cassette)} rekaman di {path}")
+    atexit.register(wrapped.print_summary)
+    return wrapped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ringkasan isi cassette Ollama.")
+    parser.add_argument("--path", default=OLLAMA_CASSETTE_PATH)
+    args = parser.parse_args()
+
+    cassette = Cassette(args.path)
+    per_model = {}
+    for entries in cassette.entries.values():
+        for entry in entries:
+            s = per_model.setdefault(entry.get("model", "?"), {"records": 0, "keys": set(), "partial": 0, "eval": 0})
+            s["records"] += 1
+            s["keys"].add(entry["k"])
+            s["partial"] += bool(entry.get("partial"))
+            s["eval"] += (entry.get("stats") or {}).get("eval_count") or 0
+    print(f"[CASSETTE] {args.path}: {len(cassette)} rekaman, {len(cassette.entries)} request unik")
+    for model, s in sorted(per_model.items()):
+        print(
+            f"[CASSETTE] {model:<24} rekaman={s['records']:<6} unik={len(s['keys']):<6} "
+            f"partial={s['partial']:<4} eval_tokens={s['eval']}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,306 @@
+"""
+Pool koneksi Ollama multi-host.
+
+- OLLAMA_HOSTS="http://gpu1:11434,http://gpu2:11434" -> request disebar ke semua host.
+  Kalau kosong / cuma satu host, make_client() mengembalikan ollama.Client biasa.
+- Routing: host yang sudah memuat model (hasil /api/ps) diutamakan selama belum
+  penuh (OLLAMA_POOL_SPILL_AFTER), lalu least-outstanding-requests; seri -> p50 terendah.
+- Health: /api/ps dicek berkala di thread background. Gagal beruntun
+  (health check / request) -> host di-eject sementara, lalu dicoba lagi (half-open).
+- Error koneksi / 5xx -> request dicoba ulang di host lain (failover).
+- stats() -> request, error, outstanding, model termuat, latency p50/p95 per host.
+
+Env:
+    OLLAMA_HOSTS                 daftar host dipisah koma
+    OLLAMA_POOL_PS_INTERVAL      detik antar health check /api/ps (default 10)
+    OLLAMA_POOL_EJECT_AFTER      gagal beruntun sebelum host di-eject (default 3)
+    OLLAMA_POOL_EJECT_SECONDS    lama host di-eject (default 30)
+    OLLAMA_POOL_SPILL_AFTER      outstanding di semua host warm sebelum tumpah ke host dingin (default 2)
+
+Demo / uji beban (mis: ke stub server lokal):
+    python ollama_pool.py --hosts http://127.0.0.1:11501,http://127.0.0.1:11502 --model gemma3:27b --requests 40
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import ollama
+
+from ollama_cassette import wrap_client
+
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()]
+PS_INTERVAL = float(os.getenv("OLLAMA_POOL_PS_INTERVAL", "10"))
+EJECT_AFTER = int(os.getenv("OLLAMA_POOL_EJECT_AFTER", "3"))
+EJECT_SECONDS = float(os.getenv("OLLAMA_POOL_EJECT_SECONDS", "30"))
+# Host warm dipakai sampai outstanding-nya >= nilai ini; setelah itu boleh tumpah ke host dingin
+SPILL_AFTER = int(os.getenv("OLLAMA_POOL_SPILL_AFTER", "2"))
+HEALTH_TIMEOUT = 3.0
+LATENCY_WINDOW = 256
+
+
+class NoHealthyHostError(ConnectionError):
+    """Semua host sedang di-eject / gagal."""
+
+
+def is_host_failure(exc):
+    """Error yang berarti host bermasalah (bukan request-nya): koneksi putus, timeout, 5xx."""
+    if isinstance(exc, ollama.ResponseError):
+        return exc.status_code < 0 or exc.status_code >= 500
+    return isinstance(exc, (ConnectionError, OSError, httpx.TransportError))
+
+
+class _HostState:
+    def __init__(self, host, client_kwargs):
+        self.host = host
+        self.client = ollama.Client(host=host, **client_kwargs)
+        self.health_client = ollama.Client(host=host, timeout=HEALTH_TIMEOUT)
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.loaded_models = set()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def available(self, now):
+        # Setelah masa eject lewat, host boleh dicoba lagi (half-open)
+        return self.ejected_until <= now
+
+    def p50(self):
+        return statistics.median(self.latencies) if self.latencies else 0.0
+
+
+class OllamaPool:
+    """Pengganti ollama.Client (chat/generate/ps) yang menyebar request ke beberapa host."""
+
+    def __init__(self, hosts, ps_interval=PS_INTERVAL, eject_after=EJECT_AFTER,
+                 eject_seconds=EJECT_SECONDS, spill_after=SPILL_AFTER, **client_kwargs):
+        if not hosts:
+            raise ValueError("OllamaPool butuh minimal satu host")
+        self.hosts = [_HostState(h, client_kwargs) for h in hosts]
+        self.ps_interval = ps_interval
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.spill_after = spill_after
+        self._lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._watcher_pid = None
+
+    # ---------- health / model termuat ----------
+    def refresh(self):
+        """Cek /api/ps semua host sekarang (sinkron)."""
+        for state in self.hosts:
+            try:
+                resp = state.health_client.ps()
+                models = {m.get("model") or m.get("name") for m in (resp.get("models") or [])}
+                with self._lock:
+                    state.loaded_models = {m for m in models if m}
+                self._record_success(state)
+            except Exception as e:
+                self._record_failure(state, e, source="health")
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(self.ps_interval)
+            self.refresh()
+
+    def _ensure_watcher(self):
+        # Thread health check sekali per proses (aman setelah fork)
+        if self.ps_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        # Request lain menunggu health check pertama selesai supaya tidak dirutekan ke host mati
+        with self._init_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self.refresh()
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch_loop, name="ollama-pool-health", daemon=True).start()
+
+    def _record_success(self, state):
+        with self._lock:
+            state.consecutive_failures = 0
+            state.ejected_until = 0.0
+
+    def _record_failure(self, state, exc, source="request"):
+        with self._lock:
+            if source == "request":
+                state.errors += 1
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self.eject_after:
+                newly = state.ejected_until <= time.monotonic()
+                state.ejected_until = time.monotonic() + self.eject_seconds
+                state.loaded_models = set()
+                if newly:
+                    print(f"[OLLAMA POOL] eject {state.host} {self.eject_seconds:.0f}s ({source}: {exc})")
+
+    # ---------- routing ----------
+    def _acquire(self, model, exclude=()):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [s for s in self.hosts if s.available(now) and s not in exclude]
+            if not candidates:
+                raise NoHealthyHostError(f"tidak ada host Ollama sehat untuk model {model}")
+            warm = [s for s in candidates if model in s.loaded_models]
+            pool = candidates
+            if warm and min(s.outstanding for s in warm) < self.spill_after:
+                pool = warm
+            state = min(pool, key=lambda s: (s.outstanding, s.p50()))
+            state.outstanding += 1
+            state.requests += 1
+            return state
+
+    def _release(self, state, model, latency_s=None):
+        with self._lock:
+            state.outstanding -= 1
+            if latency_s is not None:
+                state.latencies.append(latency_s * 1000)
+                # Request sukses -> model sekarang termuat di host ini
+                state.loaded_models.add(model)
+
+    def _call(self, method, model, kwargs):
+        self._ensure_watcher()
+        tried = []
+        while True:
+            state = self._acquire(model, exclude=tried)
+            start = time.perf_counter()
+            try:
+                result = getattr(state.client, method)(model=model, **kwargs)
+            except Exception as e:
+                self._release(state, model)
+                if not is_host_failure(e):
+                    raise
+                self._record_failure(state, e)
+                tried.append(state)
+                if len(tried) >= len(self.hosts):
+                    raise
+                print(f"[OLLAMA POOL] {state.host} gagal ({e}), failover")
+                continue
+
+            if kwargs.get("stream"):
+                return self._wrap_stream(result, state, model, start)
+            self._release(state, model, time.perf_counter() - start)
+            self._record_success(state)
+            return result
+
+    def _wrap_stream(self, stream, state, model, start):
+        # outstanding baru dilepas saat stream selesai / ditutup pemanggil
+        ok = False
+        try:
+            for chunk in stream:
+                yield chunk
+            ok = True
+        except GeneratorExit:
+            ok = True
+            raise
+        except Exception as e:
+            if is_host_failure(e):
+                self._record_failure(state, e)
+            raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            self._release(state, model, (time.perf_counter() - start) if ok else None)
+            if ok:
+                self._record_success(state)
+
+    # ---------- API kompatibel ollama.Client ----------
+    def chat(self, model="", **kwargs):
+        return self._call("chat", model, kwargs)
+
+    def generate(self, model="", **kwargs):
+        return self._call("generate", model, kwargs)
+
+    def ps(self):
+        """Gabungan /api/ps semua host sehat."""
+        models = []
+        now = time.monotonic()
+        for state in self.hosts:
+            if not state.available(now):
+                continue
+            try:
+                models.extend(state.health_client.ps().get("models") or [])
+            except Exception as e:
+                self._record_failure(state, e, source="health")
+        return {"models": models}
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            report = {}
+            for s in self.hosts:
+                lat = sorted(s.latencies)
+                report[s.host] = {
+                    "healthy": s.available(now),
+                    "outstanding": s.outstanding,
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "loaded_models": sorted(s.loaded_models),
+                    "latency_ms_p50": round(lat[len(lat) // 2], 1) if lat else None,
+                    "latency_ms_p95": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 1) if lat else None,
+                    "latency_ms_mean": round(statistics.mean(lat), 1) if lat else None,
+                }
+            return report
+
+    def print_stats(self):
+        print(f"[OLLAMA POOL] {'host':<32} {'ok':>3} {'req':>5} {'err':>4} {'out':>4} {'p50_ms':>8} {'p95_ms':>8}  models")
+        for host, s in self.stats().items():
+            print(
+                f"[OLLAMA POOL] {host:<32} {'y' if s['healthy'] else 'n':>3} {s['requests']:>5} {s['errors']:>4} "
+                f"{s['outstanding']:>4} {str(s['latency_ms_p50']):>8} {str(s['latency_ms_p95']):>8}  "
+                f"{','.join(s['loaded_models'])}"
+            )
+
+
+def make_client(default_host, **client_kwargs):
+    """
+    OllamaPool kalau OLLAMA_HOSTS berisi >1 host, selain itu ollama.Client biasa.
+    OLLAMA_CASSETTE_MODE != off -> dibungkus record / replay (lihat ollama_cassette.py).
+    """
+    if len(OLLAMA_HOSTS) > 1:
+        print(f"[OLLAMA POOL] {len(OLLAMA_HOSTS)} host: {', '.join(OLLAMA_HOSTS)}")
+        return wrap_client(OllamaPool(OLLAMA_HOSTS, **client_kwargs))
+    return wrap_client(ollama.Client(host=OLLAMA_HOSTS[0] if OLLAMA_HOSTS else default_host, **client_kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji beban pool Ollama multi-host.")
+    parser.add_argument("--hosts", default=",".join(OLLAMA_HOSTS), help="host dipisah koma")
+    parser.add_argument("--model", default="gemma3:27b")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    hosts = [h.strip() for h in args.hosts.split(",") if h.strip()]
+    if not hosts:
+        print("[OLLAMA POOL] isi --hosts atau OLLAMA_HOSTS")
+        return 1
+    pool = OllamaPool(hosts)
+
+    def one(i):
+        try:
+            pool.chat(
+                model=args.model,
+                messages=[{"role": "user", "content": f"Balas 'ok' ({i})"}],
+                options={"num_predict": 8},
+            )
+            return True
+        except Exception as e:
+            print(f"[OLLAMA POOL] request {i} gagal: {e}")
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        ok = sum(executor.map(one, range(args.requests)))
+    print(f"[OLLAMA POOL] {ok}/{args.requests} sukses dalam {time.perf_counter() - start:.2f}s")
+    pool.print_stats()
+    return 0 if ok == args.requests else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+import json
+import os
+
+# ====== PROFIL RUNTIME OLLAMA PER MODEL ======
+# Tiap call client.chat dapat keep_alive + options (num_ctx, num_predict) sesuai model & tahap:
+#   "vlm"     -> deskripsi gambar (butuh konteks untuk token gambar, output panjang)
+#   "caption" -> few-shot / zero-shot caption (prompt ~1.5k token, output pendek)
+#
+# num_ctx sengaja per model (bukan per tahap): kalau VLM & LLM model yang sama dengan
+# num_ctx beda, Ollama me-reload runner tiap ganti tahap.
+#
+# OLLAMA_PROFILES=0          -> matikan (call tanpa options tambahan, perilaku lama)
+# OLLAMA_PROFILES_PATH=x.json -> override/tambah profil, format sama dengan PROFILES
+# OLLAMA_KEEP_ALIVE=1h        -> override keep_alive semua profil
+OLLAMA_PROFILES_ENABLED = os.getenv("OLLAMA_PROFILES", "1").strip().lower() not in ("0", "false", "no", "off")
+OLLAMA_PROFILES_PATH = os.getenv("OLLAMA_PROFILES_PATH", "")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "")
+
+STAGES = ("vlm", "caption")
+
+# Key = prefix tag model (paling panjang yang cocok menang), "default" = fallback.
+# Model thinking (qwen3.x) dapat num_predict lebih longgar supaya reasoning tidak terpotong.
+PROFILES = {
+    "default": {
+        "keep_alive": "30m",
+        "num_ctx": 8192,
+        "vlm": {"num_predict": 768},
+        "caption": {"num_predict": 128},
+    },
+    "gemma3": {
+        # 256 token per gambar
+        "num_ctx": 4096,
+    },
+    "llama4": {
+        # gambar dipecah tile (~144 token per tile)
+        "num_ctx": 8192,
+    },
+    "qwen3.5": {
+        "num_ctx": 8192,
+        "vlm": {"num_predict": 2048},
+        "caption": {"num_predict": 1024},
+    },
+    "qwen3-vl": {
+        # token gambar ikut resolusi (patch 28px): gambar besar butuh konteks lebih
+        "num_ctx": 8192,
+        "vlm": {"num_predict": 2048},
+        "caption": {"num_predict": 1024},
+    },
+}
+
+
+def _load_profiles():
+    profiles = {name: dict(p) for name, p in PROFILES.items()}
+    if not OLLAMA_PROFILES_PATH:
+        return profiles
+    try:
+        with open(OLLAMA_PROFILES_PATH, encoding="utf-8") as f:
+            overrides = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[OLLAMA PROFILE Warning] gagal baca {OLLAMA_PROFILES_PATH}: {e}")
+        return profiles
+    for name, override in overrides.items():
+        merged = profiles.setdefault(name, {})
+        for key, value in override.items():
+            if key in STAGES:
+                merged[key] = dict(merged.get(key, {}), **value)
+            else:
+                merged[key] = value
+    return profiles
+
+
+_PROFILES = _load_profiles()
+
+
+def _match(model):
+    tag = str(model or "").strip().lower()
+    matches = [name for name in _PROFILES if name != "default" and tag.startswith(name)]
+    return max(matches, key=len) if matches else None
+
+
+def get_profile(model, stage):
+    """
+    Profil efektif {"keep_alive", "num_ctx", "num_predict"} untuk (model, tahap),
+    hasil merge default <- profil model.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"stage tidak dikenal: {stage} (pilihan: {STAGES})")
+    base = _PROFILES["default"]
+    specific = _PROFILES.get(_match(model), {})
+    profile = {
+        "keep_alive": specific.get("keep_alive", base.get("keep_alive")),
+        "num_ctx": specific.get("num_ctx", base.get("num_ctx")),
+    }
+    profile.update(base.get(stage, {}))
+    profile.update(specific.get(stage, {}))
+    if OLLAMA_KEEP_ALIVE:
+        profile["keep_alive"] = OLLAMA_KEEP_ALIVE
+    return profile
+
+
+def chat_kwargs(model, stage, options=None, n_best=1):
+    """
+    kwargs tambahan untuk client.chat: {"options": ..., "keep_alive": ...}.
+    Options dari pemanggil (temperature dll) tetap dipakai; num_predict tahap caption
+    dikali n_best karena K kandidat ditulis dalam satu respons.
+    """
+    if not OLLAMA_PROFILES_ENABLED:
+        return {"options": dict(options)} if options else {}
+    return profile_kwargs(get_profile(model, stage), options, n_best=n_best)
+
+
+def profile_kwargs(profile, options=None, n_best=1):
+    """kwargs client.chat dari satu profil efektif (lihat get_profile)."""
+    options = dict(options or {})
+    if profile.get("num_ctx"):
+        options.setdefault("num_ctx", int(profile["num_ctx"]))
+    if profile.get("num_predict"):
+        options.setdefault("num_predict", int(profile["num_predict"]) * max(1, int(n_best)))
+
+    kwargs = {"options": options}
+    if profile.get("keep_alive") is not None:
+        kwargs["keep_alive"] = profile["keep_alive"]
+    return kwargs
@@ -0,0 +1,233 @@
+"""
+Tracing latency per tahap pipeline meme.
+
+    start_trace(MODEL_LLM)           # awal meme_pipeline_*
+    with span("vlm"):                # tiap tahap
+        desc = describe_image_with_ollama(...)
+    trace_columns()                  # {"catalog_ms": .., "vlm_ms": .., ...} -> kolom CSV
+
+Tiap span juga masuk histogram log-linear (gaya HDR, error relatif <= 1/32) per
+(tahap, model) di proses ini; print_summary() mencetak p50/p90/p99 per tahap.
+Durasi tahap di server (/caption-image) dibaca dari header Server-Timing.
+
+Sweep multi-proses (sweep_queue.py) -> ringkasan dari kolom CSV:
+    python pipeline_trace.py --csv meme_generation_results.csv --since-run-id 120
+
+PIPELINE_TRACE=0 -> span tidak dicatat (kolom *_ms kosong).
+"""
+import argparse
+import csv
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PIPELINE_TRACE = os.getenv("PIPELINE_TRACE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# Urutan tahap = urutan kolom CSV. render = POST /caption-image (wall clock di client),
+# render_draw / png_write = bagian render yang dilaporkan server lewat Server-Timing.
+TRACE_STAGES = ("catalog", "vlm", "llm", "render", "render_draw", "png_write", "clip")
+TRACE_COLUMNS = [f"{stage}_ms" for stage in TRACE_STAGES]
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def _bucket_index(value):
+    """Index bucket log-linear untuk nilai integer >= 0 (mikrodetik)."""
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKETS
+
+
+def _bucket_range(index):
+    """(batas bawah, lebar) bucket dalam mikrodetik."""
+    if index < SUB_BUCKETS:
+        return index, 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << shift, 1 << shift
+
+
+class LatencyHistogram:
+    """Histogram latency (ms) dengan bucket log-linear; memori O(jumlah bucket terisi)."""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def record(self, ms):
+        ms = max(0.0, float(ms))
+        index = _bucket_index(int(ms * 1000))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = ms if self.max_ms is None else max(self.max_ms, ms)
+
+    def merge(self, other):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total_ms += other.total_ms
+        for attr, pick in (("min_ms", min), ("max_ms", max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+
+    def percentile(self, q):
+        """Nilai (ms) di persentil q (0-100): titik tengah bucket, dijepit ke min/max asli."""
+        if not self.count:
+            return None
+        rank = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, width = _bucket_range(index)
+                value = (low + width / 2) / 1000
+                return min(max(value, self.min_ms), self.max_ms)
+        return self.max_ms
+
+    def mean(self):
+        return self.total_ms / self.count if self.count else None
+
+
+_local = threading.local()
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def _record(stage, model, ms):
+    with _histograms_lock:
+        hist = _histograms.get((stage, model))
+        if hist is None:
+            hist = _histograms[(stage, model)] = LatencyHistogram()
+        hist.record(ms)
+
+
+def start_trace(model):
+    """Mulai trace baru untuk satu run pipeline di thread ini."""
+    _local.trace = {"model": model, "stages": {}}
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+def add_span(stage, ms, model=None):
+    """Catat durasi tahap (ms) yang diukur di luar span(), mis. dari Server-Timing."""
+    if not PIPELINE_TRACE:
+        return
+    trace = current_trace()
+    if model is None:
+        model = trace["model"] if trace else "-"
+    if trace is not None:
+        trace["stages"][stage] = trace["stages"].get(stage, 0.0) + ms
+    _record(stage, model, ms)
+
+
+@contextmanager
+def span(stage, model=None):
+    """Ukur satu tahap. Tahap yang sama dalam satu run dijumlahkan (mis. retry)."""
+    if not PIPELINE_TRACE:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(stage, (time.perf_counter() - start) * 1000, model)
+
+
+def record_server_timing(header):
+    """Parse header Server-Timing ("png_write;dur=12.3, render_draw;dur=40") ke span."""
+    for part in str(header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name not in TRACE_STAGES:
+            continue
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                try:
+                    add_span(name, float(value))
+                except ValueError:
+                    pass
+
+
+def trace_columns():
+    """Durasi per tahap run aktif untuk kolom CSV (string kosong untuk tahap yang tidak jalan)."""
+    trace = current_trace()
+    stages = trace["stages"] if trace else {}
+    return {
+        f"{stage}_ms": round(stages[stage], 1) if stage in stages else ""
+        for stage in TRACE_STAGES
+    }
+
+
+def histograms():
+    with _histograms_lock:
+        return dict(_histograms)
+
+
+def histograms_from_csv(csv_path, since_run_id=0):
+    """Bangun histogram (tahap, model) dari kolom *_ms CSV hasil (untuk sweep multi-proses)."""
+    result = {}
+    try:
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    if int(row.get("run_id") or 0) <= since_run_id:
+                        continue
+                except ValueError:
+                    continue
+                model = row.get("model") or "-"
+                for stage in TRACE_STAGES:
+                    value = row.get(f"{stage}_ms")
+                    if value in (None, ""):
+                        continue
+                    hist = result.get((stage, model))
+                    if hist is None:
+                        hist = result[(stage, model)] = LatencyHistogram()
+                    hist.record(float(value))
+    except OSError as e:
+        print(f"[TRACE Warning] gagal baca {csv_path}: {e}")
+    return result
+
+
+def print_summary(hists=None, title="per tahap"):
+    hists = histograms() if hists is None else hists
+    if not hists:
+        print("[TRACE] Tidak ada span tercatat.")
+        return
+    order = {stage: i for i, stage in enumerate(TRACE_STAGES)}
+
+    def fmt(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    print(f"\n[TRACE] Latency {title} (ms)")
+    print(
+        f"[TRACE] {'stage':<12} {'model':<24} {'n':>5} {'p50':>9} {'p90':>9} "
+        f"{'p99':>9} {'max':>9} {'mean':>9}"
+    )
+    for (stage, model), hist in sorted(hists.items(), key=lambda kv: (order.get(kv[0][0], 99), kv[0])):
+        print(
+            f"[TRACE] {stage:<12} {model:<24} {hist.count:>5} {fmt(hist.percentile(50)):>9} "
+            f"{fmt(hist.percentile(90)):>9} {fmt(hist.percentile(99)):>9} {fmt(hist.max_ms):>9} "
+            f"{fmt(hist.mean()):>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ringkasan latency per tahap dari CSV hasil.")
+    parser.add_argument("--csv", default="meme_generation_results.csv")
+    parser.add_argument("--since-run-id", type=int, default=0, help="hanya baris dengan run_id > nilai ini")
+    args = parser.parse_args()
+    print_summary(histograms_from_csv(args.csv, args.since_run_id), title=f"dari {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
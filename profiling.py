@@ -0,0 +1,231 @@
+"""
+Profiling per run (driver sweep) atau per request (Flask), mati secara default.
+
+Mode:
+    cprofile -> <PROFILE_DIR>/<nama>-<waktu>-<pid>.pstats  (buka: python -m pstats / snakeviz)
+    sample   -> <PROFILE_DIR>/<nama>-<waktu>-<pid>.collapsed  (stack "a;b;c count", langsung
+                masuk flamegraph.pl / speedscope). Sampler = thread yang membaca
+                sys._current_frames() tiap 1/PROFILE_SAMPLE_HZ detik, overhead kecil dan
+                ikut melihat thread lain (prefetch, heartbeat, pool).
+
+Driver: --profile cprofile|sample di run_custom_models.py, run_all_models_001_010.py,
+auto_run_until_clear.py dan sweep_queue.py worker (cProfile cuma thread utama).
+
+Flask: set PROFILE_REQUESTS=1, lalu kirim header "X-Profile: cprofile|sample" atau
+query ?profile=cprofile|sample; path hasil ada di header respons X-Profile-Path.
+Tanpa PROFILE_REQUESTS, hook cuma satu cek boolean per request.
+
+Env:
+    PROFILE_DIR         folder output (default profiles)
+    PROFILE_SAMPLE_HZ   frekuensi sampler (default 200)
+    PROFILE_REQUESTS    izinkan profiling per request di meme API (default 0)
+
+Ringkasan file .pstats:
+    python profiling.py profiles/run_custom_models-20260101-120000-123.pstats --top 30
+"""
+import argparse
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_HZ = float(os.getenv("PROFILE_SAMPLE_HZ", "200"))
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_MODES = ("cprofile", "sample")
+
+_seq = itertools.count(1)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Sampler stack berkala -> hitungan stack collapsed (root;...;leaf)."""
+
+    def __init__(self, hz=PROFILE_SAMPLE_HZ, thread_id=None):
+        self.interval = 1.0 / max(1.0, hz)
+        self.thread_id = thread_id  # None = semua thread
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        for tid, frame in sys._current_frames().items():
+            if tid == own or (self.thread_id is not None and tid != self.thread_id):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+        self.samples += 1
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+
+class Profile:
+    """Satu scope profiling; start() / stop() -> path file hasil."""
+
+    def __init__(self, name, mode, thread_id=None, profile_dir=None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode profiling tidak dikenal: {mode} (pilih {', '.join(PROFILE_MODES)})")
+        self.name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "profile"
+        self.mode = mode
+        self.thread_id = thread_id
+        self.profile_dir = profile_dir or PROFILE_DIR
+        self.path = None
+        self.seconds = None
+        self._impl = None
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            self._impl = cProfile.Profile()
+            self._impl.enable()
+        else:
+            self._impl = StackSampler(thread_id=self.thread_id)
+            self._impl.start()
+        return self
+
+    def stop(self):
+        if self.mode == "cprofile":
+            self._impl.disable()
+        else:
+            self._impl.stop()
+        self.seconds = time.perf_counter() - self._start
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self.profile_dir, f"{self.name}-{stamp}-{os.getpid()}-{next(_seq)}")
+        if self.mode == "cprofile":
+            self.path = base + ".pstats"
+            self._impl.dump_stats(self.path)
+        else:
+            self.path = base + ".collapsed"
+            self._impl.write_collapsed(self.path)
+        return self.path
+
+    def top(self, limit=15, sort="cumulative"):
+        """Ringkasan teks fungsi teratas (cprofile) atau stack leaf teratas (sample)."""
+        if self.mode == "cprofile":
+            out = io.StringIO()
+            pstats.Stats(self._impl, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+        leaves = {}
+        for stack, count in self._impl.counts.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        total = max(1, sum(leaves.values()))
+        ranked = sorted(leaves.items(), key=lambda item: -item[1])[:limit]
+        return "\n".join(f"{count:>7} {count / total:6.1%}  {leaf}" for leaf, count in ranked)
+
+
+@contextmanager
+def profile_scope(name, mode=None, verbose=True):
+    """
+    with profile_scope("run_custom_models", args.profile): ...
+    mode None / "" / "off" -> tanpa profiling (yield None).
+    """
+    if not mode or mode == "off":
+        yield None
+        return
+    prof = Profile(name, mode).start()
+    try:
+        yield prof
+    finally:
+        path = prof.stop()
+        if verbose:
+            print(f"\n[PROFILE] {mode} {prof.seconds:.1f}s -> {path}")
+            print(prof.top())
+
+
+def add_profile_argument(parser):
+    parser.add_argument(
+        "--profile", choices=PROFILE_MODES, default=None,
+        help=f"profiling run ini, hasil ke {PROFILE_DIR}/ (cprofile -> .pstats, sample -> .collapsed)",
+    )
+
+
+# ---------- integrasi Flask ----------
+def _requested_mode(request):
+    mode = (request.headers.get("X-Profile") or request.args.get("profile") or "").strip().lower()
+    return mode if mode in PROFILE_MODES else None
+
+
+def init_app(app):
+    """Pasang hook profiling per request (hanya kalau PROFILE_REQUESTS=1)."""
+    if not PROFILE_REQUESTS:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _profile_before_request():
+        mode = _requested_mode(request)
+        if mode is None:
+            return
+        name = f"req-{request.endpoint or 'unmatched'}"
+        try:
+            g._profile = Profile(name, mode, thread_id=threading.get_ident()).start()
+        except ValueError as e:
+            # cProfile lain sedang aktif di thread ini
+            print(f"[PROFILE Warning] {e}")
+
+    @app.after_request
+    def _profile_after_request(response):
+        prof = g.pop("_profile", None)
+        if prof is not None:
+            response.headers["X-Profile-Path"] = prof.stop()
+            response.headers["X-Profile-Seconds"] = f"{prof.seconds:.4f}"
+        return response
+
+    @app.teardown_request
+    def _profile_teardown(exc):
+        # Handler raise -> after_request tidak jalan; profiler tetap dihentikan
+        prof = g.pop("_profile", None)
+        if prof is not None:
+            print(f"[PROFILE] request gagal, profil tetap disimpan -> {prof.stop()}")
+
+    print(f"[PROFILE] profiling per request aktif (X-Profile / ?profile=), output ke {PROFILE_DIR}/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ringkasan file .pstats hasil profiling.")
+    parser.add_argument("path", help="file .pstats")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--sort", default="cumulative", help="cumulative, tottime, calls, ...")
+    args = parser.parse_args()
+    pstats.Stats(args.path).strip_dirs().sort_stats(args.sort).print_stats(args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,84 @@
+import os
+from functools import lru_cache
+
+from prompts import (
+    FEWSHOT_CAPTIONS,
+    GENERATE_FINAL_CAPTION_PROMPT,
+    GENERATE_FINAL_CAPTION_SYSTEM_PROMPT,
+    GENERATE_FINAL_CAPTION_USER_PROMPT,
+)
+
+# ====== MODE PENYUSUNAN PROMPT FEW-SHOT ======
+# "legacy" : satu user message, {description} di atas (prompt lama, hasil eksperimen tetap sebanding)
+# "stable" : system message statis per (topik, bahasa, single/multi) + user message pendek di akhir,
+#            supaya prefix prompt identik antar template dan KV cache Ollama bisa dipakai ulang
+PROMPT_ASSEMBLY_MODES = ("legacy", "stable")
+PROMPT_ASSEMBLY = os.getenv("PROMPT_ASSEMBLY", "legacy").strip().lower()
+
+
+def resolve_mode(mode=None):
+    mode = (mode or PROMPT_ASSEMBLY or "legacy").strip().lower()
+    if mode not in PROMPT_ASSEMBLY_MODES:
+        raise ValueError(f"PROMPT_ASSEMBLY tidak dikenal: {mode} (pilihan: {PROMPT_ASSEMBLY_MODES})")
+    return mode
+
+
+@lru_cache(maxsize=None)
+def build_fewshot_block(topic_key, language, single_box):
+    """Blok contoh few-shot untuk (topik, bahasa, single/multi). Hasil di-cache: string identik tiap call."""
+    topic_data = (FEWSHOT_CAPTIONS.get(topic_key or "thesis") or FEWSHOT_CAPTIONS["thesis"]).get(language, {})
+    fewshots_raw = topic_data.get("single" if single_box else "multi", [])
+
+    if single_box:
+        # Format: "Template: <desc>\nCaption: <cap tanpa ||>"
+        return "\n\n".join(
+            f'Template: {item.get("description", "-")}\nCaption: {item.get("caption", "").strip()}'
+            for item in fewshots_raw if item.get("caption", "").strip()
+        )
+    # Format: "Template: <desc>\nCaption: <cap dengan ||>"
+    return "\n\n".join(
+        f'Template: {item.get("description", "-")}\nCaption: {item.get("caption", "")}'
+        for item in fewshots_raw if item.get("caption", "").strip()
+    )
+
+
+@lru_cache(maxsize=None)
+def build_final_caption_system_prompt(topic_key, language, single_box):
+    """System prompt statis (instruksi + teknik humor + few-shot) untuk mode 'stable'."""
+    templates = GENERATE_FINAL_CAPTION_SYSTEM_PROMPT.get(language, GENERATE_FINAL_CAPTION_SYSTEM_PROMPT["id"])
+    template = templates["single_box" if single_box else "multi_box"]
+    return template.format(fewshot_block=build_fewshot_block(topic_key, language, single_box))
+
+
+def build_final_caption_messages(description, topic, box_count=2, topic_key=None, language="id", mode=None):
+    """
+    Susun messages untuk client.chat caption few-shot.
+
+    - box_count == 1  -> satu caption (tanpa '||')
+    - box_count >= 2  -> N caption dalam satu baris: cap1 || cap2 || ... || capN
+    """
+    single_box = box_count == 1
+    fewshot_key = "single_box" if single_box else "multi_box"
+
+    if resolve_mode(mode) == "stable":
+        user_templates = GENERATE_FINAL_CAPTION_USER_PROMPT.get(language, GENERATE_FINAL_CAPTION_USER_PROMPT["id"])
+        return [
+            {"role": "system", "content": build_final_caption_system_prompt(topic_key, language, single_box)},
+            {
+                "role": "user",
+                "content": user_templates[fewshot_key].format(
+                    description=description,
+                    topic=topic,
+                    box_count=box_count,
+                ),
+            },
+        ]
+
+    prompt_template = GENERATE_FINAL_CAPTION_PROMPT.get(language, GENERATE_FINAL_CAPTION_PROMPT["id"])
+    prompt = prompt_template[fewshot_key].format(
+        description=description,
+        topic=topic,
+        box_count=box_count,
+        fewshot_block=build_fewshot_block(topic_key, language, single_box),
+    )
+    return [{"role": "user", "content": prompt}]
@@ -163,6 +163,156 @@ Caption:"""
     }
 }
 
+# ============================================================
+# GENERATE FINAL CAPTION PROMPT (FEW-SHOT) — MODE PREFIX-STABLE
+# Bagian statis (instruksi, teknik humor, larangan, contoh few-shot) ada di
+# system message dan identik untuk setiap (topik, bahasa, single/multi), jadi
+# Ollama bisa reuse KV cache prompt-nya. Bagian variabel (deskripsi, topik,
+# jumlah box) ditaruh di user message yang pendek, paling akhir.
+# ============================================================
+GENERATE_FINAL_CAPTION_SYSTEM_PROMPT = {
+    "id": {
+        "single_box": """Kamu kreator meme mahasiswa Indonesia yang jago bikin caption viral.
+
+TUGAS: Buat SATU caption meme (satu kalimat, tanpa ||) untuk template dan topik yang diberikan di pesan user.
+
+PANDUAN:
+- Cocokkan ekspresi/mood gambar dengan tone caption
+- Caption harus MEMPERKUAT mood gambar, bukan sekadar mendeskripsikan ulang gambarnya
+- Boleh pakai detail visual kalau membantu, tapi tidak wajib
+- Spesifik pada topik: senggol situasi nyata mahasiswa, bukan klise generik
+- Utamakan detail konkret (jam, angka, konteks kejadian), bukan kata abstrak umum
+- Singkat dan langsung kena: maks 8 kata, kalimat utuh
+- Bahasa gaul/santai, jangan formal
+- Prioritaskan yang relatable dan punya kejutan kecil di ujung kalimat
+
+TEKNIK HUMOR (pilih yang paling pas dengan gambar):
+- Ironi pahit: ekspektasi mulia vs. realita memalukan  → "niat produktif, ketiduran jam 4 sore"
+- Hiperbola relatable: dramatisasi hal kecil yang terasa besar  → "revisi titik-koma, begadang semalam"
+- Self-sabotage: diri sendiri jadi musuh  → "niat cicil seminggu, kelar semalam"
+- Deadpan twist: dua hal yang gak nyambung tapi justru kena  → "ini gampang, tapi yang ngomong dosen" (katanya doang padahal mah susah)
+
+LARANGAN:
+- Format label ("Dosen: ...", "Gue: ...")
+- Kata "saya"/"anda"
+- Jangan gunakan kata "PR" (pakai "tugas")
+- Kalimat terpotong
+OUTPUT: HANYA satu baris caption, tanpa penjelasan.
+
+CONTOH CAPTION (pelajari pola humor dan gaya bahasanya):
+{fewshot_block}""",
+        "multi_box": """Kamu kreator meme mahasiswa Indonesia yang jago bikin caption viral.
+
+TUGAS: Buat SATU caption dengan jumlah box sesuai pesan user, format SATU BARIS:
+teks1 || teks2 || ... || teksN
+
+KETENTUAN:
+- 1–7 kata per box, bahasa gaul/santai
+- Jangan gunakan kata "saya"/"anda"
+- Caption harus MEMPERKUAT mood gambar — bukan mendeskripsikan ulang gambarnya
+- Boleh pakai detail visual kalau relevan, tapi tidak wajib
+- Box pertama = setup konteks, box terakhir = punchline yang lebih nyesek/ironis
+- Utamakan situasi yang sering kejadian di kehidupan mahasiswa
+
+TEKNIK HUMOR (pilih yang paling pas dengan gambar):
+- Setup mulia → punchline memalukan  → "bimbingan besok || baru buka file"
+- Kontras waktu spesifik  → "deadline jam 2 || mulai jam 1"
+- Kesamaan nasib ironis  → "minta jawaban temen || temen juga nebak"
+- Deadpan ironis  → "ini gampang || yang ngomong dosen" (katanya doang padahal mah susah)
+
+LARANGAN: Format label, kata "saya"/"anda", dan jangan gunakan kata "PR" (pakai "tugas").
+OUTPUT: HANYA satu baris dengan pemisah ||, tanpa penjelasan.
+
+CONTOH CAPTION (pelajari struktur setup→punchline-nya):
+{fewshot_block}"""
+    },
+    "en": {
+        "single_box": """You are an Indonesian college meme creator who is great at making viral captions.
+
+TASK: Create ONE meme caption (single sentence, no ||) for the template and topic given in the user message.
+
+GUIDELINES:
+- Match the image's expression/mood to the caption tone
+- Caption must REINFORCE the image mood, not only restate the visual
+- Visual details are optional if helpful, not required
+- Be specific to the topic: reference real student situations, avoid generic cliches
+- Prioritize concrete details (time, numbers, event context), avoid abstract generic wording
+- Short and punchy: max 8 words, complete sentence
+- Use casual/slang Indonesian, not formal
+- Prioritize relatability and a small surprise at the end of the sentence
+
+HUMOR TECHNIQUE (pick what best fits the image):
+- Bitter irony: noble expectation vs embarrassing reality  -> "planned to be productive, slept at 4 PM"
+- Relatable hyperbole: dramatize small things that feel huge  -> "revised one comma, up all night"
+- Self-sabotage: yourself becomes your own enemy  -> "planned one week, finished in one night"
+- Deadpan twist: two mismatched things that unexpectedly hit  -> "this is easy, said the lecturer" (only words, reality says otherwise)
+
+FORBIDDEN:
+- Label formats ("Lecturer: ...", "Me: ...")
+- Words "saya" and "anda"
+- Do not use the word "PR"; use "tugas"
+- Cut-off sentences
+- Overused generic phrases
+OUTPUT: ONLY one caption line, no explanation.
+
+EXAMPLE CAPTIONS (study the humor pattern and language style):
+{fewshot_block}""",
+        "multi_box": """You are an Indonesian college meme creator who is great at making viral captions.
+
+TASK: Create ONE caption with the number of boxes given in the user message, in ONE LINE:
+text1 || text2 || ... || textN
+
+REQUIREMENTS:
+- 1-7 words per box, casual/slang Indonesian
+- Do not use words "saya"/"anda"
+- Caption must REINFORCE the image mood, not only restate the visual
+- Visual details are optional if relevant, not required
+- First box = setup context, last box = more painful/ironic punchline
+- Prioritize situations that often happen in student life
+
+HUMOR TECHNIQUE (pick what best fits the image):
+- Noble setup -> embarrassing punchline  -> "supervision tomorrow || just opened file"
+- Specific time contrast  -> "deadline at 2 || started at 1"
+- Shared ironic fate  -> "asked friend for answers || friend also guessed"
+- Deadpan irony  -> "this is easy || said by lecturer" (only words, reality says otherwise)
+
+FORBIDDEN: Label formats, words "saya"/"anda", and do not use word "PR" (use "tugas").
+OUTPUT: ONLY one line with || separator, no explanation.
+
+EXAMPLE CAPTIONS (study the setup->punchline structure):
+{fewshot_block}"""
+    }
+}
+
+GENERATE_FINAL_CAPTION_USER_PROMPT = {
+    "id": {
+        "single_box": """Template: {description}
+
+TOPIK: {topic}
+
+Caption:""",
+        "multi_box": """Template: {description}
+
+TOPIK: {topic}
+JUMLAH BOX: {box_count}
+
+Caption:"""
+    },
+    "en": {
+        "single_box": """Template: {description}
+
+TOPIC: {topic}
+
+Caption:""",
+        "multi_box": """Template: {description}
+
+TOPIC: {topic}
+NUMBER OF BOXES: {box_count}
+
+Caption:"""
+    }
+}
+
 # ============================================================
 # GENERATE ZEROSHOT CAPTION PROMPT
 # ============================================================
@@ -551,4 +701,44 @@ FEWSHOT_CAPTIONS = {
             ]
         }
     }
-}
\ No newline at end of file
+}
+
+# ============================================================
+# N-BEST CAPTION (K kandidat dalam satu request)
+# Disisipkan ke prompt caption (zero-shot / few-shot) kalau CAPTION_N_BEST > 1.
+# ============================================================
+N_BEST_CAPTION_PROMPT = {
+    "id": {
+        "single_box": """KHUSUS KALI INI: tulis {k} kandidat caption yang BERBEDA satu sama lain (beda sudut humor/teknik).
+Satu kandidat per baris, diberi nomor: 1. ... 2. ... dst. Tiap kandidat tetap ikuti semua aturan di atas, tanpa penjelasan.""",
+        "multi_box": """KHUSUS KALI INI: tulis {k} kandidat caption yang BERBEDA satu sama lain (beda sudut humor/teknik).
+Satu kandidat per baris, diberi nomor: 1. ... 2. ... dst. Tiap baris = satu caption lengkap dengan pemisah ||, tanpa penjelasan."""
+    },
+    "en": {
+        "single_box": """THIS TIME ONLY: write {k} caption candidates that are DIFFERENT from each other (different humor angle/technique).
+One candidate per line, numbered: 1. ... 2. ... etc. Every candidate still follows all rules above, no explanation.""",
+        "multi_box": """THIS TIME ONLY: write {k} caption candidates that are DIFFERENT from each other (different humor angle/technique).
+One candidate per line, numbered: 1. ... 2. ... etc. Each line = one complete caption with || separators, no explanation."""
+    }
+}
+
+STRUCTURED_CAPTION_PROMPT = {
+    "id": {
+        "single": """FORMAT JAWABAN: JSON saja, tanpa teks lain: {{"captions": ["<caption>"]}}
+Tepat 1 caption, maks {max_words} kata, tanpa ||.""",
+        "multi": """FORMAT JAWABAN: JSON saja, tanpa teks lain: {{"captions": ["<box 1>", "<box 2>", ...]}}
+Tepat {box_count} string (satu per box, urut), maks {max_words} kata per box, tanpa ||.""",
+        "n_best": """FORMAT JAWABAN: JSON saja, tanpa teks lain: {{"candidates": [...]}}
+Tepat {k} kandidat caption yang BERBEDA satu sama lain (beda sudut humor/teknik).
+Tiap kandidat = {candidate_shape}, maks {max_words} kata per box, tanpa ||."""
+    },
+    "en": {
+        "single": """ANSWER FORMAT: JSON only, no other text: {{"captions": ["<caption>"]}}
+Exactly 1 caption, max {max_words} words, no ||.""",
+        "multi": """ANSWER FORMAT: JSON only, no other text: {{"captions": ["<box 1>", "<box 2>", ...]}}
+Exactly {box_count} strings (one per box, in order), max {max_words} words per box, no ||.""",
+        "n_best": """ANSWER FORMAT: JSON only, no other text: {{"candidates": [...]}}
+Exactly {k} caption candidates that are DIFFERENT from each other (different humor angle/technique).
+Each candidate = {candidate_shape}, max {max_words} words per box, no ||."""
+    }
+}
@@ -2,17 +2,19 @@ from io import BytesIO
 import time
 import requests
 import os
-import ollama  # Library Ollama
 from dotenv import load_dotenv
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
-import torch
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel
 import csv
 from datetime import datetime
 import re
 
+try:
+    import fcntl  # lock CSV antar proses (worker sweep_queue.py); tidak ada di Windows
+except ImportError:
+    fcntl = None
+
 from prompts import (
     FEWSHOT_CAPTIONS,
     DESCRIBE_IMAGE_PROMPT,
@@ -20,6 +22,28 @@ from prompts import (
     GENERATE_ZEROSHOT_CAPTION_PROMPT,
     DEFAULT_LANGUAGE
 )
+from prompt_assembly import build_final_caption_messages
+from caption_candidates import (
+    CAPTION_N_BEST,
+    add_n_best_instruction,
+    parse_caption_candidates,
+    select_caption,
+)
+from caption_similarity import get_caption_history
+from caption_streaming import CAPTION_STREAMING, stream_caption
+from caption_structured import (
+    CAPTION_OUTPUT_MODE,
+    add_structured_instruction,
+    caption_json_schema,
+    parse_structured_caption,
+)
+from caption_text import normalize_for_compare, postprocess_caption
+from ollama_profiles import chat_kwargs
+from vlm_preprocess import prepare_vlm_image
+from ollama_pool import make_client
+from caption_resilience import CaptionGenerationError, breaker_key, call_with_retry
+from clip_backend import load_clip_backend
+from pipeline_trace import TRACE_COLUMNS, record_server_timing, span, start_trace, trace_columns
 
 # ====== LOAD ENV VARS ======
 load_dotenv()
@@ -37,16 +61,8 @@ OLLAMA_HOST     = os.getenv("OLLAMA_HOST", "http://152.42.226.64:11434")
 
 # ====== KONFIGURASI CLIP SCORE ======
 CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
-try:
-    clip_model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
-    clip_processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    clip_model = clip_model.to(device)
-    print(f"[CLIP] Model loaded on device: {device}")
-except Exception as e:
-    print(f"[CLIP Warning] Failed to load CLIP model: {e}")
-    clip_model = None
-    clip_processor = None
+# CLIP_BACKEND=torch|torch_int8|onnx|onnx_int8 (lihat clip_backend.py); None kalau gagal load
+clip_backend = load_clip_backend(CLIP_MODEL_NAME)
 
 # MODEL KONFIGURASI
 # Prioritas env var khusus Qwen3.5; tetap support fallback legacy LLAMA4_* untuk kompatibilitas.
@@ -61,7 +77,7 @@ HTTP_TIMEOUT    = 20
 
 # ====== CSV LOGGING ======
 RESULTS_CSV_PATH = os.path.join(BASE_DIR, "meme_generation_results.csv")
-CSV_COLUMNS = ["run_id", "timestamp", "template_id", "method", "language", "model", "temperature", "topic", "caption", "meme_url", "clip_score", "crossmodal_incongruity", "run_time_seconds"]
+CSV_COLUMNS = ["run_id", "timestamp", "template_id", "method", "language", "model", "temperature", "topic", "caption", "meme_url", "clip_score", "crossmodal_incongruity", "run_time_seconds", "error_type"] + TRACE_COLUMNS
 
 def initialize_csv():
     """Inisialisasi CSV dan upgrade schema jika perlu."""
@@ -72,20 +88,31 @@ def initialize_csv():
         print(f"[CSV] Created: {RESULTS_CSV_PATH}")
         return
 
-    # Upgrade file lama: tambahkan kolom baru agar tetap kebaca rapi di Excel.
+    # Upgrade file lama: tambahkan kolom yang belum ada agar tetap kebaca rapi di Excel.
+    # Kolom tambahan di luar CSV_COLUMNS (mis: hasil caption_text.py --target-column) tetap dipertahankan.
     with open(RESULTS_CSV_PATH, 'r', newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         existing_columns = reader.fieldnames or []
-        if "run_time_seconds" in existing_columns:
+        missing = [col for col in CSV_COLUMNS if col not in existing_columns]
+        if not missing:
             return
         rows = list(reader)
 
-    with open(RESULTS_CSV_PATH, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+    fieldnames = CSV_COLUMNS + [col for col in existing_columns if col not in CSV_COLUMNS]
+    tmp_path = f"{RESULTS_CSV_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         for row in rows:
-            writer.writerow({col: row.get(col, "") for col in CSV_COLUMNS})
-    print(f"[CSV] Upgraded schema with 'run_time_seconds': {RESULTS_CSV_PATH}")
+            writer.writerow({col: row.get(col, "") for col in fieldnames})
+    os.replace(tmp_path, RESULTS_CSV_PATH)
+    print(f"[CSV] Upgraded schema with {missing}: {RESULTS_CSV_PATH}")
+
+
+def _csv_fieldnames():
+    """Header CSV yang sebenarnya (bisa punya kolom tambahan di luar CSV_COLUMNS)."""
+    with open(RESULTS_CSV_PATH, 'r', newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), None) or CSV_COLUMNS
 
 def get_next_run_id():
     """Ambil run_id berikutnya (auto-increment)"""
@@ -102,30 +129,40 @@ def get_next_run_id():
         print(f"[CSV Error] {e}")
         return 1
 
-def save_result_to_csv(template_id, method, language, topic, caption, meme_url, clip_score, incongruity_score, model, temperature, run_time_seconds=None):
-    """Simpan result ke CSV"""
+def save_result_to_csv(template_id, method, language, topic, caption, meme_url, clip_score, incongruity_score, model, temperature, run_time_seconds=None, error_type=None):
+    """Simpan result ke CSV (error_type diisi kalau generate gagal, lihat caption_resilience.py)"""
     try:
-        initialize_csv()
-        run_id = get_next_run_id()
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        with open(RESULTS_CSV_PATH, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
-            writer.writerow({
-                "run_id": run_id,
-                "timestamp": timestamp,
-                "template_id": template_id,
-                "method": method,
-                "language": language,
-                "model": model,
-                "temperature": temperature,
-                "topic": topic,
-                "caption": caption,
-                "meme_url": meme_url,
-                "clip_score": clip_score if clip_score is not None else "",
-                "crossmodal_incongruity": incongruity_score if incongruity_score is not None else "",
-                "run_time_seconds": run_time_seconds if run_time_seconds is not None else ""
-            })
+
+        # Lock supaya worker paralel tidak dapat run_id yang sama / menulis baris bertumpuk.
+        # Upgrade schema (os.replace), baca header dan open append semuanya di dalam lock:
+        # kalau CSV dibuka sebelum lock, worker lain bisa mengganti file itu di tengah jalan.
+        with open(RESULTS_CSV_PATH + ".lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            initialize_csv()
+            fieldnames = _csv_fieldnames()
+            run_id = get_next_run_id()
+            with open(RESULTS_CSV_PATH, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+                writer.writerow({
+                    "run_id": run_id,
+                    "timestamp": timestamp,
+                    "template_id": template_id,
+                    "method": method,
+                    "language": language,
+                    "model": model,
+                    "temperature": temperature,
+                    "topic": topic,
+                    "caption": caption,
+                    "meme_url": meme_url,
+                    "clip_score": clip_score if clip_score is not None else "",
+                    "crossmodal_incongruity": incongruity_score if incongruity_score is not None else "",
+                    "run_time_seconds": run_time_seconds if run_time_seconds is not None else "",
+                    "error_type": error_type or "",
+                    # Durasi per tahap run ini (pipeline_trace.py)
+                    **trace_columns()
+                })
         print(f"[CSV] Saved result (run_id={run_id})")
         return run_id
     except Exception as e:
@@ -146,104 +183,47 @@ def make_session():
     return s
 
 session = make_session()
-# Inisialisasi Client Ollama
-client  = ollama.Client(host=OLLAMA_HOST)
-
-# Memory ringan antar-run dalam satu proses untuk mengurangi caption sentris.
-RECENT_CAPTIONS_BY_TOPIC = {}
-
-
-def _normalize_single_box_caption(text):
-    txt = " ".join(str(text or "").split()).strip()
-    if not txt:
-        return ""
-
-    label_pattern = r"(?:[A-Za-zÀ-ÖØ-öø-ÿ][\wÀ-ÖØ-öø-ÿ-]{0,20}(?:\s+[A-Za-zÀ-ÖØ-öø-ÿ][\wÀ-ÖØ-öø-ÿ-]{0,20}){0,2})\s*:\s*"
-    txt = re.sub(label_pattern, "", txt).strip()
-    txt = " ".join(txt.split())
-
-    # Keep aligned with prompt constraints and avoid over-trimming.
-    max_words = 8
-    min_words_preferred = 3
-    dangling_words = {
-        "dan", "atau", "tapi", "yang", "karena", "jadi", "untuk", "dengan",
-        "di", "ke", "dari", "pada", "saat", "ketika", "if", "and", "or",
-        "but", "because", "so", "to", "with", "in", "on", "at", "of", "for"
-    }
-
-    def clean_ending(fragment):
-        fragment = fragment.strip(" ,;:-")
-        parts = fragment.split()
-        while parts and parts[-1].lower() in dangling_words:
-            parts.pop()
-        return " ".join(parts).strip(" ,;:-")
-
-    if not txt:
-        return ""
-
-    sentence_candidates = [clean_ending(s) for s in re.split(r"[.!?]+", txt) if s.strip()]
-    valid_sentence_candidates = [
-        c for c in sentence_candidates if 1 <= len(c.split()) <= max_words
-    ]
-    preferred_sentence_candidates = [
-        c for c in valid_sentence_candidates if len(c.split()) >= min_words_preferred
-    ]
-    if preferred_sentence_candidates:
-        return max(preferred_sentence_candidates, key=lambda c: len(c.split()))
-    if valid_sentence_candidates:
-        return max(valid_sentence_candidates, key=lambda c: len(c.split()))
-
-    clause_candidates = [clean_ending(s) for s in re.split(r"[,;—-]+", txt) if s.strip()]
-    valid_clause_candidates = [
-        c for c in clause_candidates if 1 <= len(c.split()) <= max_words
-    ]
-    preferred_clause_candidates = [
-        c for c in valid_clause_candidates if len(c.split()) >= min_words_preferred
-    ]
-    if preferred_clause_candidates:
-        return max(preferred_clause_candidates, key=lambda c: len(c.split()))
-    if valid_clause_candidates:
-        return max(valid_clause_candidates, key=lambda c: len(c.split()))
-
-    words = txt.split()
-    fallback = clean_ending(" ".join(words[:max_words]))
-    return fallback if fallback else " ".join(words[:max_words])
+# Inisialisasi Client Ollama (OLLAMA_HOSTS berisi >1 host -> pool multi-host, lihat ollama_pool.py)
+client  = make_client(OLLAMA_HOST)
+# Circuit breaker tahap caption per host (atau per pool)
+CAPTION_BREAKER_KEY = breaker_key(client, OLLAMA_HOST)
 
+# History caption per topik (index MinHash/LSH terbatas, persisten di caption_history.jsonl)
+# untuk mengurangi caption sentris lintas run dan lintas proses.
+CAPTION_HISTORY = get_caption_history()
 
-def _normalize_for_compare(text):
-    txt = str(text or "").lower().strip()
-    txt = re.sub(r"[^a-z0-9\s]", " ", txt)
-    txt = re.sub(r"\s+", " ", txt).strip()
-    return txt
 
+def _is_caption_too_similar(candidate, history_index):
+    """Cek apakah caption terlalu mirip dengan history topik (CaptionSimilarityIndex)."""
+    return history_index.is_too_similar(candidate)
 
-def _is_caption_too_similar(candidate, recent_captions):
-    """Cek apakah caption terlalu mirip dengan history terbaru."""
-    cand_norm = _normalize_for_compare(candidate)
-    if not cand_norm:
-        return False
 
-    cand_tokens = set(cand_norm.split())
-    if not cand_tokens:
-        return False
-
-    for prev in recent_captions:
-        prev_norm = _normalize_for_compare(prev)
-        if not prev_norm:
-            continue
-
-        if cand_norm == prev_norm:
-            return True
-
-        prev_tokens = set(prev_norm.split())
-        if not prev_tokens:
-            continue
-
-        overlap = len(cand_tokens & prev_tokens) / max(1, len(cand_tokens | prev_tokens))
-        if overlap >= 0.5:
-            return True
-
-    return False
+def _select_n_best_caption(content, topic, box_count, image_path=None):
+    """
+    Mode N-best: parse K kandidat dari satu respons, normalisasi, buang duplikat /
+    yang mirip history topik, lalu pilih lokal (CLIP batch ke gambar template).
+    """
+    candidates = [postprocess_caption(c, box_count) for c in parse_caption_candidates(content)]
+    recent = CAPTION_HISTORY.for_topic(topic)
+    score_fn = None
+    if image_path:
+        score_fn = lambda caps: calculate_clip_scores_batch(image_path, caps)
+
+    chosen, info = select_caption(
+        candidates,
+        history=recent,
+        is_too_similar=_is_caption_too_similar,
+        score_fn=score_fn,
+        placeholders=["caption gagal", " || ".join(["caption"] * box_count)],
+    )
+    if chosen is None:
+        chosen = postprocess_caption(content, box_count)
+    print(
+        f"[N-BEST] k={CAPTION_N_BEST} parsed={info['parsed']} unique={info['unique']} "
+        f"fresh={info['fresh']} scores={info['scores']} -> {chosen}"
+    )
+    CAPTION_HISTORY.add(topic, chosen)
+    return chosen
 
 
 def _extract_visual_anchor(description):
@@ -265,8 +245,8 @@ def _extract_visual_anchor(description):
 
 
 def _caption_mentions_anchor(caption, anchor):
-    cap_norm = _normalize_for_compare(caption)
-    anc_norm = _normalize_for_compare(anchor)
+    cap_norm = normalize_for_compare(caption)
+    anc_norm = normalize_for_compare(anchor)
     if not cap_norm or not anc_norm:
         return True
     return anc_norm in cap_norm
@@ -274,6 +254,40 @@ def _caption_mentions_anchor(caption, anchor):
 # ============================================================
 # CALCULATE CLIP SCORE
 # ============================================================
+def _load_clip_image(image_path_or_url):
+    """Load gambar (URL atau path relatif project root) sebagai RGB, None kalau file tidak ada."""
+    if image_path_or_url.startswith("http://") or image_path_or_url.startswith("https://"):
+        print(f"[CLIP] Loading from URL: {image_path_or_url}")
+        img_resp = session.get(image_path_or_url, timeout=HTTP_TIMEOUT)
+        img_resp.raise_for_status()
+        return Image.open(BytesIO(img_resp.content)).convert("RGB")
+
+    rel_path = image_path_or_url.lstrip("/")
+    full_path = os.path.join(BASE_DIR, rel_path)
+    print(f"[CLIP] Loading from file: {full_path}")
+    if not os.path.exists(full_path):
+        print(f"[CLIP Warning] File not found: {full_path}")
+        return None
+    return Image.open(full_path).convert("RGB")
+
+
+def calculate_clip_scores_batch(image_path_or_url, captions):
+    """
+    CLIP score satu gambar terhadap banyak caption sekaligus (satu forward pass teks).
+    Return list score (urutan sama dengan captions), atau None kalau CLIP tidak tersedia.
+    """
+    if clip_backend is None or not captions:
+        return None
+
+    try:
+        image = _load_clip_image(image_path_or_url)
+        if image is None:
+            return None
+        return clip_backend.scores(image, captions)
+    except Exception as e:
+        print(f"[CLIP Batch Error] {e}")
+        return None
+
 def calculate_clip_score(image_path_or_url, caption):
     """
     Hitung CLIP score menggunakan cosine similarity antara image dan text embeddings.
@@ -289,51 +303,23 @@ def calculate_clip_score(image_path_or_url, caption):
         - 0.0  : Orthogonal (no correlation)
         - -1.0 : Perfect anti-alignment
     """
-    if clip_model is None or clip_processor is None:
-        print(f"[CLIP Warning] Model not loaded (clip_model={clip_model is not None}, processor={clip_processor is not None})")
+    if clip_backend is None:
+        print("[CLIP Warning] Model not loaded (lihat warning [CLIP] saat import)")
         return None
     
     try:
         print(f"[CLIP] Processing: {image_path_or_url[:50]}... | Caption: {caption[:30]}...")
 
         # Load gambar
-        if image_path_or_url.startswith("http://") or image_path_or_url.startswith("https://"):
-            print(f"[CLIP] Loading from URL: {image_path_or_url}")
-            img_resp = session.get(image_path_or_url, timeout=HTTP_TIMEOUT)
-            img_resp.raise_for_status()
-            image = Image.open(BytesIO(img_resp.content)).convert("RGB")
-        else:
-            rel_path = image_path_or_url.lstrip("/")
-            full_path = os.path.join(BASE_DIR, rel_path)
-            print(f"[CLIP] Loading from file: {full_path}")
-            if not os.path.exists(full_path):
-                print(f"[CLIP Warning] File not found: {full_path}")
-                return None
-            image = Image.open(full_path).convert("RGB")
-
-        # Preprocess separately for image and text to avoid sending text tensors to image fn
-        image_inputs = clip_processor(images=image, return_tensors="pt")
-        text_inputs = clip_processor(text=[caption], return_tensors="pt", padding=True)
-
-        # Move tensors to device
-        image_inputs = {k: v.to(device) for k, v in image_inputs.items()}
-        text_inputs = {k: v.to(device) for k, v in text_inputs.items()}
-
-        # Forward pass - Calculate cosine similarity between image and text embeddings
-        with torch.no_grad():
-            image_embeds = clip_model.get_image_features(**image_inputs)
-            text_embeds = clip_model.get_text_features(**text_inputs)
-
-            # Normalize embeddings
-            image_embeds = image_embeds / image_embeds.norm(dim=-1, keepdim=True)
-            text_embeds = text_embeds / text_embeds.norm(dim=-1, keepdim=True)
+        image = _load_clip_image(image_path_or_url)
+        if image is None:
+            return None
 
-            # Cosine similarity (range: [-1, 1])
-            similarity = (image_embeds * text_embeds).sum(dim=-1)
-            score = similarity.item()
+        # Cosine similarity embedding gambar vs teks ternormalisasi (range: [-1, 1])
+        score = clip_backend.scores(image, [caption])[0]
 
         print(f"[CLIP] Score: {score}")
-        return round(score, 4)
+        return score
     except Exception as e:
         print(f"[CLIP Error] {e}")
         import traceback
@@ -359,13 +345,26 @@ def calculate_crossmodal_incongruity(clip_score):
 # ============================================================
 # GET MEME TEMPLATE (via API lokal /get_memes)
 # ============================================================
+# Cache katalog di sisi client, direvalidasi pakai ETag (304 = pakai cache lokal)
+_MEME_CATALOG_CACHE = {"etag": None, "memes": None}
+
+
 def get_meme_template(template_id):
     try:
-        r = session.get(MEME_API_GET, timeout=HTTP_TIMEOUT)
-        data = r.json()
-        if not data.get("success"):
-            return None
-        for m in data["data"]["memes"]:
+        headers = {}
+        if _MEME_CATALOG_CACHE["etag"] and _MEME_CATALOG_CACHE["memes"] is not None:
+            headers["If-None-Match"] = _MEME_CATALOG_CACHE["etag"]
+        r = session.get(MEME_API_GET, headers=headers, timeout=HTTP_TIMEOUT)
+        if r.status_code == 304:
+            memes = _MEME_CATALOG_CACHE["memes"]
+        else:
+            data = r.json()
+            if not data.get("success"):
+                return None
+            memes = data["data"]["memes"]
+            _MEME_CATALOG_CACHE["etag"] = r.headers.get("ETag")
+            _MEME_CATALOG_CACHE["memes"] = memes
+        for m in memes:
             if str(m["id"]) == str(template_id):
                 return m
         return None
@@ -398,6 +397,13 @@ def describe_image_with_ollama(path_or_url, language=None):
             with open(full_path, "rb") as f:
                 image_bytes = f.read()
 
+        # Downscale + encode ulang sesuai resolusi encoder model (cache di disk, lihat vlm_preprocess.py)
+        image_bytes, prep = prepare_vlm_image(image_bytes, MODEL_VLM)
+        print(
+            f"   (VLM input: {prep['orig_bytes'] / 1024:.0f}KB -> {prep['sent_bytes'] / 1024:.0f}KB"
+            f"{', cache' if prep['cache_hit'] else ''})"
+        )
+
         prompt = DESCRIBE_IMAGE_PROMPT.get(language, DESCRIBE_IMAGE_PROMPT["id"])
 
         # 2. Kirim ke Ollama
@@ -407,7 +413,8 @@ def describe_image_with_ollama(path_or_url, language=None):
                 'role': 'user',
                 'content': prompt,
                 'images': [image_bytes]  # Ollama menerima list by tes
-            }]
+            }],
+            **chat_kwargs(MODEL_VLM, "vlm"),  # keep_alive + num_ctx/num_predict (ollama_profiles.py)
         )
 
         return resp['message']['content']
@@ -434,84 +441,103 @@ def describe_image_with_ollama(path_or_url, language=None):
 # ============================================================
 # FEW-SHOT FINAL CAPTION (LLM: LLAMA) — pakai contoh dari prompts.py
 # ============================================================
-def generate_final_caption(description, topic, box_count=2, topic_key=None, language=None):
-    """
-    Generate caption final dengan few-shot dari prompts.py.
-    - box_count == 1  -> satu caption (tanpa '||')
-    - box_count >= 2  -> N caption dalam satu baris: cap1 || cap2 || ... || capN
-    """
-    if language is None:
-        language = DEFAULT_LANGUAGE
-    
-    topic_data = (FEWSHOT_CAPTIONS.get(topic_key or "thesis") or FEWSHOT_CAPTIONS["thesis"]).get(language, {})
-    format_key = "single" if box_count == 1 else "multi"
-    fewshots_raw = topic_data.get(format_key, [])
+def _add_output_instruction(messages, box_count, language):
+    """Instruksi format output: JSON (CAPTION_OUTPUT_MODE=json) atau kandidat bernomor (N-best)."""
+    if CAPTION_OUTPUT_MODE == "json":
+        return add_structured_instruction(messages, box_count, CAPTION_N_BEST, language=language)
+    return add_n_best_instruction(messages, CAPTION_N_BEST, box_count, language=language)
 
-    if box_count == 1:
-        # Format: "Template: <desc>\nCaption: <cap tanpa ||>"
-        fewshot_block = "\n\n".join(
-            f'Template: {item.get("description", "-")}\nCaption: {item.get("caption", "").strip()}'
-            for item in fewshots_raw if item.get("caption", "").strip()
-        )
-        prompt_template = GENERATE_FINAL_CAPTION_PROMPT.get(language, GENERATE_FINAL_CAPTION_PROMPT["id"])
-        prompt = prompt_template["single_box"].format(
-            description=description,
-            topic=topic,
-            fewshot_block=fewshot_block
-        )
-    else:
-        # Format: "Template: <desc>\nCaption: <cap dengan ||>"
-        fewshot_block = "\n\n".join(
-            f'Template: {item.get("description", "-")}\nCaption: {item.get("caption", "")}'
-            for item in fewshots_raw if item.get("caption", "").strip()
-        )
-        prompt_template = GENERATE_FINAL_CAPTION_PROMPT.get(language, GENERATE_FINAL_CAPTION_PROMPT["id"])
-        prompt = prompt_template["multi_box"].format(
-            description=description,
-            topic=topic,
-            box_count=box_count,
-            fewshot_block=fewshot_block
-        )
 
-    try:
+def _chat_caption(messages, box_count):
+    """
+    client.chat untuk tahap caption.
+    - CAPTION_OUTPUT_MODE=json -> format=JSON schema (jumlah box & batas kata dari grammar)
+    - CAPTION_STREAMING=1 -> streaming dan berhenti begitu caption lengkap (lihat caption_streaming.py)
+    - selain itu tunggu respons penuh
+    """
+    # keep_alive + num_ctx/num_predict per model (ollama_profiles.py)
+    kwargs = chat_kwargs(
+        MODEL_LLM,
+        "caption",
+        {
+            "temperature": LLM_TEMPERATURE,
+            "top_p": 0.9,
+            "repeat_penalty": 1.1,
+        },
+        n_best=CAPTION_N_BEST,
+    )
+    if CAPTION_OUTPUT_MODE == "json":
         resp = client.chat(
             model=MODEL_LLM,
-            messages=[{'role': 'user', 'content': prompt}],
-            options={
-                "temperature": LLM_TEMPERATURE,
-                "top_p": 0.9,
-                "repeat_penalty": 1.1,
-            }
+            messages=messages,
+            format=caption_json_schema(box_count, CAPTION_N_BEST),
+            **kwargs,
         )
-        txt = resp['message']['content'].replace("\n", " ").strip()
-        txt = txt.replace('"', '').replace("'", "").strip()
+        return resp['message']['content']
+    if CAPTION_STREAMING:
+        content, _ = stream_caption(
+            client, MODEL_LLM, messages, box_count=box_count, n_best=CAPTION_N_BEST, **kwargs
+        )
+        return content
+    resp = client.chat(model=MODEL_LLM, messages=messages, **kwargs)
+    return resp['message']['content']
 
-        if box_count == 1:
-            txt = _normalize_single_box_caption(txt)
-            return txt if txt else "caption gagal"
 
-        # Multi-box: pastikan jumlah segmen sesuai box_count
-        parts = [p.strip() for p in txt.split("||") if p.strip()]
-        if not parts:
-            return " || ".join(["caption"] * box_count)
+def _finalize_caption(content, box_count):
+    """
+    Output LLM -> caption final. Mode json: parse deterministik; gagal -> raise
+    CaptionGenerationError("invalid_output") supaya run tercatat gagal, bukan placeholder
+    yang ikut di-render + di-score.
+    """
+    if CAPTION_OUTPUT_MODE == "json":
+        caption = parse_structured_caption(content, box_count, model=MODEL_LLM)
+        if caption is None:
+            raise CaptionGenerationError(
+                "invalid_output", f"output JSON caption tidak valid: {str(content)[:120]!r}",
+                host=CAPTION_BREAKER_KEY, attempts=1,
+            )
+        return caption
+    return postprocess_caption(content, box_count)
 
-        # Jika kurang dari box_count, duplikasi segmen terakhir
-        while len(parts) < box_count:
-            parts.append(parts[-1])
 
-        return " || ".join(parts[:box_count])
-    except Exception as e:
-        print(f"[Final Gen Error] {e}")
-        return " || ".join(["Server Error"] * max(1, box_count))
+def generate_final_caption(description, topic, box_count=2, topic_key=None, language=None, image_path=None):
+    """
+    Generate caption final dengan few-shot dari prompts.py.
+    - box_count == 1  -> satu caption (tanpa '||')
+    - box_count >= 2  -> N caption dalam satu baris: cap1 || cap2 || ... || capN
+    - CAPTION_N_BEST > 1 -> K kandidat dalam satu request, dipilih lokal
+      (image_path = gambar template untuk seleksi CLIP)
+    - Gagal setelah retry / breaker terbuka -> raise CaptionGenerationError
+    """
+    if language is None:
+        language = DEFAULT_LANGUAGE
+    
+    # Mode PROMPT_ASSEMBLY=stable: system message statis (few-shot dll) + user message pendek,
+    # supaya prefix prompt sama antar template dan KV cache Ollama kepakai ulang.
+    messages = build_final_caption_messages(
+        description, topic, box_count, topic_key=topic_key, language=language
+    )
+    messages = _add_output_instruction(messages, box_count, language)
+
+    # Retry + circuit breaker; gagal akhir -> CaptionGenerationError (ditangani pipeline)
+    content = call_with_retry(
+        lambda: _chat_caption(messages, box_count), CAPTION_BREAKER_KEY, label="few-shot caption"
+    )
+    if CAPTION_N_BEST > 1:
+        return _select_n_best_caption(content, topic, box_count, image_path=image_path)
+    return _finalize_caption(content, box_count)
 
 # ============================================================
 # ZERO-SHOT (LLM: LLAMA)
 # ============================================================
-def generate_zeroshot_caption(description, topic, box_count=2, language=None):
+def generate_zeroshot_caption(description, topic, box_count=2, language=None, image_path=None):
     """
     Zero-shot caption:
     - box_count == 1  -> satu caption (tanpa '||')
     - box_count >= 2  -> N caption dalam satu baris: cap1 || cap2 || ... || capN
+    - CAPTION_N_BEST > 1 -> K kandidat dalam satu request, dipilih lokal
+      (image_path = gambar template untuk seleksi CLIP)
+    - Gagal setelah retry / breaker terbuka -> raise CaptionGenerationError
     """
     if language is None:
         language = DEFAULT_LANGUAGE
@@ -530,35 +556,15 @@ def generate_zeroshot_caption(description, topic, box_count=2, language=None):
             description=description
         )
 
-    try:
-        resp = client.chat(
-            model=MODEL_LLM,
-            messages=[{'role': 'user', 'content': prompt}],
-            options={
-                "temperature": LLM_TEMPERATURE,
-                "top_p": 0.9,
-                "repeat_penalty": 1.1,
-            }
-        )
-        txt = resp['message']['content'].replace("\n", " ").strip()
-        txt = txt.replace('"', '').replace("'", "").strip()
-
-        if box_count == 1:
-            txt = _normalize_single_box_caption(txt)
-            return txt if txt else "caption gagal"
-
-        # Multi-box: pecah berdasarkan '||' dan pastikan jumlah segmen
-        parts = [p.strip() for p in txt.split("||") if p.strip()]
-        if not parts:
-            return " || ".join(["caption"] * box_count)
-
-        while len(parts) < box_count:
-            parts.append(parts[-1])
+    messages = _add_output_instruction([{'role': 'user', 'content': prompt}], box_count, language)
 
-        return " || ".join(parts[:box_count])
-    except Exception as e:
-        print(f"[Zero Gen Error] {e}")
-        return " || ".join(["Server Error"] * max(1, box_count))
+    # Retry + circuit breaker; gagal akhir -> CaptionGenerationError (ditangani pipeline)
+    content = call_with_retry(
+        lambda: _chat_caption(messages, box_count), CAPTION_BREAKER_KEY, label="zero-shot caption"
+    )
+    if CAPTION_N_BEST > 1:
+        return _select_n_best_caption(content, topic, box_count, image_path=image_path)
+    return _finalize_caption(content, box_count)
 
 # ============================================================
 # CREATE MEME via API lokal /caption-image
@@ -670,7 +676,10 @@ def create_meme(template_id, caption, method=None, language=None):
         payload["filename"] = custom_filename
 
     try:
-        r = session.post(MEME_API_CAPTION, json=payload, timeout=HTTP_TIMEOUT)
+        with span("render"):
+            r = session.post(MEME_API_CAPTION, json=payload, timeout=HTTP_TIMEOUT)
+        # Rincian render di server (gambar + tulis PNG) dari header Server-Timing
+        record_server_timing(r.headers.get("Server-Timing"))
         try:
             data = r.json()
         except Exception:
@@ -687,6 +696,28 @@ def create_meme(template_id, caption, method=None, language=None):
 # ============================================================
 # PIPELINE 1 MEME (ZERO-SHOT ONLY)
 # ============================================================
+def _save_failed_run(template_id, method, language, topic, box_count, error_type, start_time):
+    """
+    Generate gagal (VLM / caption): render + CLIP dilewati, baris CSV tetap dicatat
+    dengan error_type (caption 'Server Error' dipertahankan untuk auto_run_until_clear.py).
+    """
+    caption = " || ".join(["Server Error"] * max(1, box_count))
+    run_time_seconds = round(time.time() - start_time, 3)
+    print(f"[SKIP] render + CLIP dilewati (error_type={error_type}), runtime {run_time_seconds}s")
+    save_result_to_csv(
+        template_id, method, language, topic, caption, "",
+        None, None, MODEL_LLM, LLM_TEMPERATURE, run_time_seconds, error_type=error_type
+    )
+    return {
+        "captions": [caption],
+        "urls": [""],
+        "clip_scores": [None],
+        "incongruity_scores": [None],
+        "run_time_seconds": run_time_seconds,
+        "error_type": error_type,
+    }
+
+
 def meme_pipeline_1(template_id, topic_key=None, language=None, model_name=None, temperature=None):
     """
     Generate 1 meme menggunakan zero-shot approach.
@@ -714,8 +745,10 @@ def meme_pipeline_1(template_id, topic_key=None, language=None, model_name=None,
     if language is None:
         language = DEFAULT_LANGUAGE
     start_time = time.time()
+    start_trace(MODEL_LLM)
 
-    template = get_meme_template(template_id)
+    with span("catalog"):
+        template = get_meme_template(template_id)
     if not template:
         print("[ERROR] Template tidak ditemukan.")
         return {"captions": [], "urls": [], "clip_scores": []}
@@ -725,7 +758,8 @@ def meme_pipeline_1(template_id, topic_key=None, language=None, model_name=None,
     # --- Describe Image once ---
     # API lokal mengirim field 'url_cleanmeme' (bukan 'url' Imgflip)
     image_path = template.get("url_cleanmeme") or template.get("url", "")
-    desc = describe_image_with_ollama(image_path, language=language)
+    with span("vlm", MODEL_VLM):
+        desc = describe_image_with_ollama(image_path, language=language)
     print(f"[DESKRIPSI ({MODEL_VLM})]\n{desc[:150]}...\n") # Print sebagian aja
     # Print full VLM result
     print(f"[VLM RESULT]\n{desc}\n")
@@ -734,8 +768,15 @@ def meme_pipeline_1(template_id, topic_key=None, language=None, model_name=None,
     box_count = int(template.get("box_count", 2))
 
     print(f"=== TOPIC: {topic} (box_count={box_count}) ===")
+    if desc.startswith("[VLM Error]"):
+        return _save_failed_run(template_id, "zero", language, topic, box_count, "vlm_error", start_time)
 
-    cap_zero = generate_zeroshot_caption(desc, topic, box_count, language=language)
+    try:
+        with span("llm"):
+            cap_zero = generate_zeroshot_caption(desc, topic, box_count, language=language, image_path=image_path)
+    except CaptionGenerationError as e:
+        print(f"[Zero Gen Error] {e}")
+        return _save_failed_run(template_id, "zero", language, topic, box_count, e.error_type, start_time)
 
     # cap_zero = "nyoba api llalLllLALA hehe ini masi nyoba huehuehueh"
     meme_url, _ = create_meme(template_id, cap_zero, method="zero", language=language)
@@ -744,7 +785,8 @@ def meme_pipeline_1(template_id, topic_key=None, language=None, model_name=None,
     clip_score = None
     incongruity_score = None
     if meme_url and not meme_url.startswith("[Error"):
-        clip_score = calculate_clip_score(meme_url, cap_zero)
+        with span("clip"):
+            clip_score = calculate_clip_score(meme_url, cap_zero)
         incongruity_score = calculate_crossmodal_incongruity(clip_score)
 
     
@@ -797,8 +839,10 @@ def meme_pipeline_few(template_id, topic_key=None, language=None, model_name=Non
     if language is None:
         language = DEFAULT_LANGUAGE
     start_time = time.time()
+    start_trace(MODEL_LLM)
 
-    template = get_meme_template(template_id)
+    with span("catalog"):
+        template = get_meme_template(template_id)
     if not template:
         print("[ERROR] Template tidak ditemukan.")
         return {"captions": [], "urls": [], "clip_scores": [], "incongruity_scores": []}
@@ -806,7 +850,8 @@ def meme_pipeline_few(template_id, topic_key=None, language=None, model_name=Non
     print(f"[TEMPLATE] {template['name']}")
 
     image_path = template.get("url_cleanmeme") or template.get("url", "")
-    desc = describe_image_with_ollama(image_path, language=language)
+    with span("vlm", MODEL_VLM):
+        desc = describe_image_with_ollama(image_path, language=language)
     print(f"[DESKRIPSI ({MODEL_VLM})]\n{desc[:150]}...\n")
     # Print full VLM result
     print(f"[VLM RESULT]\n{desc}\n")
@@ -815,13 +860,24 @@ def meme_pipeline_few(template_id, topic_key=None, language=None, model_name=Non
     box_count = int(template.get("box_count", 2))
 
     print(f"=== TOPIC: {topic} (box_count={box_count}) ===")
-    cap_few = generate_final_caption(desc, topic, box_count, topic_key=topic_key, language=language)
+    if desc.startswith("[VLM Error]"):
+        return _save_failed_run(template_id, "few", language, topic, box_count, "vlm_error", start_time)
+
+    try:
+        with span("llm"):
+            cap_few = generate_final_caption(
+                desc, topic, box_count, topic_key=topic_key, language=language, image_path=image_path
+            )
+    except CaptionGenerationError as e:
+        print(f"[Final Gen Error] {e}")
+        return _save_failed_run(template_id, "few", language, topic, box_count, e.error_type, start_time)
     meme_url, _ = create_meme(template_id, cap_few, method="few", language=language)
 
     clip_score = None
     incongruity_score = None
     if meme_url and not meme_url.startswith("[Error"):
-        clip_score = calculate_clip_score(meme_url, cap_few)
+        with span("clip"):
+            clip_score = calculate_clip_score(meme_url, cap_few)
         incongruity_score = calculate_crossmodal_incongruity(clip_score)
 
     print(f"[FEW] {cap_few} -> {meme_url}")
@@ -1,37 +1,126 @@
 from flask import Blueprint, request, jsonify
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
-import json
 import os
+import threading
 import time
 import requests
 import textwrap
+from collections import OrderedDict
+
+from routes.stroke import draw_text_with_stroke, is_valid_color
+from routes import catalog
+from routes import metrics
+from routes.template_store import invalidate as invalidate_raw_template
+from routes.template_store import load_raw_image, raw_path_for, write_raw_template
+from routes.template_pool import get_attached_pool
 
 caption_bp = Blueprint("caption", __name__)
 
 # Path absolut ke project root
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-MEMES_PATH = os.path.join(BASE_DIR, "memes.json")
 OUTPUT_DIR = os.path.join(BASE_DIR, "generated_memes")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-with open(MEMES_PATH, encoding="utf-8") as f:
-    MEMES = json.load(f)
+# Template yang gambarnya berubah sejak pool shared-memory dibuat -> jangan ambil dari pool
+_POOL_STALE_IDS = set()
 
 
 def _load_image(path_or_url: str) -> Image.Image:
     """Bisa load dari path lokal (mis: memes/xxx.jpg) atau URL penuh."""
     if path_or_url.startswith("http://") or path_or_url.startswith("https://"):
+        metrics.record_cache("image", False)
+        metrics.inc("image_source_total", source="url")
         resp = requests.get(path_or_url, timeout=15)
         resp.raise_for_status()
         return Image.open(BytesIO(resp.content)).convert("RGBA")
     # path relatif dari project root
     rel_path = path_or_url.lstrip("/")
     full_path = os.path.join(BASE_DIR, rel_path)
+    # Prioritas: raw store (mmap, tanpa decode PNG) kalau sudah di-build & tidak stale
+    img = load_raw_image(raw_path_for(full_path), source_path=full_path)
+    if img is not None:
+        metrics.record_cache("image", True)
+        metrics.inc("image_source_total", source="raw_store")
+        return img
+    metrics.record_cache("image", False)
+    metrics.inc("image_source_total", source="decode")
     return Image.open(full_path).convert("RGBA")
 
 
+def _load_template_image(meme) -> Image.Image:
+    """Base image template: shared-memory pool (kalau parent bikin pool) -> raw store / decode."""
+    pool = get_attached_pool()
+    template_id = str(meme["id"])
+    if pool is not None and template_id in pool and template_id not in _POOL_STALE_IDS:
+        metrics.record_cache("image", True)
+        metrics.inc("image_source_total", source="pool")
+        return pool.get_image(template_id)
+    return _load_image(meme["url_cleanmeme"])
+
+
+def _on_catalog_reload(old_snapshot, new_snapshot, changed_ids):
+    """
+    Invalidasi cache gambar hanya untuk template yang gambarnya berubah. Dipanggil
+    dari thread watcher katalog, jadi rebuild raw store di sini tidak membebani request.
+    """
+    for template_id in changed_ids:
+        old_meme = old_snapshot.by_id.get(template_id) or {}
+        meme = new_snapshot.by_id.get(template_id)
+        if not meme:
+            _POOL_STALE_IDS.add(template_id)
+            continue
+        image_changed = (
+            old_meme.get("url_cleanmeme") != meme.get("url_cleanmeme")
+            or old_snapshot.image_mtimes.get(template_id) != new_snapshot.image_mtimes.get(template_id)
+        )
+        if not image_changed:
+            # Metadata saja (box_positions, font, dll) dibaca per request, tidak ada cache
+            continue
+
+        _POOL_STALE_IDS.add(template_id)
+        url = str(meme.get("url_cleanmeme") or "")
+        if url.startswith("http://") or url.startswith("https://"):
+            continue
+        full_path = os.path.join(BASE_DIR, url.lstrip("/"))
+        raw_path = raw_path_for(full_path)
+        invalidate_raw_template(raw_path)
+        # Raw store yang sudah ada (tapi stale) langsung di-build ulang
+        if os.path.exists(raw_path) and os.path.exists(full_path) and load_raw_image(raw_path, full_path) is None:
+            try:
+                write_raw_template(full_path, raw_path)
+            except Exception as e:
+                print(f"[CATALOG Warning] rebuild raw template {template_id} gagal: {e}")
+
+
+catalog.subscribe(_on_catalog_reload)
+
+
+# (font, size, require_ttf) -> FreeTypeFont, LRU terbatas: font & ukuran datang dari
+# body request, jadi tanpa batas tiap kombinasi baru menambah memori selamanya
+FONT_CACHE_SIZE = max(1, int(os.getenv("FONT_CACHE_SIZE", "64")))
+_FONT_CACHE = OrderedDict()
+_font_lock = threading.Lock()
+
+
 def _get_font(preferred_font: str | None, max_font_size: int | None, require_ttf: bool = True):
+    """Font dari cache; parse TTF + cari file cuma sekali per (font, ukuran)."""
+    key = (preferred_font, max_font_size, require_ttf)
+    with _font_lock:
+        font = _FONT_CACHE.get(key)
+        if font is not None:
+            _FONT_CACHE.move_to_end(key)
+    metrics.record_cache("font", font is not None)
+    if font is None:
+        font = _load_font(preferred_font, max_font_size, require_ttf)
+        with _font_lock:
+            _FONT_CACHE[key] = font
+            while len(_FONT_CACHE) > FONT_CACHE_SIZE:
+                _FONT_CACHE.popitem(last=False)
+    return font
+
+
+def _load_font(preferred_font: str | None, max_font_size: int | None, require_ttf: bool = True):
     size = max_font_size or 40
     # Coba font Impact / TTF, kalau gagal pakai default
     candidates = []
@@ -82,57 +171,24 @@ def _get_font(preferred_font: str | None, max_font_size: int | None, require_ttf
     return ImageFont.load_default()
 
 
-@caption_bp.route("/caption-image", methods=["POST"])
-def caption_image():
-    """
-    Contoh payload yang didukung (mirip Imgflip, tapi ke gambar lokal):
-    {
-      "template_id": "61579",
-      "font": "impact",
-      "max_font_size": 50,
-      "color": "#ffffff",
-      "outline_color": "#000000",
-      "boxes": [
-        {
-          "text": "KETIKA KODE PROGRAM LANGSUNG JALAN"
-        },
-        {
-          "text": "PADAHAL BARU SEKALI RUNNING"
-        }
-      ]
-    }
-
-    Atau dengan posisi manual per box:
-    {
-      "template_id": "61579",
-      "boxes": [
-        {
-          "text": "Saya sedang belajar API",
-          "x": 10, "y": 10, "width": 548, "height": 100
-        },
-        {
-          "text": "JSON-nya sangat rapi",
-          "x": 10, "y": 225, "width": 548, "height": 100,
-          "color": "#00ff00",
-          "outline_color": "#000000"
-        }
-      ]
-    }
-    """
-    data = request.get_json(force=True, silent=True) or {}
+class RenderError(Exception):
+    """Gagal load gambar template / font saat render (HTTP 500 di /caption-image)."""
 
-    template_id = str(data.get("template_id", "")).strip()
-    if not template_id:
-        return jsonify({"success": False, "error": "template_id is required"}), 400
-
-    meme = next((m for m in MEMES if str(m["id"]) == template_id), None)
-    if not meme:
-        return jsonify({"success": False, "error": "Template not found"}), 404
 
+def render_meme(meme, data):
+    """
+    Render caption ke gambar template (tanpa simpan ke disk).
+    data = body request /caption-image (boxes, font, color, ...).
+    Return (img, stage_seconds) dengan durasi tahap load/layout/draw (encode diisi pemanggil).
+    """
+    # Durasi tahap render (detik) untuk /metrics dan header Server-Timing
+    stage_seconds = dict.fromkeys(metrics.RENDER_STAGES, 0.0)
+    stage_start = time.perf_counter()
     try:
-        img = _load_image(meme["url_cleanmeme"])
+        img = _load_template_image(meme)
     except Exception as e:
-        return jsonify({"success": False, "error": f"Failed to load image: {e}"}), 500
+        raise RenderError(f"Failed to load image: {e}") from e
+    stage_seconds["load"] = time.perf_counter() - stage_start
 
     draw = ImageDraw.Draw(img)
 
@@ -152,16 +208,15 @@ def caption_image():
     try:
         font = _get_font(font_name, max_font_size, require_ttf=True)
     except Exception as e:
-        return jsonify({"success": False, "error": f"Failed to load TTF font: {e}"}), 500
+        raise RenderError(f"Failed to load TTF font: {e}") from e
 
     boxes = data.get("boxes") or []
-    if not boxes:
-        return jsonify({"success": False, "error": "boxes is required"}), 400
 
     for i, box in enumerate(boxes):
         text = str(box.get("text", ""))
         if not text:
             continue
+        stage_start = time.perf_counter()
 
         # Ambil posisi dan dimensi box
         box_x = box.get("x")
@@ -251,6 +306,8 @@ def caption_image():
         
         # Render setiap baris dengan center alignment horizontal
         current_y = start_y + text_ascent
+        draw_start = time.perf_counter()
+        stage_seconds["layout"] += draw_start - stage_start
         
         for line in wrapped_lines:
             if current_y + line_height > box_y + box_height:
@@ -266,34 +323,145 @@ def caption_image():
             # Center horizontal: x adalah center point, adjust untuk center alignment
             line_x = box_x - (line_width / 2)
             
-            # Render baris dengan outline (fallback aman jika font tidak support stroke)
-            try:
-                if stroke_width and outline_color:
-                    draw.text(
-                        (line_x, current_y),
-                        line,
-                        font=font,
-                        fill=color,
-                        stroke_width=int(stroke_width),
-                        stroke_fill=outline_color,
-                    )
-                else:
-                    draw.text((line_x, current_y), line, font=font, fill=color)
-            except Exception:
-                # Fallback universal: render tanpa stroke
+            # Render baris dengan outline lewat compositor NumPy (mask sekali + dilasi),
+            # jadi outline tetap ada walau stroker FreeType font-nya gagal
+            if stroke_width and outline_color:
+                draw_text_with_stroke(
+                    img,
+                    (line_x, current_y),
+                    line,
+                    font,
+                    fill=color,
+                    stroke_width=int(stroke_width),
+                    stroke_fill=outline_color,
+                )
+            else:
                 draw.text((line_x, current_y), line, font=font, fill=color)
             
             current_y += line_height
+        stage_seconds["draw"] += time.perf_counter() - draw_start
+
+    return img, stage_seconds
+
+
+def _find_invalid_color(data):
+    """Warna (color / outline_color di body atau per box) yang tidak bisa di-parse, atau None."""
+    boxes = [b for b in data.get("boxes") or [] if isinstance(b, dict)]
+    for source in [data] + boxes:
+        for key in ("color", "outline_color"):
+            value = source.get(key)
+            if value and not is_valid_color(value):
+                return value
+    return None
+
+
+def _is_valid_stroke_width(value):
+    if isinstance(value, bool):
+        return False
+    try:
+        width = int(value)
+    except (TypeError, ValueError):
+        return False
+    if isinstance(value, float) and value != width:
+        return False
+    return width >= 0
+
+
+def _find_invalid_stroke_width(data):
+    """stroke_width per box yang bukan bilangan bulat >= 0, atau None."""
+    for box in data.get("boxes") or []:
+        if isinstance(box, dict) and box.get("stroke_width") is not None:
+            if not _is_valid_stroke_width(box["stroke_width"]):
+                return box["stroke_width"]
+    return None
+
+
+@caption_bp.route("/caption-image", methods=["POST"])
+def caption_image():
+    """
+    Contoh payload yang didukung (mirip Imgflip, tapi ke gambar lokal):
+    {
+      "template_id": "61579",
+      "font": "impact",
+      "max_font_size": 50,
+      "color": "#ffffff",
+      "outline_color": "#000000",
+      "boxes": [
+        {
+          "text": "KETIKA KODE PROGRAM LANGSUNG JALAN"
+        },
+        {
+          "text": "PADAHAL BARU SEKALI RUNNING"
+        }
+      ]
+    }
+
+    Atau dengan posisi manual per box:
+    {
+      "template_id": "61579",
+      "boxes": [
+        {
+          "text": "Saya sedang belajar API",
+          "x": 10, "y": 10, "width": 548, "height": 100
+        },
+        {
+          "text": "JSON-nya sangat rapi",
+          "x": 10, "y": 225, "width": 548, "height": 100,
+          "color": "#00ff00",
+          "outline_color": "#000000"
+        }
+      ]
+    }
+    """
+    data = request.get_json(force=True, silent=True) or {}
+
+    template_id = str(data.get("template_id", "")).strip()
+    if not template_id:
+        return jsonify({"success": False, "error": "template_id is required"}), 400
+
+    meme = catalog.get_meme(template_id)
+    if not meme:
+        return jsonify({"success": False, "error": "Template not found"}), 404
+
+    if not data.get("boxes"):
+        return jsonify({"success": False, "error": "boxes is required"}), 400
+
+    bad_color = _find_invalid_color(data)
+    if bad_color is not None:
+        return jsonify({"success": False, "error": f"Invalid color: {bad_color!r}"}), 400
+
+    bad_stroke = _find_invalid_stroke_width(data)
+    if bad_stroke is not None:
+        return jsonify({"success": False, "error": f"Invalid stroke_width: {bad_stroke!r}"}), 400
+
+    try:
+        img, stage_seconds = render_meme(meme, data)
+    except RenderError as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
     filename = f"meme_{int(time.time())}.png"
     output_path = os.path.join(OUTPUT_DIR, filename)
+    stage_start = time.perf_counter()
     img.save(output_path)
+    stage_seconds["encode"] = time.perf_counter() - stage_start
+    metrics.observe_render(stage_seconds)
+    try:
+        metrics.inc("generated_bytes_total", os.path.getsize(output_path))
+    except OSError:
+        pass
 
-    return jsonify({
+    response = jsonify({
         "success": True,
         "data": {
             # URL relatif; nanti bisa di-serve via static atau nginx
             "url": f"/generated_memes/{filename}"
         }
     })
+    # Dibaca pipeline_trace.record_server_timing di sisi pipeline (load+layout+draw, tulis PNG)
+    draw_ms = (stage_seconds["load"] + stage_seconds["layout"] + stage_seconds["draw"]) * 1000
+    response.headers["Server-Timing"] = ", ".join(
+        [f"render_draw;dur={draw_ms:.1f}", f"png_write;dur={stage_seconds['encode'] * 1000:.1f}"]
+        + [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stage_seconds.items()]
+    )
+    return response
 
@@ -0,0 +1,189 @@
+"""
+Katalog template (memes.json) yang bisa di-reload tanpa restart server.
+
+- Snapshot katalog immutable; reload = parse + validasi di thread watcher
+  (bukan di jalur request), lalu referensi snapshot di-swap secara atomic.
+- Watcher polling mtime memes.json + mtime gambar cleanmeme tiap template.
+- Subscriber (blueprint) dapat daftar template_id yang benar-benar berubah
+  (metadata atau gambar), jadi cache template lain tetap hangat.
+
+Interval polling: env MEME_CATALOG_POLL_SECONDS (default 2, 0 = matikan watcher).
+"""
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEMES_PATH = os.path.join(BASE_DIR, "memes.json")
+POLL_SECONDS = float(os.getenv("MEME_CATALOG_POLL_SECONDS", "2"))
+
+
+class CatalogSnapshot:
+    """Satu versi katalog. Jangan dimutasi setelah dibuat."""
+
+    def __init__(self, memes, file_stat, image_mtimes):
+        self.memes = memes
+        self.by_id = {str(m["id"]): m for m in memes}
+        self.file_stat = file_stat  # (mtime_ns, size) memes.json
+        self.image_mtimes = image_mtimes  # template_id -> mtime_ns gambar (None kalau tidak ada)
+
+
+_snapshot = None
+_subscribers = []
+_load_lock = threading.Lock()
+_watcher_pid = None
+# (mtime_ns, size) memes.json terakhir yang gagal di-parse; tidak dicoba ulang sampai file berubah
+_failed_file_stat = None
+
+
+def _file_stat(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _image_path(meme):
+    url = str(meme.get("url_cleanmeme") or "")
+    if not url or url.startswith("http://") or url.startswith("https://"):
+        return None
+    return os.path.join(BASE_DIR, url.lstrip("/"))
+
+
+def _image_mtimes(memes):
+    mtimes = {}
+    for m in memes:
+        path = _image_path(m)
+        try:
+            mtimes[str(m["id"])] = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtimes[str(m["id"])] = None
+    return mtimes
+
+
+def validate_memes(memes):
+    """Validasi struktur memes.json. Raise ValueError kalau tidak valid."""
+    if not isinstance(memes, list):
+        raise ValueError("memes.json harus berupa list")
+    seen = set()
+    for idx, m in enumerate(memes):
+        if not isinstance(m, dict):
+            raise ValueError(f"item #{idx} bukan object")
+        template_id = str(m.get("id", "")).strip()
+        if not template_id:
+            raise ValueError(f"item #{idx} tidak punya id")
+        if template_id in seen:
+            raise ValueError(f"id duplikat: {template_id}")
+        seen.add(template_id)
+        if not isinstance(m.get("url_cleanmeme"), str):
+            raise ValueError(f"template {template_id}: url_cleanmeme wajib string")
+        for pos in m.get("box_positions") or []:
+            if not isinstance(pos, dict):
+                raise ValueError(f"template {template_id}: box_positions harus list object")
+            for key in ("x", "y", "width", "height"):
+                if key in pos and not isinstance(pos[key], (int, float)):
+                    raise ValueError(f"template {template_id}: box_positions.{key} harus angka")
+
+
+def _read_snapshot(path=MEMES_PATH):
+    file_stat = _file_stat(path)
+    with open(path, encoding="utf-8") as f:
+        memes = json.load(f)
+    validate_memes(memes)
+    return CatalogSnapshot(memes, file_stat, _image_mtimes(memes))
+
+
+def _diff(old, new):
+    """template_id yang metadata atau gambarnya berubah (termasuk ditambah/dihapus)."""
+    changed = set()
+    for template_id in set(old.by_id) | set(new.by_id):
+        if old.by_id.get(template_id) != new.by_id.get(template_id):
+            changed.add(template_id)
+        elif old.image_mtimes.get(template_id) != new.image_mtimes.get(template_id):
+            changed.add(template_id)
+    return changed
+
+
+def subscribe(callback):
+    """Daftarkan callback(old_snapshot, new_snapshot, changed_ids) yang dipanggil setelah tiap swap."""
+    _subscribers.append(callback)
+
+
+def get_snapshot():
+    """Snapshot aktif (load pertama kali secara sinkron)."""
+    global _snapshot
+    if _snapshot is None:
+        with _load_lock:
+            if _snapshot is None:
+                _snapshot = _read_snapshot()
+    _ensure_watcher()
+    return _snapshot
+
+
+def get_memes():
+    return get_snapshot().memes
+
+
+def get_meme(template_id):
+    return get_snapshot().by_id.get(str(template_id))
+
+
+def check_for_update():
+    """
+    Cek perubahan memes.json / gambar template. Kalau berubah dan valid, swap
+    snapshot lalu kabari subscriber. Return set template_id yang berubah.
+    """
+    global _snapshot, _failed_file_stat
+    get_snapshot()
+    try:
+        file_stat = _file_stat(MEMES_PATH)
+    except OSError as e:
+        print(f"[CATALOG Warning] memes.json tidak bisa dibaca: {e}")
+        return set()
+
+    with _load_lock:
+        old = _snapshot
+        if file_stat != old.file_stat and file_stat != _failed_file_stat:
+            try:
+                new = _read_snapshot()
+            except (ValueError, OSError) as e:
+                # File mungkin lagi ditulis / rusak: tetap pakai versi lama, coba lagi saat file berubah
+                _failed_file_stat = file_stat
+                print(f"[CATALOG Warning] reload memes.json gagal, pakai versi lama: {e}")
+                return set()
+        else:
+            image_mtimes = _image_mtimes(old.memes)
+            if image_mtimes == old.image_mtimes:
+                return set()
+            new = CatalogSnapshot(old.memes, old.file_stat, image_mtimes)
+
+        changed = _diff(old, new)
+        _snapshot = new
+
+    print(f"[CATALOG] reload: {len(new.memes)} template, berubah={sorted(changed)}")
+    for callback in list(_subscribers):
+        try:
+            callback(old, new, changed)
+        except Exception as e:
+            print(f"[CATALOG Error] subscriber {getattr(callback, '__name__', callback)}: {e}")
+    return changed
+
+
+def _watch_loop():
+    while True:
+        time.sleep(POLL_SECONDS)
+        try:
+            check_for_update()
+        except Exception as e:
+            print(f"[CATALOG Error] watcher: {e}")
+
+
+def _ensure_watcher():
+    """Start thread watcher sekali per proses (aman setelah fork worker)."""
+    global _watcher_pid
+    if POLL_SECONDS <= 0 or _watcher_pid == os.getpid():
+        return
+    with _load_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_loop, name="catalog-watcher", daemon=True).start()
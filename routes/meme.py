@@ -1,13 +1,25 @@
 from flask import Flask
+import os
 from routes.memes import memes_bp
 from routes.caption import caption_bp
+import profiling
+from routes import metrics
+from routes.catalog import get_memes
+from routes.template_pool import POOL_ENV, create_pool
 
 app = Flask(__name__)
 
 # daftar route
 app.register_blueprint(memes_bp)
 app.register_blueprint(caption_bp)
+# /metrics + hook latency/in-flight per request (METRICS_ENABLED=0 untuk mematikan)
+metrics.init_app(app)
+# X-Profile: cprofile|sample per request (hanya kalau PROFILE_REQUESTS=1)
+profiling.init_app(app)
 
 if __name__ == "__main__":
+    # MEME_SHARED_POOL=1 -> proses ini decode template sekali ke shared memory,
+    # proses anak (reloader / worker) attach read-only lewat env MEME_TEMPLATE_POOL.
+    if os.getenv("MEME_SHARED_POOL") == "1" and not os.getenv(POOL_ENV):
+        template_pool = create_pool(get_memes())
     app.run(debug=True)
-
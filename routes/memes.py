@@ -1,17 +1,148 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request
+import gzip
+import hashlib
 import json
-import os
+import threading
+
+try:
+    import brotli  # opsional: kalau tidak ter-install, variant br dilewati
+except ImportError:
+    brotli = None
+
+from routes import catalog
 
 # Blueprint untuk daftar meme templates
 memes_bp = Blueprint("memes", __name__)
 
-# Path absolut ke project root (satu level di atas folder routes)
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-MEMES_PATH = os.path.join(BASE_DIR, "memes.json")
+# Data meme dari katalog memes.json (hot-reload, lihat routes/catalog.py)
+MEMES = catalog.get_memes()
+
+# Body di bawah ukuran ini tidak dikompres (overhead header > hemat byte)
+MIN_COMPRESS_BYTES = 1024
+# Batas variant (projection/pagination) yang disimpan di cache
+MAX_CACHED_VARIANTS = 64
+# Batas projection (?fields=) yang fragment per meme-nya disimpan
+MAX_CACHED_FRAGMENTS = 16
+
+_catalog_lock = threading.Lock()
+# fields (tuple, atau None = semua field) -> list fragment JSON per meme (bytes)
+_item_fragments = {}
+# (fields, offset, limit) -> {"identity": (etag, body), "gzip": ..., "br": ...}
+_response_variants = {}
+# Semua key yang ada di katalog; field lain di ?fields= dibuang sebelum jadi key cache
+_catalog_keys = frozenset()
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _evict_oldest(cache, keep):
+    """Buang entry tertua (urutan insert dict), kecuali key `keep` (katalog penuh)."""
+    oldest = next((k for k in cache if k != keep), None)
+    if oldest is not None:
+        cache.pop(oldest)
+
 
-# Load data meme dari file JSON
-with open(MEMES_PATH, encoding="utf-8") as f:
-    MEMES = json.load(f)
+def _fragments_for(fields):
+    """Fragment JSON tiap meme untuk satu projection (dihitung sekali per projection)."""
+    frags = _item_fragments.get(fields)
+    if frags is None:
+        if fields is None:
+            frags = [_dumps(m) for m in MEMES]
+        else:
+            frags = [_dumps({k: m[k] for k in fields if k in m}) for m in MEMES]
+        if len(_item_fragments) >= MAX_CACHED_FRAGMENTS:
+            _evict_oldest(_item_fragments, None)
+        _item_fragments[fields] = frags
+    return frags
+
+
+def _build_variant(fields, offset, limit):
+    frags = _fragments_for(fields)
+    page = frags[offset:offset + limit] if limit is not None else frags[offset:]
+    body = b'{"success":true,"data":{"memes":[' + b",".join(page) + b"]"
+    if offset or limit is not None:
+        body += b',"total":' + str(len(frags)).encode() + b',"offset":' + str(offset).encode()
+        if limit is not None:
+            body += b',"limit":' + str(limit).encode()
+    body += b"}}"
+
+    # Strong ETag dari isi body; variant terkompresi dapat suffix sendiri
+    # (representasi beda = ETag beda).
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variant = {"identity": (f'"{digest}"', body)}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        variant["gzip"] = (f'"{digest}-gz"', gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            variant["br"] = (f'"{digest}-br"', brotli.compress(body, quality=11))
+    return variant
+
+
+def _get_variant(fields, offset, limit):
+    key = (fields, offset, limit)
+    variant = _response_variants.get(key)
+    if variant is not None:
+        return variant
+    with _catalog_lock:
+        variant = _response_variants.get(key)
+        if variant is None:
+            variant = _build_variant(fields, offset, limit)
+            if len(_response_variants) >= MAX_CACHED_VARIANTS:
+                # Buang variant tertua, kecuali katalog penuh (selalu dipakai)
+                _evict_oldest(_response_variants, (None, 0, None))
+            _response_variants[key] = variant
+    return variant
+
+
+def rebuild_catalog_response(memes=None):
+    """
+    Serialisasi ulang response katalog (dipanggil saat load & saat katalog di-reload).
+    Body penuh + versi gzip/brotli langsung dihitung di sini, bukan di jalur request.
+    """
+    global MEMES, _catalog_keys
+    with _catalog_lock:
+        if memes is not None:
+            MEMES = memes
+        _catalog_keys = frozenset(k for m in MEMES for k in m)
+        _item_fragments.clear()
+        _response_variants.clear()
+    _get_variant(None, 0, None)
+
+
+def _parse_int(name, raw):
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} harus bilangan bulat, bukan {raw!r}") from None
+
+
+def _parse_query():
+    """Return (fields, offset, limit) atau raise ValueError."""
+    raw_fields = request.args.get("fields", "").strip()
+    fields = None
+    if raw_fields:
+        requested = {f.strip() for f in raw_fields.split(",") if f.strip()}
+        if requested:
+            # Field yang tidak ada di katalog tidak mengubah output -> jangan jadi key cache baru
+            fields = tuple(sorted(requested & _catalog_keys))
+            if not fields:
+                raise ValueError(f"field tidak dikenal: {', '.join(sorted(requested))}")
+
+    offset = _parse_int("offset", request.args.get("offset", 0))
+    raw_limit = request.args.get("limit")
+    limit = _parse_int("limit", raw_limit) if raw_limit not in (None, "") else None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset/limit tidak boleh negatif")
+    return fields, offset, limit
+
+
+def _pick_encoding(variant):
+    accept = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in variant and accept[encoding]:
+            return encoding
+    return "identity"
 
 
 @memes_bp.route("/get_memes", methods=["GET"])
@@ -24,11 +155,47 @@ def get_memes():
         "memes": [ ... ]
       }
     }
+
+    Query opsional:
+    - fields=id,box_positions  -> hanya field tersebut per meme
+    - offset=0&limit=20        -> pagination (data juga berisi total/offset/limit)
+
+    Body sudah diserialisasi + dikompres (gzip/br) sebelumnya, dan dikirim
+    dengan strong ETag: If-None-Match yang cocok dijawab 304 tanpa body.
     """
-    return jsonify({
-        "success": True,
-        "data": {
-            "memes": MEMES
-        }
-    })
+    try:
+        fields, offset, limit = _parse_query()
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid query: {e}"}), 400
+
+    variant = _get_variant(fields, offset, limit)
+    encoding = _pick_encoding(variant)
+    etag, body = variant[encoding]
+
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match:
+        known_etags = {e for e, _ in variant.values()}
+        # If-None-Match pakai weak comparison: prefix W/ diabaikan
+        candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if "*" in candidates or candidates & known_etags:
+            return Response(status=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, status=200, mimetype="application/json", headers=headers)
+
+
+def _on_catalog_reload(old_snapshot, new_snapshot, changed_ids):
+    # Body katalog ikut berubah kalau metadata template berubah -> serialisasi ulang
+    if old_snapshot.memes != new_snapshot.memes:
+        rebuild_catalog_response(new_snapshot.memes)
+
 
+rebuild_catalog_response()
+catalog.subscribe(_on_catalog_reload)
@@ -0,0 +1,307 @@
+"""
+Endpoint /metrics (format teks Prometheus) untuk meme API.
+
+- Request per route/method/status, histogram latency per route, request in-flight.
+- Render /caption-image dipecah: load (gambar template), layout (wrap teks),
+  draw (gambar teks + outline), encode (PNG ke disk), plus byte yang ditulis ke
+  generated_memes/.
+- Hit ratio cache font dan gambar template (pool shared memory / raw store = hit,
+  decode PNG = miss).
+
+Metrik disimpan di memori proses (dict + satu lock, tanpa I/O di jalur request).
+Multi-proses (beberapa worker API): set METRICS_MULTIPROC_DIR ke folder bersama;
+tiap proses menulis snapshot-nya ke <dir>/meme_api_<pid>.json (maks sekali per
+METRICS_FLUSH_SECONDS, di akhir request), dan /metrics menjumlahkan semua file.
+Thread flusher per proses menulis ulang snapshot yang belum ter-flush tiap
+METRICS_FLUSH_SECONDS, jadi request terakhir worker yang lalu idle tetap terlihat.
+Gauge (in-flight) dari proses yang sudah mati diabaikan, counter/histogram tetap.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, g, request
+
+metrics_bp = Blueprint("metrics", __name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+
+PREFIX = "meme_api"
+# Bucket latency (detik); render/encode PNG ada di kisaran 10ms-1s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RENDER_STAGES = ("load", "layout", "draw", "encode")
+
+HELP = {
+    "requests_total": ("counter", "Jumlah request per route, method, status."),
+    "request_duration_seconds": ("histogram", "Latency request per route."),
+    "requests_in_flight": ("gauge", "Request yang sedang diproses."),
+    "render_stage_seconds": ("histogram", "Durasi tahap render /caption-image."),
+    "generated_bytes_total": ("counter", "Byte PNG yang ditulis ke generated_memes/."),
+    "cache_requests_total": ("counter", "Lookup cache per cache (font/image) dan hasil (hit/miss)."),
+    "image_source_total": ("counter", "Sumber gambar template (pool, raw_store, decode)."),
+    "cache_hit_ratio": ("gauge", "Hit ratio cache (dihitung saat scrape)."),
+}
+
+_lock = threading.Lock()
+# (nama, labels) -> nilai; labels = tuple pasangan (key, value) terurut
+_counters = {}
+_gauges = {}
+# (nama, labels) -> [count per bucket (tanpa +Inf), sum, count]
+_histograms = {}
+_last_flush = 0.0
+# True kalau ada metrik baru sejak snapshot terakhir ditulis
+_dirty = False
+_flusher_pid = None
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, value=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    global _dirty
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        _dirty = True
+
+
+def gauge_add(name, delta, **labels):
+    if not METRICS_ENABLED:
+        return
+    global _dirty
+    key = (name, _labels(labels))
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+        _dirty = True
+
+
+def observe(name, seconds, **labels):
+    if not METRICS_ENABLED:
+        return
+    global _dirty
+    key = (name, _labels(labels))
+    with _lock:
+        _dirty = True
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                hist[0][i] += 1
+                break
+        hist[1] += seconds
+        hist[2] += 1
+
+
+def observe_render(stage_seconds):
+    """stage_seconds: {"load": s, "layout": s, "draw": s, "encode": s}"""
+    for stage, seconds in stage_seconds.items():
+        observe("render_stage_seconds", seconds, stage=stage)
+
+
+def record_cache(cache, hit):
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+# ---------- snapshot / multi-proses ----------
+def _snapshot(clear_dirty=False):
+    global _dirty
+    with _lock:
+        if clear_dirty:
+            _dirty = False
+        return {
+            "pid": os.getpid(),
+            "counters": [[n, list(map(list, lb)), v] for (n, lb), v in _counters.items()],
+            "gauges": [[n, list(map(list, lb)), v] for (n, lb), v in _gauges.items()],
+            "histograms": [[n, list(map(list, lb)), h[0][:], h[1], h[2]] for (n, lb), h in _histograms.items()],
+        }
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_MULTIPROC_DIR, f"{PREFIX}_{pid}.json")
+
+
+def flush(force=False):
+    """Tulis snapshot proses ini ke METRICS_MULTIPROC_DIR (throttled, atomic)."""
+    global _last_flush
+    if not METRICS_MULTIPROC_DIR or not METRICS_ENABLED:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_SECONDS:
+        return
+    _last_flush = now
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_snapshot(clear_dirty=True), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[METRICS Warning] gagal tulis snapshot: {e}")
+
+
+def _flusher_loop():
+    while True:
+        time.sleep(max(METRICS_FLUSH_SECONDS, 0.05))
+        if _dirty:
+            flush(force=True)
+
+
+def _ensure_flusher():
+    """Start thread flusher sekali per proses (dicek per pid: worker hasil fork perlu thread sendiri)."""
+    global _flusher_pid
+    if not METRICS_MULTIPROC_DIR or _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flusher_loop, name="metrics-flush", daemon=True).start()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _collect():
+    """Gabungan snapshot proses ini + (kalau multi-proses) snapshot proses lain."""
+    snapshots = [_snapshot()]
+    if METRICS_MULTIPROC_DIR:
+        for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, f"{PREFIX}_*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snap.get("pid") != os.getpid():
+                snapshots.append(snap)
+
+    counters, gauges, hists = {}, {}, {}
+    for snap in snapshots:
+        alive = snap["pid"] == os.getpid() or _pid_alive(snap["pid"])
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        if alive:
+            for name, labels, value in snap["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, buckets, total, count in snap["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = hists.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+            for i, n in enumerate(buckets):
+                merged[0][i] += n
+            merged[1] += total
+            merged[2] += count
+
+    # Hit ratio per cache dari counter gabungan
+    for cache in ("font", "image"):
+        hits = counters.get(("cache_requests_total", (("cache", cache), ("result", "hit"))), 0)
+        misses = counters.get(("cache_requests_total", (("cache", cache), ("result", "miss"))), 0)
+        if hits + misses:
+            gauges[("cache_hit_ratio", (("cache", cache),))] = hits / (hits + misses)
+    return counters, gauges, hists
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for k, v in pairs:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{k}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _fmt_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 9))
+    return str(value)
+
+
+def render_text():
+    counters, gauges, hists = _collect()
+    by_name = {}
+    for store in (counters, gauges):
+        for (name, labels), value in store.items():
+            by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), hist in hists.items():
+        by_name.setdefault(name, []).append((labels, hist))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = HELP.get(name, ("untyped", name))
+        full = f"{PREFIX}_{name}"
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind == "histogram":
+                buckets, total, count = value
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS, buckets):
+                    cumulative += n
+                    lines.append(f"{full}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{full}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{full}_sum{_fmt_labels(labels)} {_fmt_value(total)}")
+                lines.append(f"{full}_count{_fmt_labels(labels)} {count}")
+            else:
+                lines.append(f"{full}{_fmt_labels(labels)} {_fmt_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- integrasi Flask ----------
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_in_flight = True
+    gauge_add("requests_in_flight", 1)
+
+
+def _after_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        if route != "/metrics":
+            inc("requests_total", route=route, method=request.method, status=str(response.status_code))
+            observe("request_duration_seconds", time.perf_counter() - start, route=route)
+    return response
+
+
+def _teardown_request(exc):
+    # Selalu jalan (juga kalau handler raise), jadi in-flight tidak bocor
+    if g.pop("_metrics_in_flight", False):
+        gauge_add("requests_in_flight", -1)
+    _ensure_flusher()
+    flush()
+
+
+def init_app(app):
+    """Pasang hook metrik ke app dan daftarkan blueprint /metrics."""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.register_blueprint(metrics_bp)
+    if METRICS_MULTIPROC_DIR:
+        atexit.register(flush, True)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_text(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,133 @@
+from PIL import Image, ImageColor, ImageDraw
+import math
+import numpy as np
+
+# Compositor teks + outline berbasis NumPy.
+# Teks dirender SEKALI jadi mask (mode "L"), outline didapat dari dilasi
+# morfologis mask tersebut, lalu fill + outline dikomposit dalam satu layer RGBA.
+# Tidak bergantung pada stroker FreeType, jadi jalan untuk semua TTF.
+
+
+def _to_rgba(color):
+    """Terima '#rrggbb', nama warna, atau list/tuple [r, g, b(, a)] -> tuple RGBA."""
+    if isinstance(color, (list, tuple)):
+        values = [int(c) for c in color]
+        if len(values) not in (3, 4) or not all(0 <= v <= 255 for v in values):
+            raise ValueError(f"warna harus [r, g, b(, a)] 0-255: {color!r}")
+        if len(values) == 3:
+            values.append(255)
+        return tuple(values[:4])
+    return ImageColor.getcolor(str(color), "RGBA")
+
+
+def is_valid_color(color):
+    """True kalau color bisa dipakai _to_rgba (dicek di /caption-image supaya warna salah = 400)."""
+    try:
+        _to_rgba(color)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def dilate_disk(mask, radius):
+    """
+    Dilasi grayscale mask 2D (uint8) dengan structuring element berbentuk disk.
+
+    Disk dipecah jadi baris-baris horizontal: dilasi horizontal lebar 0..radius
+    dibangun inkremental (satu shift kiri/kanan per langkah), lalu tiap baris
+    disk di-shift vertikal. Total O(radius) operasi array penuh, bukan
+    O(radius^2) seperti stamping per offset.
+
+    Mask harus sudah di-padding minimal `radius` piksel di tiap sisi.
+    """
+    radius = int(radius)
+    if radius <= 0:
+        return mask.copy()
+
+    horizontal = [mask]
+    current = mask
+    for _ in range(radius):
+        grown = current.copy()
+        np.maximum(grown[:, 1:], current[:, :-1], out=grown[:, 1:])
+        np.maximum(grown[:, :-1], current[:, 1:], out=grown[:, :-1])
+        horizontal.append(grown)
+        current = grown
+
+    out = horizontal[radius].copy()
+    limit = (radius + 0.5) ** 2
+    for dy in range(1, radius + 1):
+        half_width = int(math.sqrt(max(0.0, limit - dy * dy)))
+        row = horizontal[min(half_width, radius)]
+        np.maximum(out[dy:], row[:-dy], out=out[dy:])
+        np.maximum(out[:-dy], row[dy:], out=out[:-dy])
+    return out
+
+
+def render_stroked_text(text, font, fill, stroke_width, stroke_fill):
+    """
+    Render satu baris teks jadi layer RGBA (fill + outline).
+
+    Returns:
+        (layer, (offset_x, offset_y)) — offset relatif ke titik xy yang
+        biasa dipakai draw.text (anchor "la"), atau (None, None) kalau teks kosong.
+    """
+    radius = max(0, int(stroke_width))
+    left, top, right, bottom = font.getbbox(text)
+    width = right - left
+    height = bottom - top
+    if width <= 0 or height <= 0:
+        return None, None
+
+    mask_img = Image.new("L", (width + 2 * radius, height + 2 * radius), 0)
+    ImageDraw.Draw(mask_img).text((radius - left, radius - top), text, font=font, fill=255)
+
+    fill_mask = np.asarray(mask_img, dtype=np.uint8)
+    outline_mask = dilate_disk(fill_mask, radius)
+
+    fill_rgba = np.array(_to_rgba(fill), dtype=np.uint32)
+    stroke_rgba = np.array(_to_rgba(stroke_fill), dtype=np.uint32)
+
+    # Warna: blend stroke -> fill sesuai coverage glyph (anti-alias tetap halus).
+    t = fill_mask.astype(np.uint32)[..., None]
+    rgb = (stroke_rgba[:3] * (255 - t) + fill_rgba[:3] * t + 127) // 255
+
+    # Alpha: outline (sudah mencakup area fill), dikali alpha warna masing-masing.
+    alpha_stroke = (outline_mask.astype(np.uint32) * stroke_rgba[3] + 127) // 255
+    alpha_fill = (fill_mask.astype(np.uint32) * fill_rgba[3] + 127) // 255
+    alpha = np.maximum(alpha_stroke, alpha_fill)
+
+    layer_arr = np.empty(fill_mask.shape + (4,), dtype=np.uint8)
+    layer_arr[..., :3] = rgb
+    layer_arr[..., 3] = alpha
+    layer = Image.fromarray(layer_arr, "RGBA")
+    return layer, (left - radius, top - radius)
+
+
+def draw_text_with_stroke(img, xy, text, font, fill, stroke_width, stroke_fill):
+    """
+    Pengganti draw.text(..., stroke_width, stroke_fill) yang tidak bisa gagal
+    diam-diam: fill dan outline dikomposit sekali ke `img` (in-place).
+    """
+    layer, offset = render_stroked_text(text, font, fill, stroke_width, stroke_fill)
+    if layer is None:
+        return
+
+    dest_x = int(round(xy[0])) + offset[0]
+    dest_y = int(round(xy[1])) + offset[1]
+
+    # Clip layer ke area gambar (alpha_composite tidak terima dest negatif)
+    src_x = max(0, -dest_x)
+    src_y = max(0, -dest_y)
+    src_right = min(layer.width, img.width - dest_x)
+    src_bottom = min(layer.height, img.height - dest_y)
+    if src_right <= src_x or src_bottom <= src_y:
+        return
+
+    if (src_x, src_y, src_right, src_bottom) != (0, 0, layer.width, layer.height):
+        layer = layer.crop((src_x, src_y, src_right, src_bottom))
+    dest = (dest_x + src_x, dest_y + src_y)
+
+    if img.mode == "RGBA":
+        img.alpha_composite(layer, dest=dest)
+    else:
+        img.paste(layer, dest, layer)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool shared-memory untuk base image template (cleanmeme) lintas worker proses.
+
+- Parent (sekali): create_pool(MEMES) -> decode semua template ke blok
+  multiprocessing.shared_memory, index-nya ditaruh di blok "<prefix>_index",
+  prefix diexport lewat env MEME_TEMPLATE_POOL supaya worker bisa attach.
+- Worker: get_attached_pool() -> attach read-only, template diambil by id.
+  Image yang dikembalikan read-only; ImageDraw otomatis bikin salinan
+  per-request sebelum digambari, jadi blok shared tidak pernah ditulis.
+
+Contoh (gunicorn): panggil create_pool() di hook on_starting, sebelum fork worker.
+Contoh (dev): MEME_SHARED_POOL=1 python -m routes.meme
+
+Bukti penghematan memori:
+    python routes/template_pool.py --workers 4
+"""
+import argparse
+import atexit
+import json
+import os
+import struct
+import sys
+import threading
+import uuid
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.template_store import BASE_DIR, MEMES_PATH, load_raw_image, raw_path_for
+
+POOL_ENV = "MEME_TEMPLATE_POOL"
+_INDEX_LEN = struct.Struct("<I")
+
+_attached_pool = None
+_attach_lock = threading.Lock()
+_register_lock = threading.Lock()
+
+
+def _attach_segment(name):
+    """Attach ke blok shared memory tanpa didaftarkan ke resource_tracker worker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: tidak ada track=False. Registrasi ke resource_tracker
+        # di-skip sementara supaya blok tidak di-unlink saat worker exit
+        # (pemiliknya parent; tracker-nya juga bisa sama dengan parent).
+        from multiprocessing import resource_tracker
+
+        with _register_lock:
+            original_register = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                return shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = original_register
+
+
+def _decode_template(meme):
+    rel_path = str(meme.get("url_cleanmeme") or "").lstrip("/")
+    full_path = os.path.join(BASE_DIR, rel_path)
+    img = load_raw_image(raw_path_for(full_path), source_path=full_path)
+    if img is None:
+        with Image.open(full_path) as src:
+            img = src.convert("RGBA")
+    return img
+
+
+class TemplatePool:
+    """Kumpulan blok shared memory (satu per template) + index-nya."""
+
+    def __init__(self, prefix, index, owner=False):
+        self.prefix = prefix
+        self.index = index  # template_id -> {"name", "width", "height"}
+        self.owner = owner
+        # Proses pembuat pool; worker hasil fork ikut mewarisi objek ini (dan hook atexit-nya)
+        self.owner_pid = os.getpid() if owner else None
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, template_id):
+        return str(template_id) in self.index
+
+    def _segment(self, template_id):
+        entry = self.index[str(template_id)]
+        with self._lock:
+            shm = self._segments.get(entry["name"])
+            if shm is None:
+                shm = _attach_segment(entry["name"])
+                self._segments[entry["name"]] = shm
+        return shm, entry["width"], entry["height"]
+
+    def get_image(self, template_id):
+        """PIL Image read-only yang backing-nya shared memory (tanpa copy)."""
+        if str(template_id) not in self.index:
+            return None
+        shm, width, height = self._segment(template_id)
+        return Image.frombuffer("RGBA", (width, height), shm.buf[: width * height * 4], "raw", "RGBA", 0, 1)
+
+    def get_array(self, template_id):
+        """View NumPy (height, width, 4) read-only ke blok template."""
+        import numpy as np
+
+        if str(template_id) not in self.index:
+            return None
+        shm, width, height = self._segment(template_id)
+        arr = np.ndarray((height, width, 4), dtype=np.uint8, buffer=shm.buf)
+        arr.flags.writeable = False
+        return arr
+
+    def nbytes(self):
+        return sum(e["width"] * e["height"] * 4 for e in self.index.values())
+
+    def close(self):
+        """Lepas semua mapping; cuma proses pembuat (owner) yang juga unlink blok-bloknya."""
+        with self._lock:
+            segments = list(self._segments.values())
+            self._segments.clear()
+        for shm in segments:
+            try:
+                shm.close()
+            except BufferError:
+                # Masih ada Image/array yang pegang buffer; biarkan GC yang tutup
+                pass
+            if self.owner and os.getpid() == self.owner_pid:
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def create_pool(memes, prefix=None):
+    """
+    (Parent) Decode semua template ke shared memory dan export prefix lewat env.
+    Template yang gagal di-load dilewati (worker fallback ke load biasa).
+    """
+    prefix = prefix or f"mp{uuid.uuid4().hex[:8]}"
+    index = {}
+    segments = {}
+
+    for meme in memes:
+        template_id = str(meme.get("id", "")).strip()
+        if not template_id:
+            continue
+        try:
+            img = _decode_template(meme)
+        except Exception as e:
+            print(f"[POOL Warning] skip template {template_id}: {e}")
+            continue
+
+        name = f"{prefix}_{template_id}"
+        data = img.tobytes()
+        shm = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+        shm.buf[: len(data)] = data
+        segments[name] = shm
+        index[template_id] = {"name": name, "width": img.width, "height": img.height}
+
+    payload = json.dumps(index).encode("utf-8")
+    index_shm = shared_memory.SharedMemory(name=f"{prefix}_index", create=True, size=_INDEX_LEN.size + len(payload))
+    _INDEX_LEN.pack_into(index_shm.buf, 0, len(payload))
+    index_shm.buf[_INDEX_LEN.size:_INDEX_LEN.size + len(payload)] = payload
+    segments[index_shm.name] = index_shm
+
+    pool = TemplatePool(prefix, index, owner=True)
+    pool._segments = segments
+    os.environ[POOL_ENV] = prefix
+    atexit.register(pool.close)
+
+    print(f"[POOL] {len(index)} template, {pool.nbytes() / 1e6:.1f} MB shared (prefix={prefix})")
+    return pool
+
+
+def attach_pool(prefix):
+    """(Worker) Attach ke pool yang dibuat parent. Return None kalau tidak ada."""
+    try:
+        index_shm = _attach_segment(f"{prefix}_index")
+    except FileNotFoundError:
+        return None
+    (length,) = _INDEX_LEN.unpack_from(index_shm.buf, 0)
+    index = json.loads(bytes(index_shm.buf[_INDEX_LEN.size:_INDEX_LEN.size + length]).decode("utf-8"))
+    index_shm.close()
+    return TemplatePool(prefix, index, owner=False)
+
+
+def get_attached_pool():
+    """Pool milik proses ini (lazy attach dari env MEME_TEMPLATE_POOL), atau None."""
+    global _attached_pool
+    prefix = os.getenv(POOL_ENV)
+    if not prefix:
+        return None
+    if _attached_pool is not None and _attached_pool.prefix == prefix:
+        return _attached_pool
+    with _attach_lock:
+        if _attached_pool is None or _attached_pool.prefix != prefix:
+            _attached_pool = attach_pool(prefix)
+    return _attached_pool
+
+
+# ============================================================
+# MEMORY REPORT
+# ============================================================
+def memory_report():
+    """
+    Ringkasan memori proses ini (KB). Di Linux pakai /proc/self/smaps_rollup:
+    PSS membagi page shared ke semua proses pemakainya, jadi jumlah PSS
+    antar worker = memori riil yang dipakai.
+    """
+    report = {"pid": os.getpid(), "rss_kb": None, "pss_kb": None, "shared_kb": None, "private_kb": None}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+        report["rss_kb"] = fields.get("Rss")
+        report["pss_kb"] = fields.get("Pss")
+        report["shared_kb"] = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+        report["private_kb"] = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    except OSError:
+        try:
+            import resource
+
+            report["rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except Exception:
+            pass
+    return report
+
+
+def _worker_touch_templates(mode, template_ids, memes, result_queue):
+    """Worker demo: load semua template (private decode vs pool) lalu lapor memori."""
+    held = []
+    if mode == "pool":
+        pool = get_attached_pool()
+        for template_id in template_ids:
+            img = pool.get_image(template_id)
+            if img is not None:
+                img.getextrema()  # sentuh semua page
+                held.append(img)
+    else:
+        for meme in memes:
+            img = _decode_template(meme).copy()
+            img.getextrema()
+            held.append(img)
+    report = memory_report()
+    report["mode"] = mode
+    result_queue.put(report)
+
+
+def _run_memory_demo(memes, workers):
+    import multiprocessing as mp
+
+    ctx = mp.get_context("spawn")
+    summary = {}
+    pool = create_pool(memes)
+    template_ids = list(pool.index.keys())
+    try:
+        for mode in ("private", "pool"):
+            queue = ctx.Queue()
+            procs = [
+                ctx.Process(target=_worker_touch_templates, args=(mode, template_ids, memes, queue))
+                for _ in range(workers)
+            ]
+            for p in procs:
+                p.start()
+            reports = [queue.get() for _ in procs]
+            for p in procs:
+                p.join()
+
+            print(f"\n[MEM] mode={mode}")
+            for r in reports:
+                print(
+                    f"  pid={r['pid']} rss={r['rss_kb']} KB pss={r['pss_kb']} KB "
+                    f"shared={r['shared_kb']} KB private={r['private_kb']} KB"
+                )
+            summary[mode] = sum((r["pss_kb"] or r["rss_kb"] or 0) for r in reports)
+    finally:
+        pool.close()
+
+    print(f"\n[MEM] total PSS {workers} worker: private={summary['private'] / 1024:.1f} MB | "
+          f"pool={summary['pool'] / 1024:.1f} MB (+ {pool.nbytes() / 1e6:.1f} MB pool sekali di parent)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Demo memori: decode privat per worker vs shared-memory pool.")
+    parser.add_argument("--workers", type=int, default=4, help="jumlah worker proses")
+    parser.add_argument("--memes-path", default=MEMES_PATH, help="path memes.json")
+    args = parser.parse_args()
+
+    with open(args.memes_path, encoding="utf-8") as f:
+        _memes = json.load(f)
+    _run_memory_demo(_memes, args.workers)
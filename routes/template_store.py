@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Raw template store: template cleanmeme disimpan sebagai array RGBA mentah
+(+ header kecil) supaya bisa di-mmap tanpa decode PNG.
+
+Format file (.rgba):
+    header 32 byte  = magic(8s) | width(u32) | height(u32) | source_mtime_ns(u64) | padding(8)
+    body            = width * height * 4 byte RGBA, row-major
+
+Beberapa worker rendering yang mmap file yang sama berbagi page lewat
+OS page cache, bukan pegang salinan decode masing-masing.
+
+Preprocess (jalankan dari project root):
+    python routes/template_store.py            # build semua template di memes.json
+    python routes/template_store.py --force    # rebuild walau belum stale
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEMES_PATH = os.path.join(BASE_DIR, "memes.json")
+RAW_DIR = os.getenv("MEME_RAW_STORE_DIR", os.path.join(BASE_DIR, "cleanmeme_raw"))
+
+RAW_MAGIC = b"MEMERAW1"
+HEADER_FORMAT = "<8sIIQ8x"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# path file .rgba -> (raw_mtime_ns, mmap, width, height)
+_MMAP_CACHE = {}
+_MMAP_LOCK = threading.Lock()
+
+
+def raw_path_for(source_path):
+    """
+    Lokasi file .rgba untuk satu gambar sumber (mis: cleanmeme/xxx.png).
+    Nama file + hash path relatif ke project root: file bernama sama di folder
+    berbeda tidak saling menimpa.
+    """
+    rel_path = os.path.relpath(os.path.abspath(source_path), BASE_DIR).replace(os.sep, "/")
+    digest = hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(RAW_DIR, f"{os.path.basename(source_path)}.{digest}.rgba")
+
+
+def write_raw_template(source_path, raw_path=None):
+    """Decode gambar sumber sekali lalu tulis sebagai .rgba (atomic replace)."""
+    raw_path = raw_path or raw_path_for(source_path)
+    os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+
+    source_mtime_ns = os.stat(source_path).st_mtime_ns
+    with Image.open(source_path) as src:
+        img = src.convert("RGBA")
+
+    # Nama temp unik per proses + thread: watcher katalog di tiap worker API bisa
+    # menulis template yang sama bersamaan
+    tmp_path = f"{raw_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(HEADER_FORMAT, RAW_MAGIC, img.width, img.height, source_mtime_ns))
+            f.write(img.tobytes())
+        os.replace(tmp_path, raw_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return raw_path
+
+
+def _open_raw(raw_path, source_path=None):
+    """
+    Return (mmap, width, height) atau None kalau file tidak ada / rusak /
+    sudah stale terhadap gambar sumber.
+    """
+    try:
+        raw_mtime_ns = os.stat(raw_path).st_mtime_ns
+    except OSError:
+        return None
+
+    with _MMAP_LOCK:
+        cached = _MMAP_CACHE.get(raw_path)
+        if cached and cached[0] == raw_mtime_ns:
+            mm, width, height, source_mtime_ns = cached[1:]
+        else:
+            try:
+                with open(raw_path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return None
+            if len(mm) < HEADER_SIZE:
+                return None
+            magic, width, height, source_mtime_ns = struct.unpack_from(HEADER_FORMAT, mm, 0)
+            if magic != RAW_MAGIC or len(mm) != HEADER_SIZE + width * height * 4:
+                return None
+            _MMAP_CACHE[raw_path] = (raw_mtime_ns, mm, width, height, source_mtime_ns)
+
+    if source_path is not None:
+        try:
+            if os.stat(source_path).st_mtime_ns != source_mtime_ns:
+                return None
+        except OSError:
+            # Sumber hilang tapi .rgba ada: tetap pakai store
+            pass
+    return mm, width, height
+
+
+def load_raw_image(raw_path, source_path=None):
+    """
+    Wrap file .rgba jadi PIL Image tanpa decode/copy (read-only, backing = mmap).
+    ImageDraw otomatis bikin salinan privat saat gambar mau digambari.
+    """
+    opened = _open_raw(raw_path, source_path)
+    if opened is None:
+        return None
+    mm, width, height = opened
+    return Image.frombuffer("RGBA", (width, height), memoryview(mm)[HEADER_SIZE:], "raw", "RGBA", 0, 1)
+
+
+def load_raw_array(raw_path, source_path=None):
+    """Sama seperti load_raw_image, tapi return view NumPy (height, width, 4) read-only."""
+    import numpy as np
+
+    opened = _open_raw(raw_path, source_path)
+    if opened is None:
+        return None
+    mm, width, height = opened
+    return np.frombuffer(mm, dtype=np.uint8, count=width * height * 4, offset=HEADER_SIZE).reshape(height, width, 4)
+
+
+def invalidate(raw_path=None):
+    """Lepas mmap dari cache (semua, atau satu path). Mapping ditutup saat sudah tidak dipakai."""
+    with _MMAP_LOCK:
+        if raw_path is None:
+            _MMAP_CACHE.clear()
+        else:
+            _MMAP_CACHE.pop(raw_path, None)
+
+
+def build_store(memes, force=False):
+    """Preprocess semua template di katalog. Return (built, skipped, failed)."""
+    built = skipped = failed = 0
+    for meme in memes:
+        rel_path = str(meme.get("url_cleanmeme") or "").lstrip("/")
+        if not rel_path or rel_path.startswith("http"):
+            continue
+        source_path = os.path.join(BASE_DIR, rel_path)
+        raw_path = raw_path_for(source_path)
+
+        if not force and _open_raw(raw_path, source_path) is not None:
+            skipped += 1
+            continue
+        try:
+            write_raw_template(source_path, raw_path)
+            built += 1
+            print(f"[RAW STORE] {meme.get('id')} -> {raw_path}")
+        except Exception as e:
+            failed += 1
+            print(f"[RAW STORE Error] {meme.get('id')}: {e}")
+    invalidate()
+    return built, skipped, failed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build raw RGBA template store (mmap-able) dari memes.json.")
+    parser.add_argument("--memes-path", default=MEMES_PATH, help="path memes.json")
+    parser.add_argument("--force", action="store_true", help="rebuild semua walau belum stale")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.memes_path, encoding="utf-8") as f:
+        memes = json.load(f)
+    built, skipped, failed = build_store(memes, force=args.force)
+    print(f"[RAW STORE] built={built}, skipped={skipped}, failed={failed} -> {RAW_DIR}")
@@ -1,6 +1,9 @@
 import argparse
 import importlib
 
+from pipeline_trace import print_summary as print_trace_summary
+from profiling import add_profile_argument, profile_scope
+
 
 DEFAULT_TOPIC = "lecturer"
 DEFAULT_MODE = "zero"
@@ -86,19 +89,21 @@ def _parse_args():
     )
     parser.add_argument("--start", type=int, default=DEFAULT_TEMPLATE_START)
     parser.add_argument("--end", type=int, default=DEFAULT_TEMPLATE_END)
+    add_profile_argument(parser)
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = _parse_args()
-    results = run_templates_all_models(
-        language=args.language,
-        topic_key=args.topic,
-        mode=args.mode,
-        models=args.models,
-        template_start=args.start,
-        template_end=args.end,
-    )
+    with profile_scope("run_all_models_001_010", args.profile):
+        results = run_templates_all_models(
+            language=args.language,
+            topic_key=args.topic,
+            mode=args.mode,
+            models=args.models,
+            template_start=args.start,
+            template_end=args.end,
+        )
 
     print(f"\n{'=' * 70}")
     print("RINGKASAN")
@@ -114,3 +119,5 @@ if __name__ == "__main__":
         )
         error_count = len(model_results) - success_count
         print(f"- {model_name}: success={success_count}, error={error_count}")
+
+    print_trace_summary()
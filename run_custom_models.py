@@ -5,6 +5,8 @@ import gemma3
 import llama4
 import qwen3_5
 import qwen3_vl
+from pipeline_trace import print_summary as print_trace_summary
+from profiling import add_profile_argument, profile_scope
 
 
 MODEL_SPECS = {
@@ -152,6 +154,7 @@ def parse_args():
     parser.add_argument("--model", help="override model tag, contoh: llama4:latest")
     parser.add_argument("--temperature", type=float, help="override temperature, contoh: 0.7")
     parser.add_argument("--dry-run", action="store_true", help="cuma print rencana run, tanpa eksekusi")
+    add_profile_argument(parser)
 
     return parser.parse_args()
 
@@ -239,15 +242,16 @@ def main():
         print("Contoh: python run_custom_models.py --llama 9,12,13 --gemma3 8,9,19 --method zero")
         return 1
 
-    results = run_custom_templates(
-        selections,
-        topic_key=args.topic,
-        language=args.language,
-        method=args.method,
-        model_name=args.model,
-        temperature=args.temperature,
-        dry_run=args.dry_run,
-    )
+    with profile_scope("run_custom_models", args.profile):
+        results = run_custom_templates(
+            selections,
+            topic_key=args.topic,
+            language=args.language,
+            method=args.method,
+            model_name=args.model,
+            temperature=args.temperature,
+            dry_run=args.dry_run,
+        )
 
     print(f"\n{'=' * 70}")
     print("RINGKASAN")
@@ -262,6 +266,8 @@ def main():
         error_count = len(model_results) - success_count
         print(f"- {model_name}: success={success_count}, error={error_count}")
 
+    if not args.dry_run:
+        print_trace_summary()
     return 0
 
 
@@ -0,0 +1,169 @@
+import json
+import os
+import time
+
+# ====== JOURNAL RENCANA SWEEP (auto_run_until_clear.py) ======
+# Satu unit kerja = satu template di satu konfigurasi (model, temperature, method,
+# topic, language). Status tiap unit (pending -> running -> done/failed) ditulis
+# append-only ke JSONL, jadi kalau driver mati di tengah run_plan, --resume cukup
+# memutar ulang journal lalu lanjut dari unit yang belum selesai.
+#
+# Baris journal:
+#   {"type": "plan", "plan": [...], "ts": ...}                      -> header, rencana lengkap
+#   {"type": "unit", "unit": "...", "status": "running", "ts": ...}
+#   {"type": "unit", "unit": "...", "status": "done", "seconds": 12.3, "stage": "qwen3_5/few", "ts": ...}
+#
+# SWEEP_JOURNAL_PATH -> default journal kalau --journal tidak diisi
+SWEEP_JOURNAL_PATH = os.getenv("SWEEP_JOURNAL_PATH", "sweep_journal.jsonl")
+
+STATUSES = ("pending", "running", "done", "failed")
+
+
+def unit_key(cfg, template_id):
+    """Key unik unit kerja (string, supaya bisa langsung jadi key dict / baris JSON)."""
+    return "|".join(
+        str(x) for x in (
+            cfg["model_key"], cfg["model_name"], cfg["temperature"], cfg["method"],
+            cfg["topic"], cfg["language"], template_id,
+        )
+    )
+
+
+def stage_key(cfg):
+    """Kelompok latency untuk ETA: model x method (few-shot jauh lebih lama dari zero-shot)."""
+    return f"{cfg['model_key']}/{cfg['method']}"
+
+
+def iter_units(plan):
+    for cfg in plan:
+        for template_id in cfg["template_ids"]:
+            yield cfg, template_id
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
+
+
+class SweepJournal:
+    """
+    Status unit kerja sweep, dibaca penuh sekali lalu di-update append-only.
+    Lookup status = dict, jadi skip unit selesai O(1) per unit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.plan = None
+        self.status = {}
+        self._counts = dict.fromkeys(STATUSES, 0)
+        self._remaining = {}
+        # stage -> [total detik, jumlah unit] dari unit selesai (done/failed)
+        self._durations = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for raw in lines:
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                # Baris terakhir bisa terpotong kalau proses mati saat menulis
+                continue
+            if entry.get("type") == "plan":
+                self.plan = entry.get("plan")
+            elif entry.get("type") == "unit":
+                self._apply(entry)
+
+    def _apply(self, entry):
+        self.status[entry["unit"]] = entry["status"]
+        if entry["status"] in ("done", "failed") and entry.get("seconds") is not None:
+            totals = self._durations.setdefault(entry.get("stage", ""), [0.0, 0])
+            totals[0] += float(entry["seconds"])
+            totals[1] += 1
+
+    def _append(self, entry):
+        entry["ts"] = round(time.time(), 3)
+        with open(self.path, "ab") as f:
+            f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, plan):
+        """Journal baru untuk rencana ini (journal lama di path yang sama disimpan sebagai .prev)."""
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + ".prev")
+        self.status = {}
+        self._durations = {}
+        self._append({"type": "plan", "plan": plan})
+        self.use_plan(plan)
+
+    def use_plan(self, plan):
+        """Hitung ulang counter progres untuk rencana ini (sekali, O(jumlah unit))."""
+        self.plan = plan
+        self._counts = dict.fromkeys(STATUSES, 0)
+        # stage -> jumlah unit yang belum selesai, untuk ETA
+        self._remaining = {}
+        for cfg, template_id in iter_units(plan):
+            status = self.get(cfg, template_id)
+            self._counts[status] += 1
+            if status not in ("done", "failed"):
+                stage = stage_key(cfg)
+                self._remaining[stage] = self._remaining.get(stage, 0) + 1
+
+    def get(self, cfg, template_id):
+        return self.status.get(unit_key(cfg, template_id), "pending")
+
+    def mark(self, cfg, template_id, status, seconds=None, error=None):
+        key = unit_key(cfg, template_id)
+        previous = self.status.get(key, "pending")
+        entry = {"type": "unit", "unit": key, "status": status, "stage": stage_key(cfg)}
+        if seconds is not None:
+            entry["seconds"] = round(seconds, 3)
+        if error:
+            entry["error"] = str(error)[:300]
+        self._append(entry)
+        self._apply(entry)
+
+        if self.plan is not None:
+            self._counts[previous] -= 1
+            self._counts[status] += 1
+            finished = ("done", "failed")
+            if status in finished and previous not in finished:
+                self._remaining[entry["stage"]] -= 1
+
+    def counts(self):
+        return dict(self._counts)
+
+    def eta_seconds(self):
+        """
+        Perkiraan sisa waktu: unit belum selesai per stage x rata-rata latency stage itu.
+        Stage yang belum punya data pakai rata-rata semua stage; None kalau belum ada data sama sekali.
+        """
+        total = sum(t for t, _ in self._durations.values())
+        n = sum(c for _, c in self._durations.values())
+        if not n:
+            return None
+        overall = total / n
+        eta = 0.0
+        for stage, remaining in self._remaining.items():
+            totals = self._durations.get(stage)
+            eta += remaining * (totals[0] / totals[1] if totals else overall)
+        return eta
+
+    def progress_line(self):
+        counts = self._counts
+        total = sum(counts.values())
+        finished = counts["done"] + counts["failed"]
+        eta = self.eta_seconds()
+        eta_text = format_duration(eta) if eta is not None else "?"
+        return f"{finished}/{total} unit (done={counts['done']}, failed={counts['failed']}) | ETA {eta_text}"
@@ -0,0 +1,413 @@
+"""
+Antrian kerja sweep (SQLite) untuk mode coordinator / worker.
+
+Coordinator mem-publish rencana (sama dengan auto_run_until_clear.py) ke file
+SQLite; sejumlah worker -- di host ini atau host lain yang berbagi folder --
+mengklaim unit (template x konfigurasi) dengan lease, menjalankan pipeline, lalu
+melaporkan hasil. Lease diperpanjang heartbeat selama unit berjalan; kalau worker
+mati, lease habis dan unit diklaim worker lain (maks SWEEP_QUEUE_MAX_ATTEMPTS kali).
+
+    python sweep_queue.py publish --templates 1-50 --models qwen3_5,gemma3 --temperatures 0.3,0.7
+    python sweep_queue.py worker                      # jalankan di tiap mesin / proses
+    python sweep_queue.py worker --models gemma3      # worker cuma ambil unit model tertentu
+    python sweep_queue.py dashboard --watch 30        # status + throughput per worker + ETA
+    python sweep_queue.py requeue                     # unit failed -> pending lagi
+
+Setelah antrian habis, retry Server Error tetap lewat CSV:
+    python auto_run_until_clear.py --skip-initial-run
+
+Catatan: journal SQLite dibiarkan mode default (rollback, bukan WAL) karena WAL
+tidak aman di network filesystem. Hasil tetap ditulis ke CSV masing-masing
+model module (lock fcntl per baris), plus ringkasan di tabel units.
+
+Env:
+    SWEEP_QUEUE_PATH          file antrian (default sweep_queue.db)
+    SWEEP_QUEUE_LEASE_SECONDS lama lease per klaim (default 900)
+    SWEEP_QUEUE_MAX_ATTEMPTS  batas klaim per unit sebelum dianggap failed (default 3)
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from profiling import add_profile_argument, profile_scope
+
+SWEEP_QUEUE_PATH = os.getenv("SWEEP_QUEUE_PATH", "sweep_queue.db")
+SWEEP_QUEUE_LEASE_SECONDS = float(os.getenv("SWEEP_QUEUE_LEASE_SECONDS", "900"))
+SWEEP_QUEUE_MAX_ATTEMPTS = int(os.getenv("SWEEP_QUEUE_MAX_ATTEMPTS", "3"))
+# Jendela waktu untuk hitung throughput di dashboard
+THROUGHPUT_WINDOW_SECONDS = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    unit TEXT NOT NULL UNIQUE,
+    cfg TEXT NOT NULL,
+    template_id TEXT NOT NULL,
+    model_key TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at REAL,
+    finished_at REAL,
+    seconds REAL,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS units_claim ON units (status, lease_until);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    started_at REAL,
+    last_seen REAL,
+    current_unit TEXT
+);
+"""
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SweepQueue:
+    """Antrian unit kerja di satu file SQLite. Tiap operasi buka koneksi sendiri (aman lintas thread)."""
+
+    def __init__(self, path=SWEEP_QUEUE_PATH, lease_seconds=SWEEP_QUEUE_LEASE_SECONDS,
+                 max_attempts=SWEEP_QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE: ambil write lock di awal, jadi SELECT + UPDATE klaim atomik antar proses
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ---------- coordinator ----------
+    def publish(self, plan, reset=False):
+        """Masukkan semua unit rencana. Unit yang sudah ada (dari publish sebelumnya) tidak diubah."""
+        from sweep_journal import iter_units, stage_key, unit_key
+
+        rows = []
+        for cfg, template_id in iter_units(plan):
+            unit_cfg = {k: v for k, v in cfg.items() if k != "template_ids"}
+            rows.append((
+                unit_key(cfg, template_id), json.dumps(unit_cfg), template_id, cfg["model_key"], stage_key(cfg),
+            ))
+        with self._transaction() as conn:
+            if reset:
+                conn.execute("DELETE FROM units")
+                conn.execute("DELETE FROM workers")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO units (unit, cfg, template_id, model_key, stage) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            added = conn.total_changes - before
+        return added, len(rows)
+
+    def requeue(self, statuses=("failed",)):
+        placeholders = ",".join("?" for _ in statuses)
+        with self._transaction() as conn:
+            cur = conn.execute(
+                f"UPDATE units SET status = 'pending', attempts = 0, worker = NULL, lease_until = NULL, error = NULL "
+                f"WHERE status IN ({placeholders})",
+                tuple(statuses),
+            )
+            return cur.rowcount
+
+    # ---------- worker ----------
+    def claim(self, worker, model_keys=None):
+        """
+        Klaim satu unit: pending, atau running yang lease-nya sudah habis (worker mati).
+        Return (unit, cfg, template_id) atau None kalau tidak ada yang bisa diklaim.
+        """
+        now = time.time()
+        model_filter = ""
+        params = [now]
+        if model_keys:
+            model_filter = f" AND model_key IN ({','.join('?' for _ in model_keys)})"
+            params.extend(model_keys)
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT unit, cfg, template_id, attempts, status FROM units "
+                    "WHERE (status = 'pending' OR (status = 'running' AND lease_until < ?))"
+                    f"{model_filter} ORDER BY seq LIMIT 1",
+                    params,
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= self.max_attempts:
+                    # Unit yang terus membuat worker mati jangan diklaim selamanya
+                    conn.execute(
+                        "UPDATE units SET status = 'failed', finished_at = ?, lease_until = NULL, error = ? "
+                        "WHERE unit = ?",
+                        (now, f"lease habis {row['attempts']}x (worker mati?)", row["unit"]),
+                    )
+                    continue
+                if row["status"] == "running":
+                    print(f"[QUEUE] lease habis, klaim ulang: {row['unit']}")
+                conn.execute(
+                    "UPDATE units SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                    "started_at = ? WHERE unit = ?",
+                    (worker, now + self.lease_seconds, now, row["unit"]),
+                )
+                conn.execute(
+                    "INSERT INTO workers (worker, started_at, last_seen, current_unit) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(worker) DO UPDATE SET last_seen = excluded.last_seen, "
+                    "current_unit = excluded.current_unit",
+                    (worker, now, now, row["unit"]),
+                )
+                return row["unit"], json.loads(row["cfg"]), row["template_id"]
+
+    def heartbeat(self, worker, unit):
+        """Perpanjang lease unit yang sedang dikerjakan. False kalau lease sudah diambil worker lain."""
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE units SET lease_until = ? WHERE unit = ? AND worker = ? AND status = 'running'",
+                (now + self.lease_seconds, unit, worker),
+            )
+            conn.execute("UPDATE workers SET last_seen = ? WHERE worker = ?", (now, worker))
+            return cur.rowcount == 1
+
+    def complete(self, worker, unit, seconds, error=None, result=None):
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE units SET status = ?, finished_at = ?, seconds = ?, error = ?, result = ?, "
+                "lease_until = NULL WHERE unit = ? AND worker = ?",
+                (
+                    "failed" if error else "done", now, round(seconds, 3),
+                    str(error)[:300] if error else None,
+                    json.dumps(result, default=str) if result is not None else None,
+                    unit, worker,
+                ),
+            )
+            conn.execute(
+                "UPDATE workers SET last_seen = ?, current_unit = NULL WHERE worker = ?", (now, worker)
+            )
+            if cur.rowcount != 1:
+                print(f"[QUEUE Warning] lease {unit} sudah diklaim worker lain, hasil tetap tercatat di CSV")
+
+    def has_open_units(self, model_keys=None):
+        query = "SELECT COUNT(*) FROM units WHERE status IN ('pending', 'running')"
+        params = []
+        if model_keys:
+            query += f" AND model_key IN ({','.join('?' for _ in model_keys)})"
+            params.extend(model_keys)
+        with self._connect() as conn:
+            return conn.execute(query, params).fetchone()[0] > 0
+
+    # ---------- dashboard ----------
+    def snapshot(self, window_seconds=THROUGHPUT_WINDOW_SECONDS):
+        now = time.time()
+        since = now - window_seconds
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall())
+            stages = [
+                dict(r) for r in conn.execute(
+                    "SELECT stage, COUNT(*) AS finished, AVG(seconds) AS mean_s FROM units "
+                    "WHERE status IN ('done', 'failed') GROUP BY stage ORDER BY stage"
+                )
+            ]
+            remaining = dict(conn.execute(
+                "SELECT stage, COUNT(*) FROM units WHERE status IN ('pending', 'running') GROUP BY stage"
+            ).fetchall())
+            workers = [
+                dict(r) for r in conn.execute(
+                    "SELECT w.worker, w.last_seen, w.current_unit, "
+                    "SUM(u.status = 'done') AS done, SUM(u.status = 'failed') AS failed, "
+                    "SUM(u.finished_at >= ?) AS recent, AVG(u.seconds) AS mean_s "
+                    "FROM workers w LEFT JOIN units u ON u.worker = w.worker AND u.status IN ('done', 'failed') "
+                    "GROUP BY w.worker ORDER BY w.worker",
+                    (since,),
+                )
+            ]
+            recent_total = conn.execute(
+                "SELECT COUNT(*) FROM units WHERE status IN ('done', 'failed') AND finished_at >= ?", (since,)
+            ).fetchone()[0]
+
+        # Throughput: unit selesai per menit di jendela terakhir (semua worker)
+        throughput = recent_total / (window_seconds / 60)
+        pending = counts.get("pending", 0) + counts.get("running", 0)
+        eta = pending / throughput * 60 if throughput else None
+        for w in workers:
+            w["units_per_min"] = round((w["recent"] or 0) / (window_seconds / 60), 2)
+            w["idle_s"] = round(now - w["last_seen"], 1) if w["last_seen"] else None
+        for s in stages:
+            s["remaining"] = remaining.get(s["stage"], 0)
+        return {
+            "counts": {status: counts.get(status, 0) for status in ("pending", "running", "done", "failed")},
+            "units_per_min": round(throughput, 2),
+            "eta_seconds": eta,
+            "workers": workers,
+            "stages": stages,
+        }
+
+
+def print_dashboard(snap):
+    from sweep_journal import format_duration
+
+    c = snap["counts"]
+    total = sum(c.values())
+    eta = format_duration(snap["eta_seconds"]) if snap["eta_seconds"] is not None else "?"
+    print(
+        f"\n[QUEUE] {time.strftime('%H:%M:%S')} total={total} pending={c['pending']} running={c['running']} "
+        f"done={c['done']} failed={c['failed']} | {snap['units_per_min']} unit/min | ETA {eta}"
+    )
+    if snap["workers"]:
+        print(f"[QUEUE] {'worker':<32} {'done':>5} {'fail':>5} {'u/min':>6} {'mean_s':>7} {'idle_s':>7}  current")
+        for w in snap["workers"]:
+            mean_s = round(w["mean_s"], 1) if w["mean_s"] is not None else "-"
+            print(
+                f"[QUEUE] {w['worker']:<32} {w['done'] or 0:>5} {w['failed'] or 0:>5} {w['units_per_min']:>6} "
+                f"{str(mean_s):>7} {str(w['idle_s']):>7}  {w['current_unit'] or '-'}"
+            )
+    if snap["stages"]:
+        print(f"[QUEUE] {'stage':<20} {'finished':>8} {'remaining':>9} {'mean_s':>7}")
+        for s in snap["stages"]:
+            print(f"[QUEUE] {s['stage']:<20} {s['finished']:>8} {s['remaining']:>9} {round(s['mean_s'] or 0, 1):>7}")
+
+
+def run_worker(queue, model_keys=None, max_units=0, poll_seconds=10.0):
+    """Klaim -> jalankan -> lapor, sampai antrian (untuk model ini) habis."""
+    from auto_run_until_clear import run_unit
+    from pipeline_trace import print_summary as print_trace_summary
+
+    worker = worker_id()
+    processed = 0
+    print(f"[QUEUE] worker {worker} mulai (queue={queue.path}, models={model_keys or 'semua'})")
+    while not max_units or processed < max_units:
+        claimed = queue.claim(worker, model_keys)
+        if claimed is None:
+            if not queue.has_open_units(model_keys):
+                break
+            # Unit tersisa sedang dikerjakan worker lain; tunggu kalau-kalau lease-nya habis
+            time.sleep(poll_seconds)
+            continue
+
+        unit, cfg, template_id = claimed
+        print(f"\n[QUEUE] {worker} klaim {unit}")
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(queue.lease_seconds / 3):
+                if not queue.heartbeat(worker, unit):
+                    print(f"[QUEUE Warning] lease {unit} hilang")
+
+        heartbeat = threading.Thread(target=beat, name="sweep-queue-heartbeat", daemon=True)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            result, error = run_unit(cfg, template_id)
+        except Exception as exc:
+            result, error = None, f"{type(exc).__name__}: {exc}"
+        finally:
+            stop.set()
+            heartbeat.join()
+        queue.complete(worker, unit, time.perf_counter() - start, error=error, result=result)
+        processed += 1
+    print(f"[QUEUE] worker {worker} selesai, {processed} unit diproses")
+    print_trace_summary(title=f"worker {worker}")
+    return processed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Antrian kerja sweep (coordinator / worker) berbasis SQLite.")
+    parser.add_argument("--queue", default=SWEEP_QUEUE_PATH, help="file SQLite antrian")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pub = sub.add_parser("publish", help="masukkan rencana sweep ke antrian")
+    pub.add_argument("--templates", default="all", help="contoh: all, 1-10, atau 1,2,5")
+    pub.add_argument("--models", default="qwen3_5", help="model keys dipisah koma")
+    pub.add_argument("--methods", default="zero,few", help="zero,few")
+    pub.add_argument("--topics", default="thesis,lecturer,assignment", help="topic keys dipisah koma")
+    pub.add_argument("--languages", default="id,en", help="bahasa dipisah koma")
+    pub.add_argument("--temperatures", default="0.3,0.7", help="daftar temperature dipisah koma")
+    pub.add_argument("--reset", action="store_true", help="hapus isi antrian lama dulu")
+
+    work = sub.add_parser("worker", help="klaim dan jalankan unit sampai antrian habis")
+    work.add_argument("--models", help="hanya ambil unit model key ini (dipisah koma)")
+    work.add_argument("--max-units", type=int, default=0, help="berhenti setelah N unit (0 = sampai habis)")
+    work.add_argument("--poll-seconds", type=float, default=10.0, help="jeda cek ulang saat menunggu lease")
+    add_profile_argument(work)
+
+    dash = sub.add_parser("dashboard", help="status antrian, throughput per worker, ETA")
+    dash.add_argument("--watch", type=float, default=0, help="refresh tiap N detik (0 = sekali)")
+    dash.add_argument("--json", action="store_true", help="cetak snapshot sebagai JSON")
+
+    req = sub.add_parser("requeue", help="kembalikan unit ke pending")
+    req.add_argument("--status", default="failed", help="status yang dikembalikan, dipisah koma")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    queue = SweepQueue(args.queue)
+
+    if args.command == "publish":
+        import auto_run_until_clear as driver
+
+        plan = driver.build_run_plan(
+            template_ids=driver.parse_template_ids(args.templates),
+            model_keys=driver.parse_csv_list(args.models),
+            temperatures=driver.parse_temperature_list(args.temperatures),
+            methods=[x.lower() for x in driver.parse_csv_list(args.methods)],
+            topics=driver.parse_csv_list(args.topics),
+            languages=[x.lower() for x in driver.parse_csv_list(args.languages)],
+        )
+        added, total = queue.publish(plan, reset=args.reset)
+        print(f"[QUEUE] publish {args.queue}: {added} unit baru dari {total} unit rencana")
+        return 0
+
+    if args.command == "worker":
+        model_keys = [m.strip() for m in args.models.split(",") if m.strip()] if args.models else None
+        with profile_scope(f"sweep_worker-{worker_id()}", args.profile):
+            run_worker(queue, model_keys, max_units=args.max_units, poll_seconds=args.poll_seconds)
+        return 0
+
+    if args.command == "dashboard":
+        while True:
+            snap = queue.snapshot()
+            if args.json:
+                print(json.dumps(snap, indent=2))
+            else:
+                print_dashboard(snap)
+            if args.watch <= 0 or not snap["counts"]["pending"] + snap["counts"]["running"]:
+                return 0
+            time.sleep(args.watch)
+
+    if args.command == "requeue":
+        statuses = tuple(s.strip() for s in args.status.split(",") if s.strip())
+        print(f"[QUEUE] requeue {queue.requeue(statuses)} unit ({', '.join(statuses)})")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+# ====== PREPROCESS GAMBAR SEBELUM DIKIRIM KE VLM ======
+# Vision encoder model me-resize input jauh di bawah 1000px, jadi PNG ~2000px yang
+# dikirim mentah cuma buang bandwidth ke host Ollama (dan, untuk Qwen-VL, token gambar).
+# Gambar di-downscale ke resolusi target per model lalu di-encode ulang (JPEG/WebP),
+# hasilnya di-cache di disk dengan key hash konten + parameter.
+#
+# VLM_PREPROCESS=0        -> kirim bytes asli (perilaku lama)
+# VLM_IMAGE_FORMAT        -> jpeg (default) | webp | png
+# VLM_IMAGE_QUALITY       -> kualitas JPEG/WebP (default 90)
+# VLM_IMAGE_MAX_SIDE      -> paksa sisi terpanjang (override target per model)
+# VLM_CACHE_DIR           -> folder cache (default cleanmeme_vlm/)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+VLM_PREPROCESS = os.getenv("VLM_PREPROCESS", "1").strip().lower() not in ("0", "false", "no", "off")
+VLM_IMAGE_FORMAT = os.getenv("VLM_IMAGE_FORMAT", "jpeg").strip().lower()
+VLM_IMAGE_QUALITY = int(os.getenv("VLM_IMAGE_QUALITY", "90"))
+VLM_IMAGE_MAX_SIDE = int(os.getenv("VLM_IMAGE_MAX_SIDE", "0"))
+VLM_CACHE_DIR = os.getenv("VLM_CACHE_DIR", os.path.join(BASE_DIR, "cleanmeme_vlm"))
+
+# Sisi terpanjang target per prefix tag model (paling panjang yang cocok menang)
+MODEL_MAX_SIDE = {
+    "default": 1024,
+    "gemma3": 896,  # SigLIP 896x896
+    "llama4": 1008,  # tile 336px, maks 3x3 tile
+    "qwen3.5": 1024,
+    "qwen3-vl": 1024,  # patch 28px: token gambar ikut jumlah piksel
+}
+
+_FORMATS = {
+    "jpeg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp"),
+    "png": ("PNG", "png"),
+}
+
+
+def max_side_for(model):
+    if VLM_IMAGE_MAX_SIDE > 0:
+        return VLM_IMAGE_MAX_SIDE
+    tag = str(model or "").strip().lower()
+    matches = [name for name in MODEL_MAX_SIDE if name != "default" and tag.startswith(name)]
+    return MODEL_MAX_SIDE[max(matches, key=len)] if matches else MODEL_MAX_SIDE["default"]
+
+
+def _encode(image_bytes, max_side, fmt, quality):
+    pil_format, _ = _FORMATS[fmt]
+    with Image.open(BytesIO(image_bytes)) as img:
+        img.load()
+        orig_size = img.size
+        if max(img.size) > max_side:
+            scale = max_side / max(img.size)
+            new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(new_size, Image.LANCZOS)
+
+        if pil_format == "JPEG" and img.mode != "RGB":
+            # JPEG tanpa alpha: tempel di atas putih supaya area transparan tidak jadi hitam
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        out = BytesIO()
+        save_kwargs = {"optimize": True}
+        if pil_format in ("JPEG", "WEBP"):
+            save_kwargs["quality"] = quality
+        img.save(out, format=pil_format, **save_kwargs)
+        return out.getvalue(), orig_size, img.size
+
+
+_stats_lock = threading.Lock()
+# model -> akumulasi bytes & waktu preprocess
+PREPROCESS_STATS = {}
+
+
+def prepare_vlm_image(image_bytes, model):
+    """
+    Bytes gambar siap kirim ke VLM. Return (bytes, info).
+    info: orig_bytes, sent_bytes, orig_size, sent_size, cache_hit, prep_ms.
+    Kalau hasil encode tidak lebih kecil (gambar sudah kecil), bytes asli yang dikirim.
+    """
+    start = time.perf_counter()
+    info = {"orig_bytes": len(image_bytes), "sent_bytes": len(image_bytes), "orig_size": None,
+            "sent_size": None, "cache_hit": False, "prep_ms": 0.0}
+    if not VLM_PREPROCESS or VLM_IMAGE_FORMAT not in _FORMATS:
+        return image_bytes, info
+
+    max_side = max_side_for(model)
+    digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+    ext = _FORMATS[VLM_IMAGE_FORMAT][1]
+    cache_path = os.path.join(VLM_CACHE_DIR, f"{digest}_{max_side}_q{VLM_IMAGE_QUALITY}.{ext}")
+
+    out = None
+    try:
+        with open(cache_path, "rb") as f:
+            out = f.read()
+        info["cache_hit"] = True
+    except OSError:
+        pass
+
+    if out is None:
+        try:
+            out, orig_size, sent_size = _encode(image_bytes, max_side, VLM_IMAGE_FORMAT, VLM_IMAGE_QUALITY)
+            info["orig_size"], info["sent_size"] = orig_size, sent_size
+        except Exception as e:
+            print(f"[VLM PREP Warning] gagal preprocess, kirim bytes asli: {e}")
+            return image_bytes, info
+        try:
+            os.makedirs(VLM_CACHE_DIR, exist_ok=True)
+            # Unik per proses + thread: dua thread bisa preprocess template yang sama bersamaan
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(out)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"[VLM PREP Warning] gagal simpan cache: {e}")
+
+    if len(out) < len(image_bytes):
+        info["sent_bytes"] = len(out)
+        result = out
+    else:
+        result = image_bytes
+    info["prep_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    with _stats_lock:
+        stats = PREPROCESS_STATS.setdefault(model, {"images": 0, "cache_hits": 0, "orig_bytes": 0, "sent_bytes": 0})
+        stats["images"] += 1
+        stats["cache_hits"] += int(info["cache_hit"])
+        stats["orig_bytes"] += info["orig_bytes"]
+        stats["sent_bytes"] += info["sent_bytes"]
+    return result, info
+
+
+def preprocess_report():
+    with _stats_lock:
+        return {
+            model: dict(s, ratio=round(s["sent_bytes"] / max(1, s["orig_bytes"]), 3))
+            for model, s in PREPROCESS_STATS.items()
+        }